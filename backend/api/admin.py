@@ -0,0 +1,42 @@
+from django.contrib import admin
+
+from api.models import Job, QueryStat
+
+
+@admin.register(QueryStat)
+class QueryStatAdmin(admin.ModelAdmin):
+    """Настройка админзоны для статистики SQL-запросов."""
+
+    list_display = (
+        'kind',
+        'location',
+        'calls',
+        'total_time',
+        'max_time',
+        'last_seen',
+    )
+    search_fields = ('location', 'sql')
+    list_filter = ('kind',)
+    readonly_fields = (
+        'key', 'kind', 'location', 'sql', 'calls', 'total_time',
+        'max_time', 'last_seen',
+    )
+
+    def has_add_permission(self, request):
+        return False
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    """Настройка админзоны для фоновых задач."""
+
+    list_display = (
+        'name',
+        'status',
+        'attempts',
+        'user',
+        'run_at',
+        'updated_at',
+    )
+    search_fields = ('name', 'key')
+    list_filter = ('status', 'name')
@@ -0,0 +1,127 @@
+import io
+import json
+import logging
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit
+
+from django.conf import settings
+from django.core.handlers.wsgi import WSGIRequest
+from django.db import close_old_connections
+from django.urls import Resolver404, resolve
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+logger = logging.getLogger(__name__)
+
+BATCH_METHODS = ('GET', 'POST', 'PATCH', 'DELETE')
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=settings.BATCH_WORKERS,
+                thread_name_prefix='api-batch',
+            )
+        return _executor
+
+
+def sub_request(request, method, path, body):
+    """
+    WSGI-запрос с заголовками исходного и уже аутентифицированным
+    пользователем: DRF не проверяет токен повторно.
+    """
+    parts = urlsplit(path)
+    content = b'' if body is None else json.dumps(body).encode('utf8')
+    environ = {
+        key: value for key, value in request.META.items()
+        if key not in ('wsgi.input', 'CONTENT_LENGTH', 'CONTENT_TYPE')
+    }
+    environ.update({
+        'REQUEST_METHOD': method,
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'CONTENT_TYPE': 'application/json',
+        'CONTENT_LENGTH': str(len(content)),
+        'wsgi.input': io.BytesIO(content),
+    })
+    sub = WSGIRequest(environ)
+    if request.user.is_authenticated:
+        sub._force_auth_user = request.user
+        sub._force_auth_token = request.auth
+    return sub
+
+
+def dispatch(request, method, path, body=None):
+    """Выполняет один подзапрос через маршруты api.urls."""
+    try:
+        match = resolve(urlsplit(path).path)
+    except Resolver404:
+        return {'status': 404, 'body': 'Страница не найдена.'}
+    if match.namespace != 'api':
+        return {'status': 404, 'body': 'Страница не найдена.'}
+    if match.url_name == 'batch':
+        return {'status': 400, 'body': 'Вложенные пакеты запрещены.'}
+    sub = sub_request(request, method, path, body)
+    sub.resolver_match = match
+    try:
+        response = match.func(sub, *match.args, **match.kwargs)
+    except Exception:
+        logger.exception('Ошибка подзапроса %s %s', method, path)
+        return {'status': 500, 'body': None}
+    try:
+        return {
+            'status': response.status_code,
+            'body': response.data if isinstance(response, Response)
+            else None,
+        }
+    finally:
+        close_response(response)
+
+
+def close_response(response):
+    """
+    Закрывает файлы ответа подзапроса. HttpResponse.close() еще и
+    отправляет request_finished, а его обработчик закрыл бы соединение
+    с базой посреди исходного запроса.
+    """
+    for closer in response._resource_closers:
+        try:
+            closer()
+        except Exception:
+            logger.exception('Ошибка закрытия ответа подзапроса')
+    response._resource_closers.clear()
+    response.closed = True
+
+
+def dispatch_in_thread(request, method, path, body):
+    close_old_connections()
+    try:
+        return dispatch(request, method, path, body)
+    finally:
+        close_old_connections()
+
+
+def run_batch(request, items):
+    """
+    Выполняет подзапросы и возвращает ответы в том же порядке.
+    Пакет только из GET выполняется параллельно в пуле потоков,
+    остальные — по порядку в соединении исходного запроса.
+    """
+    calls = [
+        (item['method'], item['path'], item.get('body')) for item in items
+    ]
+    if (settings.BATCH_WORKERS > 1 and len(calls) > 1
+            and all(method in SAFE_METHODS for method, _, _ in calls)):
+        executor = get_executor()
+        futures = [
+            executor.submit(dispatch_in_thread, request, *call)
+            for call in calls
+        ]
+        return [future.result() for future in futures]
+    return [dispatch(request, *call) for call in calls]
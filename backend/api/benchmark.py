@@ -0,0 +1,205 @@
+import base64
+import io
+import time
+import tracemalloc
+import uuid
+from contextlib import contextmanager
+from dataclasses import asdict, dataclass
+from types import SimpleNamespace
+
+from django.contrib.auth import get_user_model
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+
+from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
+                            RecipeTag, ShoppingCart, Tag)
+from users.models import Subscription
+
+User = get_user_model()
+
+# Во сколько раз показатель может превысить эталонный, пока это
+# не считается регрессией. Время зависит от машины, поэтому допуск
+# на него шире; число запросов расти не должно.
+DEFAULT_TOLERANCES = {
+    'per_object_us': 2.0,
+    'peak_bytes': 1.25,
+    'queries': 1.0,
+}
+
+
+class _Rollback(Exception):
+    """Служебное исключение для отката транзакции с фикстурами."""
+
+
+@contextmanager
+def rollback_atomic():
+    """Транзакция, которая всегда откатывается после выхода из блока."""
+    try:
+        with transaction.atomic():
+            yield
+            raise _Rollback
+    except _Rollback:
+        pass
+
+
+@dataclass
+class BenchmarkResult:
+    """Результат одного микробенчмарка."""
+
+    name: str
+    objects: int
+    seconds: float
+    peak_bytes: int
+    queries: int
+
+    @property
+    def per_object_us(self):
+        return self.seconds / max(self.objects, 1) * 1_000_000
+
+    def as_dict(self):
+        result = asdict(self)
+        result['per_object_us'] = round(self.per_object_us, 2)
+        return result
+
+    def __str__(self):
+        return (f'{self.name:<40} {self.objects:>6} объектов '
+                f'{self.per_object_us:>10.1f} мкс/объект '
+                f'{self.peak_bytes / 1024:>9.1f} КиБ '
+                f'{self.queries:>5} запросов')
+
+
+def measure(name, func, objects, setup=None, repeat=5):
+    """
+    Замеряет func: лучшее время из repeat прогонов, пик аллокаций
+    по tracemalloc и число SQL-запросов за один прогон.
+    setup вызывается перед каждым прогоном и не входит в замер.
+    """
+    def prepare():
+        return (setup(),) if setup is not None else ()
+
+    args = prepare()
+    tracemalloc.start()
+    try:
+        with CaptureQueriesContext(connection) as context:
+            func(*args)
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+    best = None
+    for _ in range(repeat):
+        args = prepare()
+        start = time.perf_counter()
+        func(*args)
+        elapsed = time.perf_counter() - start
+        best = elapsed if best is None else min(best, elapsed)
+    return BenchmarkResult(
+        name=name,
+        objects=objects,
+        seconds=best,
+        peak_bytes=peak,
+        queries=len(context.captured_queries),
+    )
+
+
+def regressions(result, baseline, tolerances):
+    """Показатели result, превысившие эталонные больше допуска."""
+    current = result.as_dict()
+    for metric, tolerance in tolerances.items():
+        if current[metric] > baseline[metric] * tolerance:
+            yield (f'{result.name}: {metric} {current[metric]}, эталон '
+                   f'{baseline[metric]}, допуск x{tolerance}')
+
+
+def make_png(size=64):
+    """PNG-картинка в памяти в формате, который принимает API."""
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', (size, size), (200, 120, 40)).save(buffer, 'PNG')
+    encoded = base64.b64encode(buffer.getvalue()).decode()
+    return f'data:image/png;base64,{encoded}'
+
+
+def fake_request(user, data=None, query_params=None, method='GET'):
+    """Минимальный объект запроса для контекста сериализаторов."""
+    return SimpleNamespace(
+        user=user,
+        data=data if data is not None else {},
+        query_params=query_params if query_params is not None else {},
+        method=method,
+    )
+
+
+def create_fixtures(recipes_count, authors_count=10, tags_count=5,
+                    ingredients_count=50, ingredients_per_recipe=5,
+                    tags_per_recipe=2):
+    """
+    Создает синтетические данные для бенчмарков.
+    Вызывать внутри rollback_atomic(), чтобы данные не попали в базу.
+    """
+    prefix = f'bench-{uuid.uuid4().hex[:8]}'
+    User.objects.bulk_create(
+        User(
+            username=f'{prefix}-{number}',
+            email=f'{prefix}-{number}@example.com',
+            password=f'{prefix}-{number}',
+            first_name='Имя',
+            last_name='Фамилия',
+        )
+        for number in range(authors_count + 1)
+    )
+    users = list(User.objects.filter(username__startswith=prefix))
+    viewer, authors = users[0], users[1:]
+    Tag.objects.bulk_create(
+        Tag(name=f'{prefix}-{number}', color='#E26C2D',
+            slug=f'{prefix}-{number}')
+        for number in range(tags_count)
+    )
+    tags = list(Tag.objects.filter(slug__startswith=prefix))
+    Ingredient.objects.bulk_create(
+        Ingredient(name=f'{prefix}-{number}', measurement_unit='г')
+        for number in range(ingredients_count)
+    )
+    ingredients = list(Ingredient.objects.filter(name__startswith=prefix))
+    Recipe.objects.bulk_create(
+        Recipe(
+            author=authors[number % len(authors)],
+            name=f'{prefix}-{number}',
+            text='Описание рецепта ' * 20,
+            cooking_time=number % 120 + 1,
+        )
+        for number in range(recipes_count)
+    )
+    recipes = list(Recipe.objects.filter(name__startswith=prefix))
+    RecipeIngredient.objects.bulk_create(
+        RecipeIngredient(
+            recipe=recipe,
+            ingredient=ingredients[
+                (number + shift) % len(ingredients)
+            ],
+            amount=shift + 1,
+        )
+        for number, recipe in enumerate(recipes)
+        for shift in range(ingredients_per_recipe)
+    )
+    RecipeTag.objects.bulk_create(
+        RecipeTag(recipe=recipe, tag=tags[(number + shift) % len(tags)])
+        for number, recipe in enumerate(recipes)
+        for shift in range(tags_per_recipe)
+    )
+    Subscription.objects.bulk_create(
+        Subscription(user=viewer, author=author) for author in authors
+    )
+    Favorite.objects.bulk_create(
+        Favorite(user=viewer, recipe=recipe) for recipe in recipes[::3]
+    )
+    ShoppingCart.objects.bulk_create(
+        ShoppingCart(user=viewer, recipe=recipe) for recipe in recipes[::4]
+    )
+    return SimpleNamespace(
+        viewer=viewer,
+        authors=authors,
+        tags=tags,
+        ingredients=ingredients,
+        recipes=recipes,
+    )
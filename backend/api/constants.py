@@ -1 +1,23 @@
 SYMBOLS_QUANTITY = 20
+
+# Перевод единиц измерения в канонические перед суммированием:
+# единица -> (каноническая единица, множитель).
+UNIT_CONVERSIONS = {
+    'г': ('г', 1),
+    'кг': ('г', 1000),
+    'мл': ('мл', 1),
+    'л': ('мл', 1000),
+    'стакан': ('мл', 250),
+    'ст. л.': ('мл', 15),
+    'ч. л.': ('мл', 5),
+    'шт': ('шт.', 1),
+    'шт.': ('шт.', 1),
+}
+
+# Крупные единицы для вывода: каноническая -> (крупная единица, множитель).
+DISPLAY_UNITS = {
+    'г': ('кг', 1000),
+    'мл': ('л', 1000),
+}
+
+TO_TASTE_UNIT = 'по вкусу'
@@ -0,0 +1,299 @@
+import hashlib
+import io
+import json
+import os
+import tempfile
+import time
+import zipfile
+from xml.sax.saxutils import escape
+
+from django.conf import settings
+from django.db.models import Case, CharField, F, IntegerField, Sum, Value, When
+from django.http import FileResponse, HttpResponse
+
+from api.constants import DISPLAY_UNITS, TO_TASTE_UNIT, UNIT_CONVERSIONS
+from api.jobs import enqueue
+from backend.metrics import record_cache
+from recipes.models import RecipeIngredient, ShoppingCart
+
+EXPORT_TITLE = 'Список покупок'
+
+# Меняется при изменении формата файлов, чтобы не отдавать старый кэш.
+EXPORT_VERSION = 2
+
+
+def canonical_unit():
+    """SQL-выражение канонической единицы измерения ингредиента."""
+    return Case(
+        *(When(ingredient__measurement_unit=unit, then=Value(canonical))
+          for unit, (canonical, _) in UNIT_CONVERSIONS.items()),
+        default=F('ingredient__measurement_unit'),
+        output_field=CharField(),
+    )
+
+
+def canonical_amount():
+    """SQL-выражение количества в канонических единицах."""
+    return F('amount') * Case(
+        *(When(ingredient__measurement_unit=unit, then=Value(factor))
+          for unit, (_, factor) in UNIT_CONVERSIONS.items() if factor != 1),
+        default=Value(1),
+        output_field=IntegerField(),
+    )
+
+
+def humanize_amount(measurement_unit, amount):
+    """Единица и количество в удобном для чтения виде."""
+    if measurement_unit in DISPLAY_UNITS:
+        unit, factor = DISPLAY_UNITS[measurement_unit]
+        if amount >= factor:
+            return unit, f'{amount / factor:.3f}'.rstrip('0').rstrip('.')
+    return measurement_unit, str(amount)
+
+
+def shopping_cart_queryset(user):
+    """
+    Суммы ингредиентов из корзины пользователя: количества приводятся
+    к каноническим единицам прямо в SQL, за один проход по строкам.
+    """
+    return RecipeIngredient.objects.filter(
+        recipe__in=ShoppingCart.objects.filter(user=user).values('recipe')
+    ).values(
+        'ingredient__name', unit=canonical_unit()
+    ).annotate(
+        sum_amount=Sum(canonical_amount())
+    ).order_by('ingredient__name', 'unit')
+
+
+def shopping_cart_rows(queryset):
+    """Строки списка покупок из shopping_cart_queryset."""
+    return [
+        (row['ingredient__name'],
+         *humanize_amount(row['unit'], row['sum_amount']))
+        for row in queryset
+    ]
+
+
+def format_row(row):
+    name, measurement_unit, amount = row
+    if measurement_unit == TO_TASTE_UNIT:
+        return f'{name}, {measurement_unit}'
+    return f'{name}, {measurement_unit}, {amount}'
+
+
+def render_txt(rows):
+    return ''.join(f'{format_row(row)};\n' for row in rows).encode('utf8')
+
+
+DOCX_CONTENT_TYPES = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Types xmlns="http://schemas.openxmlformats.org/package/2006/'
+    'content-types">'
+    '<Default Extension="rels" ContentType="application/'
+    'vnd.openxmlformats-package.relationships+xml"/>'
+    '<Default Extension="xml" ContentType="application/xml"/>'
+    '<Override PartName="/word/document.xml" ContentType="application/'
+    'vnd.openxmlformats-officedocument.wordprocessingml.document.main+xml"/>'
+    '</Types>'
+)
+
+DOCX_RELS = (
+    '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+    '<Relationships xmlns="http://schemas.openxmlformats.org/package/2006/'
+    'relationships">'
+    '<Relationship Id="rId1" Type="http://schemas.openxmlformats.org/'
+    'officeDocument/2006/relationships/officeDocument" '
+    'Target="word/document.xml"/>'
+    '</Relationships>'
+)
+
+
+def docx_paragraph(text, bold=False):
+    properties = '<w:rPr><w:b/></w:rPr>' if bold else ''
+    return (f'<w:p><w:r>{properties}'
+            f'<w:t xml:space="preserve">{escape(text)}</w:t></w:r></w:p>')
+
+
+def render_docx(rows):
+    body = docx_paragraph(EXPORT_TITLE, bold=True) + ''.join(
+        docx_paragraph(format_row(row)) for row in rows
+    )
+    document = (
+        '<?xml version="1.0" encoding="UTF-8" standalone="yes"?>'
+        '<w:document xmlns:w="http://schemas.openxmlformats.org/'
+        'wordprocessingml/2006/main">'
+        f'<w:body>{body}</w:body></w:document>'
+    )
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, 'w', zipfile.ZIP_DEFLATED) as archive:
+        for name, content in (('[Content_Types].xml', DOCX_CONTENT_TYPES),
+                              ('_rels/.rels', DOCX_RELS),
+                              ('word/document.xml', document)):
+            archive.writestr(zipfile.ZipInfo(name), content)
+    return buffer.getvalue()
+
+
+def render_pdf(rows):
+    from reportlab.lib.pagesizes import A4
+    from reportlab.pdfbase import pdfmetrics
+    from reportlab.pdfbase.ttfonts import TTFont
+    from reportlab.pdfgen import canvas
+
+    if 'ShoppingCartFont' not in pdfmetrics.getRegisteredFontNames():
+        pdfmetrics.registerFont(
+            TTFont('ShoppingCartFont', settings.SHOPPING_CART_PDF_FONT)
+        )
+    buffer = io.BytesIO()
+    pdf = canvas.Canvas(buffer, pagesize=A4, invariant=True)
+    width, height = A4
+    margin, line_height = 50, 18
+    pdf.setFont('ShoppingCartFont', 16)
+    pdf.drawString(margin, height - margin, EXPORT_TITLE)
+    y = height - margin - 2 * line_height
+    pdf.setFont('ShoppingCartFont', 12)
+    for row in rows:
+        if y < margin:
+            pdf.showPage()
+            pdf.setFont('ShoppingCartFont', 12)
+            y = height - margin
+        pdf.drawString(margin, y, format_row(row))
+        y -= line_height
+    pdf.save()
+    return buffer.getvalue()
+
+
+EXPORT_FORMATS = {
+    'txt': (render_txt, 'text/plain; charset=utf-8'),
+    'pdf': (render_pdf, 'application/pdf'),
+    'docx': (render_docx, 'application/vnd.openxmlformats-officedocument.'
+                          'wordprocessingml.document'),
+}
+
+
+class ShoppingCartExport:
+    """
+    Файл со списком покупок, закэшированный на диске по хэшу
+    содержимого корзины: пока корзина не меняется, файл не рендерится
+    повторно.
+    """
+
+    job = None
+
+    def __init__(self, rows, file_type, digest=None):
+        self.rows = rows
+        self.file_type = file_type
+        self.digest = digest or hashlib.sha256(json.dumps(
+            [EXPORT_VERSION, file_type, rows], ensure_ascii=False
+        ).encode('utf8')).hexdigest()
+        self.file_name = f'{self.digest}.{file_type}'
+        self.path = os.path.join(
+            settings.SHOPPING_CART_EXPORT_ROOT, self.file_name
+        )
+
+    @classmethod
+    def from_result(cls, result):
+        """
+        Файл по результату задачи render_shopping_cart_export
+        или None, если результат не от нее.
+        """
+        if not isinstance(result, dict) or 'export' not in result:
+            return None
+        digest, _, file_type = result['export'].partition('.')
+        if file_type not in EXPORT_FORMATS or not digest.isalnum():
+            return None
+        return cls(None, file_type, digest)
+
+    def is_ready(self):
+        """
+        Есть ли готовый файл. Обращение продлевает ему жизнь: время
+        изменения сбрасывается, и purge_exports его не удалит.
+        """
+        try:
+            os.utime(self.path)
+        except FileNotFoundError:
+            return False
+        return True
+
+    def render(self):
+        render, _ = EXPORT_FORMATS[self.file_type]
+        content = render(self.rows)
+        os.makedirs(settings.SHOPPING_CART_EXPORT_ROOT, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(
+            dir=settings.SHOPPING_CART_EXPORT_ROOT, suffix='.tmp'
+        )
+        with os.fdopen(descriptor, 'wb') as file:
+            file.write(content)
+        os.replace(temp_path, self.path)
+
+    def prepare(self, user=None):
+        """
+        Готовит файл: небольшие корзины рендерятся сразу, для больших
+        ставится фоновая задача (self.job). Возвращает True, если файл
+        уже можно отдавать.
+        """
+        ready = self.is_ready()
+        record_cache('shopping_cart_export', ready)
+        if ready:
+            return True
+        if len(self.rows) <= settings.SHOPPING_CART_SYNC_ROWS:
+            self.render()
+            return True
+        # Задача своя у каждого пользователя (ее видит только владелец),
+        # файл с одинаковым содержимым — общий.
+        user_id = user.pk if user is not None else None
+        self.job = enqueue(
+            render_shopping_cart_export,
+            key=f'shopping_cart:{user_id}:{self.file_name}', user=user,
+            rows=self.rows, file_type=self.file_type,
+        )
+        return False
+
+    def response(self):
+        _, content_type = EXPORT_FORMATS[self.file_type]
+        file_name = f'shopping_cart.{self.file_type}'
+        if settings.SHOPPING_CART_X_ACCEL_PREFIX:
+            response = HttpResponse(content_type=content_type)
+            response['X-Accel-Redirect'] = (
+                settings.SHOPPING_CART_X_ACCEL_PREFIX + self.file_name
+            )
+            response['Content-Disposition'] = (
+                f'attachment; filename={file_name}'
+            )
+            return response
+        return FileResponse(
+            open(self.path, 'rb'), as_attachment=True,
+            filename=file_name, content_type=content_type,
+        )
+
+
+def purge_exports():
+    """
+    Удаляет файлы списков покупок (и брошенные временные файлы), к
+    которым не обращались дольше SHOPPING_CART_EXPORT_RETENTION_HOURS.
+    """
+    expired_at = time.time() - (
+        settings.SHOPPING_CART_EXPORT_RETENTION_HOURS * 60 * 60
+    )
+    deleted = 0
+    try:
+        entries = list(os.scandir(settings.SHOPPING_CART_EXPORT_ROOT))
+    except FileNotFoundError:
+        return deleted
+    for entry in entries:
+        try:
+            if entry.is_file() and entry.stat().st_mtime < expired_at:
+                os.remove(entry.path)
+                deleted += 1
+        except FileNotFoundError:
+            pass
+    return deleted
+
+
+def render_shopping_cart_export(rows, file_type):
+    """
+    Фоновая задача: рендерит файл списка покупок. Имя файла
+    в результате задачи нужно для ссылки на скачивание.
+    """
+    export = ShoppingCartExport([tuple(row) for row in rows], file_type)
+    export.render()
+    return {'export': export.file_name}
@@ -1,4 +1,5 @@
 import base64
+import hashlib
 
 from django.core.files.base import ContentFile
 from rest_framework import serializers
@@ -10,6 +11,10 @@ class Base64ImageField(serializers.ImageField):
             format, imgstr = data.split(';base64,')
             ext = format.split('/')[-1]
 
-            data = ContentFile(base64.b64decode(imgstr), name='temp.' + ext)
+            content = base64.b64decode(imgstr)
+            digest = hashlib.sha256(content).hexdigest()
+            data = ContentFile(content, name=f'{digest}.{ext.lower()}')
+            # Хранилище кладет файл под этим дайджестом без пересчета.
+            data.digest = digest
 
         return super().to_internal_value(data)
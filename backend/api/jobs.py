@@ -0,0 +1,165 @@
+import logging
+import random
+import traceback
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, connections, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.module_loading import import_string
+
+from api.models import Job
+
+logger = logging.getLogger(__name__)
+
+
+def job_name(func):
+    return f'{func.__module__}.{func.__qualname__}'
+
+
+def enqueue(func, key=None, user=None, delay=0, **payload):
+    """
+    Ставит вызов func(**payload) в очередь, с delay — не раньше чем
+    через delay секунд. Аргументы должны сериализоваться в JSON.
+    Задача с тем же key, которая еще ждет или выполняется,
+    не дублируется; завершенная ставится в очередь заново.
+    """
+    fields = {
+        'name': job_name(func),
+        'payload': payload,
+        'user': user,
+        'status': Job.QUEUED,
+        'attempts': 0,
+        'run_at': timezone.now() + timedelta(seconds=delay),
+        'result': None,
+        'error': '',
+    }
+    if key is None:
+        return Job.objects.create(**fields)
+    try:
+        with transaction.atomic():
+            return Job.objects.create(key=key, **fields)
+    except IntegrityError:
+        pass
+    Job.objects.filter(
+        key=key, status__in=(Job.DONE, Job.FAILED)
+    ).update(updated_at=timezone.now(), **fields)
+    return Job.objects.get(key=key)
+
+
+def enqueue_on_commit(func, **kwargs):
+    """Ставит задачу в очередь после фиксации текущей транзакции."""
+    transaction.on_commit(lambda: enqueue(func, **kwargs))
+
+
+def retry_delay(attempts):
+    """Экспоненциальная задержка перед повтором со случайным разбросом."""
+    delay = min(
+        settings.JOB_RETRY_BACKOFF * 2 ** (attempts - 1),
+        settings.JOB_RETRY_BACKOFF_MAX,
+    )
+    return timedelta(seconds=delay * random.uniform(0.5, 1))
+
+
+def claim(count=1):
+    """
+    Забирает до count готовых к запуску задач. Строки, которые уже
+    забрал другой воркер, пропускаются без ожидания блокировки.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        jobs = list(
+            Job.objects.select_for_update(skip_locked=True).filter(
+                status=Job.QUEUED, run_at__lte=now
+            ).order_by('run_at', 'id')[:count]
+        )
+        if jobs:
+            Job.objects.filter(pk__in=[job.pk for job in jobs]).update(
+                status=Job.RUNNING, attempts=F('attempts') + 1,
+                locked_at=now,
+            )
+    for job in jobs:
+        job.status, job.attempts, job.locked_at = (
+            Job.RUNNING, job.attempts + 1, now
+        )
+    return jobs
+
+
+def run(job):
+    """Выполняет задачу и записывает результат или планирует повтор."""
+    try:
+        result = import_string(job.name)(**job.payload)
+    except Exception:
+        logger.exception('Задача %s (%s) завершилась ошибкой',
+                         job.pk, job.name)
+        changes = {'error': traceback.format_exc()}
+        if job.attempts < settings.JOB_MAX_ATTEMPTS:
+            changes.update(
+                status=Job.QUEUED,
+                run_at=timezone.now() + retry_delay(job.attempts),
+            )
+        else:
+            changes['status'] = Job.FAILED
+    else:
+        changes = {'status': Job.DONE, 'result': result, 'error': ''}
+    Job.objects.filter(pk=job.pk).update(
+        locked_at=None, updated_at=timezone.now(), **changes
+    )
+    for field, value in changes.items():
+        setattr(job, field, value)
+    return job
+
+
+def requeue_stale():
+    """
+    Возвращает в очередь задачи воркеров, которые не завершились за
+    JOB_TIMEOUT. Зависание считается попыткой (attempts увеличивает
+    claim): задача, исчерпавшая JOB_MAX_ATTEMPTS, помечается FAILED.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status=Job.RUNNING,
+        locked_at__lt=now - timedelta(seconds=settings.JOB_TIMEOUT),
+    )
+    stale.filter(attempts__gte=settings.JOB_MAX_ATTEMPTS).update(
+        status=Job.FAILED, locked_at=None, updated_at=now,
+        error='Задача не завершилась за JOB_TIMEOUT.',
+    )
+    return stale.filter(attempts__lt=settings.JOB_MAX_ATTEMPTS).update(
+        status=Job.QUEUED, locked_at=None, run_at=now, updated_at=now,
+    )
+
+
+def purge_finished():
+    """Удаляет выполненные задачи старше JOB_RETENTION_HOURS."""
+    deleted, _ = Job.objects.filter(
+        status=Job.DONE,
+        updated_at__lt=timezone.now() - timedelta(
+            hours=settings.JOB_RETENTION_HOURS
+        ),
+    ).delete()
+    return deleted
+
+
+def work(stop, poll_interval, once=False):
+    """
+    Цикл воркера: забирает и выполняет задачи, пока не установлен
+    stop; с once завершается, когда очередь опустела.
+    """
+    try:
+        while not stop.is_set():
+            try:
+                jobs = claim()
+                for job in jobs:
+                    run(job)
+            except DatabaseError:
+                logger.exception('Ошибка базы данных в воркере очереди')
+                connections.close_all()
+                jobs = None
+            if not jobs:
+                if once and jobs is not None:
+                    return
+                stop.wait(poll_interval)
+    finally:
+        connections.close_all()
@@ -0,0 +1,211 @@
+import json
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections
+from rest_framework.request import Request
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.serializers import SubscriptionToRepresentationSerializer
+from api.views import CustomUserViewSet, IngredientViewSet, RecipeViewSet
+from recipes.models import Tag
+
+User = get_user_model()
+
+PAGE_SIZE = 6
+
+
+def build_view(viewset, user, path, params=None, action='list'):
+    """Вьюсет с запросом, как его видит роутер DRF."""
+    request = APIRequestFactory().get(path, params or {})
+    force_authenticate(request, user=user)
+    return viewset(
+        request=Request(request), format_kwarg=None, action=action,
+        kwargs={}, args=(),
+    )
+
+
+def canonical_queries(user):
+    """
+    Запросы, которые выполняют основные эндпоинты API: querysets
+    строятся теми же методами вьюсетов и сериализаторов.
+    """
+    tag_slugs = list(
+        Tag.objects.exclude(slug=None).values_list('slug', flat=True)[:2]
+    )
+    author = User.objects.filter(recipes_author__isnull=False).first()
+    queries = {
+        'recipes.list': build_view(
+            RecipeViewSet, user, '/api/recipes/'
+        ).get_queryset()[:PAGE_SIZE],
+        'recipes.list.tags': build_view(
+            RecipeViewSet, user, '/api/recipes/', {'tags': tag_slugs}
+        ).get_queryset()[:PAGE_SIZE],
+        'recipes.list.is_favorited': build_view(
+            RecipeViewSet, user, '/api/recipes/', {'is_favorited': 1}
+        ).get_queryset()[:PAGE_SIZE],
+        'recipes.list.is_in_shopping_cart': build_view(
+            RecipeViewSet, user, '/api/recipes/', {'is_in_shopping_cart': 1}
+        ).get_queryset()[:PAGE_SIZE],
+        'recipes.list.search': build_view(
+            RecipeViewSet, user, '/api/recipes/', {'search': 'суп'}
+        ).get_queryset()[:PAGE_SIZE],
+        'ingredients.list.name': build_view(
+            IngredientViewSet, user, '/api/ingredients/', {'name': 'са'}
+        ).get_queryset(),
+    }
+    if user.is_authenticated:
+        queries['users.subscriptions'] = build_view(
+            CustomUserViewSet, user, '/api/users/subscriptions/',
+            action='subscriptions_list',
+        ).get_subscriptions_queryset()[:PAGE_SIZE]
+        queries['recipes.shopping_cart.aggregate'] = build_view(
+            RecipeViewSet, user, '/api/recipes/download_shopping_cart/',
+            action='download_shopping_cart',
+        ).get_shopping_cart_queryset()
+    if author is not None:
+        queries['recipes.list.author'] = build_view(
+            RecipeViewSet, user, '/api/recipes/', {'author': author.pk}
+        ).get_queryset()[:PAGE_SIZE]
+        queries['users.subscriptions.recipes'] = (
+            SubscriptionToRepresentationSerializer().get_recipes_queryset(
+                author
+            )[:PAGE_SIZE]
+        )
+    return queries
+
+
+def explain(queryset):
+    """
+    План EXPLAIN (ANALYZE, BUFFERS) в виде словаря. QuerySet.explain
+    в Django 3.2 возвращает repr разобранного psycopg2 JSON, поэтому
+    запрос выполняется напрямую.
+    """
+    connection = connections[queryset.db]
+    sql, params = queryset.query.sql_with_params()
+    with connection.cursor() as cursor:
+        cursor.execute(
+            f'EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}', params
+        )
+        plan = cursor.fetchone()[0]
+    if isinstance(plan, str):
+        plan = json.loads(plan)
+    return plan[0]['Plan']
+
+
+def walk(plan, depth=0):
+    yield depth, plan
+    for child in plan.get('Plans', ()):
+        yield from walk(child, depth + 1)
+
+
+def plan_shape(plan):
+    """Форма плана без стоимостей: тип узла, таблица и индекс."""
+    return [
+        [depth, node['Node Type'], node.get('Relation Name'),
+         node.get('Index Name')]
+        for depth, node in walk(plan)
+    ]
+
+
+def plan_warnings(plan, seq_scan_rows, sort_rows):
+    warnings = []
+    for _, node in walk(plan):
+        rows = node.get('Actual Rows', 0) * node.get('Actual Loops', 1)
+        if node['Node Type'] == 'Seq Scan' and rows >= seq_scan_rows:
+            warnings.append(
+                f'Seq Scan по {node.get("Relation Name")}: {rows} строк'
+            )
+        if node['Node Type'] in ('Sort', 'Incremental Sort') and (
+            rows >= sort_rows or node.get('Sort Space Type') == 'Disk'
+        ):
+            warnings.append(
+                f'{node["Node Type"]} {rows} строк, '
+                f'{node.get("Sort Method")} '
+                f'({node.get("Sort Space Used")} КБ '
+                f'{node.get("Sort Space Type")})'
+            )
+    return warnings
+
+
+def plan_regressions(shape, baseline_shape):
+    """Новые последовательные сканирования и сортировки относительно базы."""
+    def marks(nodes):
+        return {
+            (node_type, relation) for _, node_type, relation, _ in nodes
+            if node_type in ('Seq Scan', 'Sort', 'Incremental Sort')
+        }
+    return sorted(
+        f'{node_type} {relation or ""}'.strip()
+        for node_type, relation in marks(shape) - marks(baseline_shape)
+    )
+
+
+class Command(BaseCommand):
+    help = ('EXPLAIN (ANALYZE, BUFFERS) для основных запросов API: '
+            'последовательные сканирования, сортировки и регрессии планов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', type=int, default=None,
+                            help='id пользователя для запросов с его данными '
+                                 '(подписки, корзина).')
+        parser.add_argument('--seq-scan-rows', type=int, default=1000,
+                            help='Порог строк для предупреждения о Seq Scan.')
+        parser.add_argument('--sort-rows', type=int, default=10000,
+                            help='Порог строк для предупреждения о Sort.')
+        parser.add_argument('--baseline', default=str(
+            settings.EXPLAIN_BASELINE_PATH
+        ), help='Файл с эталонными планами.')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Сохранить текущие планы как эталонные.')
+        parser.add_argument('--check', action='store_true',
+                            help='Завершиться с ошибкой при регрессии планов.')
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'postgresql':
+            raise CommandError('Аудит планов запросов требует PostgreSQL.')
+        user = AnonymousUser()
+        if options['user'] is not None:
+            user = User.objects.get(pk=options['user'])
+        baseline = {}
+        if not options['save_baseline']:
+            try:
+                with open(options['baseline'], encoding='utf8') as file:
+                    baseline = json.load(file)
+            except FileNotFoundError:
+                if options['check']:
+                    raise CommandError(
+                        f'Нет эталонных планов: {options["baseline"]}'
+                    )
+        shapes = {}
+        regressions = 0
+        for name, queryset in canonical_queries(user).items():
+            plan = explain(queryset)
+            shapes[name] = plan_shape(plan)
+            self.stdout.write(
+                f'{name}: {plan["Actual Total Time"]:.2f} мс, '
+                f'shared hit/read '
+                f'{plan.get("Shared Hit Blocks", 0)}/'
+                f'{plan.get("Shared Read Blocks", 0)}'
+            )
+            for warning in plan_warnings(
+                plan, options['seq_scan_rows'], options['sort_rows']
+            ):
+                self.stdout.write(self.style.WARNING(f'  {warning}'))
+            if name in baseline:
+                for regression in plan_regressions(
+                    shapes[name], baseline[name]
+                ):
+                    regressions += 1
+                    self.stdout.write(self.style.ERROR(
+                        f'  Регрессия плана: {regression}'
+                    ))
+        if options['save_baseline']:
+            with open(options['baseline'], 'w', encoding='utf8') as file:
+                json.dump(shapes, file, ensure_ascii=False, indent=2)
+            self.stdout.write(f'Эталонные планы сохранены: '
+                              f'{options["baseline"]}')
+        if options['check'] and regressions:
+            raise CommandError(f'Регрессий планов: {regressions}.')
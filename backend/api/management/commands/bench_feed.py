@@ -0,0 +1,64 @@
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.benchmark import create_fixtures, measure, rollback_atomic
+from api.views import RecipeViewSet
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = 'Задержка ленты рецептов при фильтрации по 1-5 тэгам.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=2000,
+                            help='Количество рецептов в фикстурах.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Количество прогонов, берется лучший.')
+
+    def handle(self, *args, **options):
+        with rollback_atomic():
+            for result in self.run_benchmarks(options):
+                self.stdout.write(str(result))
+
+    def run_benchmarks(self, options):
+        data = create_fixtures(options['recipes'], tags_count=5,
+                               tags_per_recipe=2)
+        repeat = options['repeat']
+        factory = APIRequestFactory()
+        view = RecipeViewSet.as_view({'get': 'list'})
+        user = data.viewer
+        results = []
+        for count in range(1, 6):
+            slugs = [tag.slug for tag in data.tags[:count]]
+
+            def legacy(slugs=slugs):
+                queryset = Recipe.objects.add_user_annotations(
+                    user.pk
+                ).filter(tags__slug__in=slugs).distinct()
+                queryset.count()
+                list(queryset[:6])
+
+            def exists(slugs=slugs, match_all=False):
+                queryset = Recipe.objects.add_user_annotations(
+                    user.pk
+                ).with_tags(slugs, match_all=match_all)
+                queryset.count()
+                list(queryset[:6])
+
+            def feed(slugs=slugs):
+                request = factory.get('/api/recipes/', {'tags': slugs})
+                force_authenticate(request, user=user)
+                view(request).render()
+
+            results += [
+                measure(f'JOIN + DISTINCT, тэгов: {count}', legacy, 1,
+                        repeat=repeat),
+                measure(f'EXISTS, тэгов: {count}', exists, 1,
+                        repeat=repeat),
+                measure(f'EXISTS все тэги, тэгов: {count}',
+                        lambda slugs=slugs: exists(slugs, True), 1,
+                        repeat=repeat),
+                measure(f'GET /api/recipes/, тэгов: {count}', feed, 1,
+                        repeat=repeat),
+            ]
+        return results
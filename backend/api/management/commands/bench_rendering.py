@@ -0,0 +1,59 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from rest_framework.renderers import JSONRenderer
+
+from api.benchmark import create_fixtures, fake_request, rollback_atomic
+from api.renderers import FastJSONRenderer
+from api.serializers import RecipeSerializer
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Процессорное время на 1000 рецептов: сериализация и рендеринг '
+            'JSON через DRF и через компилированное представление с orjson.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=1000,
+                            help='Количество рецептов в фикстурах.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Количество прогонов, берется лучший.')
+
+    def handle(self, *args, **options):
+        with rollback_atomic():
+            data = create_fixtures(options['recipes'])
+            recipes = list(Recipe.objects.add_user_annotations(
+                data.viewer.pk
+            ).with_related(data.viewer.pk).filter(
+                id__in=[recipe.id for recipe in data.recipes]
+            ))
+        request = fake_request(data.viewer)
+
+        def render(renderer, compiled):
+            return renderer.render(RecipeSerializer(
+                recipes, many=True, context={
+                    'request': request,
+                    'compiled_representation': compiled,
+                }
+            ).data)
+
+        paths = (
+            ('DRF + JSONRenderer', JSONRenderer(), False),
+            ('Компилированное + orjson', FastJSONRenderer(), True),
+        )
+        outputs = set()
+        for name, renderer, compiled in paths:
+            best = None
+            for _ in range(options['repeat']):
+                started = time.process_time()
+                content = render(renderer, compiled)
+                elapsed = time.process_time() - started
+                best = elapsed if best is None else min(best, elapsed)
+            outputs.add(content)
+            self.stdout.write(
+                f'{name:<28} '
+                f'{best / max(len(recipes), 1) * 1_000_000:>10.1f} '
+                f'мс CPU на 1000 рецептов'
+            )
+        if len(outputs) != 1:
+            raise CommandError('Ответы двух путей отличаются.')
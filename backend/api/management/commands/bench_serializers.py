@@ -0,0 +1,198 @@
+import json
+import tempfile
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test.utils import override_settings
+
+from api.benchmark import (DEFAULT_TOLERANCES, create_fixtures, fake_request,
+                           make_png, measure, regressions, rollback_atomic)
+from api.fields import Base64ImageField
+from api.serializers import (RecipeCreateUpdateSerializer, RecipeSerializer,
+                             SubscriptionToRepresentationSerializer)
+from recipes.models import Recipe
+
+User = get_user_model()
+
+
+class Command(BaseCommand):
+    help = ('Микробенчмарки сериализаторов API: время на объект, '
+            'пик аллокаций и число SQL-запросов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=200,
+                            help='Количество рецептов в фикстурах.')
+        parser.add_argument('--writes', type=int, default=20,
+                            help='Количество рецептов на прогон записи.')
+        parser.add_argument('--repeat', type=int, default=5,
+                            help='Количество прогонов, берется лучший.')
+        parser.add_argument('--json', action='store_true',
+                            help='Вывести результаты в формате JSON.')
+        parser.add_argument('--baseline', default=str(
+            settings.SERIALIZER_BENCH_BASELINE_PATH
+        ), help='Файл с эталонными результатами и допусками.')
+        parser.add_argument('--save-baseline', action='store_true',
+                            help='Сохранить результаты как эталонные.')
+        parser.add_argument('--check', action='store_true',
+                            help='Завершиться с ошибкой, если результат хуже '
+                                 'эталонного больше допуска.')
+
+    def handle(self, *args, **options):
+        with tempfile.TemporaryDirectory() as media_root, \
+                override_settings(MEDIA_ROOT=media_root), \
+                rollback_atomic():
+            results = self.run_benchmarks(options)
+        if options['json']:
+            self.stdout.write(json.dumps(
+                [result.as_dict() for result in results],
+                ensure_ascii=False, indent=2
+            ))
+        else:
+            for result in results:
+                self.stdout.write(str(result))
+        if options['save_baseline']:
+            self.save_baseline(options, results)
+        elif options['check']:
+            self.check_baseline(options, results)
+
+    def load_baseline(self, path):
+        with open(path, encoding='utf8') as file:
+            return json.load(file)
+
+    def baseline_options(self, options):
+        """Параметры, от которых зависят результаты, кроме машины."""
+        return {
+            'recipes': options['recipes'],
+            'writes': options['writes'],
+            'vendor': connection.vendor,
+        }
+
+    def save_baseline(self, options, results):
+        try:
+            tolerances = self.load_baseline(options['baseline'])['tolerances']
+        except FileNotFoundError:
+            tolerances = DEFAULT_TOLERANCES
+        baseline = {
+            'options': self.baseline_options(options),
+            'tolerances': tolerances,
+            'results': {
+                result.name: {
+                    metric: result.as_dict()[metric] for metric in tolerances
+                }
+                for result in results
+            },
+        }
+        with open(options['baseline'], 'w', encoding='utf8') as file:
+            json.dump(baseline, file, ensure_ascii=False, indent=2)
+        self.stderr.write(f'Эталонные результаты сохранены: '
+                          f'{options["baseline"]}', self.style.SUCCESS)
+
+    def check_baseline(self, options, results):
+        try:
+            baseline = self.load_baseline(options['baseline'])
+        except FileNotFoundError:
+            raise CommandError(
+                f'Нет эталонных результатов: {options["baseline"]}'
+            )
+        if baseline['options'] != self.baseline_options(options):
+            raise CommandError(f'Эталон снят с другими параметрами: '
+                               f'{baseline["options"]}')
+        found = []
+        for result in results:
+            if result.name not in baseline['results']:
+                self.stderr.write(f'{result.name}: нет в эталоне',
+                                  self.style.WARNING)
+                continue
+            found.extend(regressions(
+                result, baseline['results'][result.name],
+                baseline['tolerances'],
+            ))
+        for regression in found:
+            self.stderr.write(f'Регрессия: {regression}')
+        if found:
+            raise CommandError(f'Регрессий: {len(found)}.')
+
+    def run_benchmarks(self, options):
+        data = create_fixtures(options['recipes'])
+        repeat = options['repeat']
+        writes = options['writes']
+        image = make_png()
+        recipe_ids = [recipe.id for recipe in data.recipes]
+        author_ids = [author.id for author in data.authors]
+
+        def recipe_list():
+            queryset = Recipe.objects.add_user_annotations(
+                data.viewer.pk
+            ).with_related(data.viewer.pk).filter(id__in=recipe_ids)
+            return RecipeSerializer(
+                queryset, many=True,
+                context={'request': fake_request(data.viewer)}
+            ).data
+
+        def subscriptions():
+            return SubscriptionToRepresentationSerializer(
+                User.objects.filter(id__in=author_ids), many=True,
+                context={'request': fake_request(
+                    data.viewer, query_params={'recipes_limit': '3'}
+                )}
+            ).data
+
+        def payload():
+            return {
+                'ingredients': [
+                    {'id': ingredient.id, 'amount': 2}
+                    for ingredient in data.ingredients[:5]
+                ],
+                'tags': [tag.id for tag in data.tags[:2]],
+                'image': image,
+                'name': 'Рецепт для бенчмарка',
+                'text': 'Описание рецепта',
+                'cooking_time': 15,
+            }
+
+        def create_serializers():
+            serializers = []
+            for _ in range(writes):
+                body = payload()
+                serializers.append(RecipeCreateUpdateSerializer(
+                    data=body,
+                    context={'request': fake_request(
+                        data.authors[0], data=body, method='POST'
+                    )}
+                ))
+            return serializers
+
+        def validated_serializers():
+            serializers = create_serializers()
+            for serializer in serializers:
+                serializer.is_valid(raise_exception=True)
+            return serializers
+
+        def validate(serializers):
+            for serializer in serializers:
+                serializer.is_valid(raise_exception=True)
+
+        def save(serializers):
+            for serializer in serializers:
+                serializer.save(author=data.authors[0])
+                serializer.data
+
+        def decode_images():
+            field = Base64ImageField()
+            for _ in range(writes):
+                field.to_internal_value(image)
+
+        return [
+            measure('RecipeSerializer(many=True)', recipe_list,
+                    len(recipe_ids), repeat=repeat),
+            measure('SubscriptionToRepresentationSerializer', subscriptions,
+                    len(author_ids), repeat=repeat),
+            measure('RecipeCreateUpdateSerializer.is_valid', validate,
+                    writes, setup=create_serializers, repeat=repeat),
+            measure('RecipeCreateUpdateSerializer.save', save,
+                    writes, setup=validated_serializers, repeat=repeat),
+            measure('Base64ImageField.to_internal_value', decode_images,
+                    writes, repeat=repeat),
+        ]
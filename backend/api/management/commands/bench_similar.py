@@ -0,0 +1,102 @@
+import time
+
+import numpy as np
+from django.core.management.base import BaseCommand
+
+from api.benchmark import create_fixtures, rollback_atomic
+from recipes.minhash import similar_recipes, update_signatures
+from recipes.models import RecipeIngredient
+
+
+def synthetic_sets(recipes, ingredients, clusters, size, rng):
+    """
+    Наборы ингредиентов с кластерами: каждый набор — базовый набор
+    своего кластера, в котором заменено от 0 до size // 2 ингредиентов.
+    """
+    bases = [rng.choice(ingredients, size, replace=False)
+             for _ in range(clusters)]
+    sets = []
+    for number in range(recipes):
+        chosen = set(bases[number % clusters])
+        for _ in range(rng.integers(0, size // 2 + 1)):
+            chosen.discard(rng.choice(sorted(chosen)))
+            chosen.add(int(rng.integers(ingredients)))
+        sets.append(sorted(chosen))
+    return sets
+
+
+class Command(BaseCommand):
+    help = ('Полнота и задержка поиска похожих рецептов (MinHash + LSH) '
+            'против точного сравнения по Жаккару на синтетических данных.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--recipes', type=int, default=5000,
+                            help='Количество рецептов в фикстурах.')
+        parser.add_argument('--ingredients', type=int, default=500,
+                            help='Количество ингредиентов.')
+        parser.add_argument('--clusters', type=int, default=250,
+                            help='Количество кластеров похожих рецептов.')
+        parser.add_argument('--size', type=int, default=8,
+                            help='Ингредиентов в рецепте.')
+        parser.add_argument('--queries', type=int, default=200,
+                            help='Количество запросов.')
+        parser.add_argument('--limit', type=int, default=10,
+                            help='Количество похожих рецептов в ответе.')
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        with rollback_atomic():
+            self.run_benchmark(options)
+
+    def run_benchmark(self, options):
+        rng = np.random.default_rng(options['seed'])
+        data = create_fixtures(
+            options['recipes'], ingredients_count=options['ingredients'],
+            ingredients_per_recipe=0,
+        )
+        sets = synthetic_sets(
+            len(data.recipes), len(data.ingredients), options['clusters'],
+            options['size'], rng,
+        )
+        RecipeIngredient.objects.bulk_create(
+            (RecipeIngredient(recipe=recipe,
+                              ingredient=data.ingredients[position],
+                              amount=1)
+             for recipe, chosen in zip(data.recipes, sets)
+             for position in chosen),
+            batch_size=5000,
+        )
+        recipe_ids = np.array([recipe.id for recipe in data.recipes])
+        started = time.perf_counter()
+        update_signatures(recipe_ids.tolist())
+        self.stdout.write(
+            f'Подписи {len(recipe_ids)} рецептов: '
+            f'{time.perf_counter() - started:.2f} с'
+        )
+        matrix = np.zeros((len(sets), len(data.ingredients)), dtype=np.int32)
+        for row, chosen in enumerate(sets):
+            matrix[row, chosen] = 1
+        sizes = matrix.sum(axis=1)
+        limit = options['limit']
+        recalls, latencies = [], []
+        for row in rng.choice(len(sets), options['queries'], replace=False):
+            started = time.perf_counter()
+            found = similar_recipes(int(recipe_ids[row]), limit)
+            latencies.append(time.perf_counter() - started)
+            intersection = matrix @ matrix[row]
+            jaccard = intersection / (sizes + sizes[row] - intersection)
+            jaccard[row] = -1
+            exact = np.sort(jaccard)[::-1][:limit]
+            threshold = exact[-1]
+            by_id = dict(zip(recipe_ids.tolist(), jaccard))
+            # При равных оценках годится любой рецепт с оценкой не ниже
+            # последней в точном top-N.
+            hits = sum(by_id[recipe_id] >= threshold
+                       for recipe_id, _ in found)
+            recalls.append(hits / len(exact))
+        latencies = np.array(latencies) * 1000
+        self.stdout.write(
+            f'recall@{limit}: {np.mean(recalls):.3f}, '
+            f'задержка p50 {np.percentile(latencies, 50):.2f} мс, '
+            f'p95 {np.percentile(latencies, 95):.2f} мс'
+        )
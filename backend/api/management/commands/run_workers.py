@@ -0,0 +1,77 @@
+import multiprocessing
+import signal
+import threading
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import connections
+
+from api.exports import purge_exports
+from api.jobs import purge_finished, requeue_stale, work
+
+
+def run_process(stop, poll_interval, once):
+    """
+    Процесс-воркер: сигналы получает основной процесс, а воркер
+    останавливается по stop, дождавшись конца текущей задачи.
+    """
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+    signal.signal(signal.SIGTERM, signal.SIG_IGN)
+    work(stop, poll_interval, once)
+
+
+class Command(BaseCommand):
+    help = 'Воркеры фоновых задач из очереди Job.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int,
+                            default=settings.JOB_WORKERS,
+                            help='Количество воркеров.')
+        parser.add_argument('--processes', action='store_true',
+                            help='Воркеры-процессы вместо потоков.')
+        parser.add_argument('--poll-interval', type=float,
+                            default=settings.JOB_POLL_INTERVAL,
+                            help='Пауза при пустой очереди, секунд.')
+        parser.add_argument('--once', action='store_true',
+                            help='Выполнить готовые задачи и завершиться.')
+
+    def handle(self, *args, **options):
+        requeue_stale()
+        purge_finished()
+        purge_exports()
+        connections.close_all()
+        if options['processes']:
+            context = multiprocessing.get_context('fork')
+            stop = context.Event()
+            workers = [
+                context.Process(target=run_process, args=(
+                    stop, options['poll_interval'], options['once']
+                ))
+                for _ in range(options['workers'])
+            ]
+        else:
+            stop = threading.Event()
+            workers = [
+                threading.Thread(target=work, args=(
+                    stop, options['poll_interval'], options['once']
+                ))
+                for _ in range(options['workers'])
+            ]
+        for signum in (signal.SIGINT, signal.SIGTERM):
+            signal.signal(signum, lambda signum, frame: stop.set())
+        for worker in workers:
+            worker.start()
+        self.stdout.write(f'Запущено воркеров: {len(workers)}')
+        maintained_at = time.monotonic()
+        while (any(worker.is_alive() for worker in workers)
+               and not stop.is_set()):
+            time.sleep(1)
+            if (time.monotonic() - maintained_at
+                    >= settings.JOB_MAINTENANCE_INTERVAL):
+                requeue_stale()
+                purge_finished()
+                purge_exports()
+                maintained_at = time.monotonic()
+        for worker in workers:
+            worker.join()
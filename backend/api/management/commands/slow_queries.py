@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from api.models import QueryStat
+
+ORDERINGS = {
+    'total': '-total_time',
+    'max': '-max_time',
+    'calls': '-calls',
+}
+
+
+class Command(BaseCommand):
+    help = 'Самые затратные медленные и повторяющиеся (N+1) SQL-запросы.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--kind', choices=[
+            kind for kind, _ in QueryStat.KINDS
+        ], help='Только медленные или только повторяющиеся запросы.')
+        parser.add_argument('--order', choices=ORDERINGS, default='total',
+                            help='Сортировка: суммарное время, максимум '
+                                 'или число запросов.')
+        parser.add_argument('--limit', type=int, default=20,
+                            help='Количество строк.')
+        parser.add_argument('--reset', action='store_true',
+                            help='Очистить накопленную статистику.')
+
+    def handle(self, *args, **options):
+        if options['reset']:
+            deleted, _ = QueryStat.objects.all().delete()
+            self.stdout.write(f'Удалено записей: {deleted}')
+            return
+        stats = QueryStat.objects.order_by(ORDERINGS[options['order']])
+        if options['kind']:
+            stats = stats.filter(kind=options['kind'])
+        for stat in stats[:options['limit']]:
+            self.stdout.write(
+                f'{stat.get_kind_display()} {stat.location}: '
+                f'{stat.calls} запросов, {stat.total_time:.1f} мс всего, '
+                f'максимум {stat.max_time:.1f} мс'
+            )
+            self.stdout.write(f'  {stat.sql}')
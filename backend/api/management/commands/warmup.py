@@ -0,0 +1,62 @@
+import json
+import subprocess
+import sys
+import time
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.core.wsgi import get_wsgi_application
+
+from api.warmup import get, warmup
+
+
+class Command(BaseCommand):
+    help = ('Прогрев процесса: импорт модулей, резолвер URL, поля '
+            'сериализаторов, кэши тэгов, ингредиентов и ленты.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--measure', action='store_true',
+                            help='Сравнить время первого запроса в новых '
+                                 'процессах без прогрева и после него.')
+        parser.add_argument('--probe', choices=('cold', 'warm'),
+                            help='Служебный режим для --measure: время '
+                                 'первых запросов в этом процессе.')
+
+    def handle(self, *args, **options):
+        if options['measure']:
+            return self.measure()
+        application = get_wsgi_application()
+        if options['probe']:
+            return self.probe(application, options['probe'] == 'warm')
+        for name, duration in warmup(application).items():
+            self.stdout.write(f'{name}: {duration * 1000:.1f} мс')
+
+    def probe(self, application, warm):
+        timings = {}
+        if warm:
+            timings['warmup'] = sum(warmup(application).values())
+        for path in settings.WARMUP_PATHS:
+            started = time.perf_counter()
+            status = get(application, path)
+            timings[path] = time.perf_counter() - started
+            if status >= 400:
+                raise CommandError(f'{path}: статус {status}')
+        self.stdout.write(json.dumps(timings))
+
+    def run_probe(self, mode):
+        result = subprocess.run(
+            [sys.executable, sys.argv[0], 'warmup', '--probe', mode],
+            capture_output=True, text=True,
+        )
+        if result.returncode:
+            raise CommandError(result.stderr)
+        return json.loads(result.stdout.splitlines()[-1])
+
+    def measure(self):
+        cold, warm = self.run_probe('cold'), self.run_probe('warm')
+        self.stdout.write(f'Прогрев: {warm.pop("warmup") * 1000:.1f} мс')
+        for path in cold:
+            self.stdout.write(
+                f'{path}: без прогрева {cold[path] * 1000:.1f} мс, '
+                f'после прогрева {warm[path] * 1000:.1f} мс'
+            )
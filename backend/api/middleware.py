@@ -0,0 +1,252 @@
+import hashlib
+import logging
+import random
+import re
+import zlib
+from contextlib import ExitStack
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import MiddlewareNotUsed
+from django.db import connections
+from django.http import JsonResponse
+from django.utils.cache import patch_vary_headers
+from rest_framework.authentication import TokenAuthentication
+from rest_framework.exceptions import AuthenticationFailed
+
+from api.profiling import RequestProfile, check_token
+from api.query_log import QueryLog
+from backend.metrics import record_cache
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+ACCEPT_ENCODING_RE = re.compile(
+    r'\s*([\w*-]+)\s*(?:;\s*q\s*=\s*([0-9.]+))?\s*'
+)
+
+PRECOMPRESSED_CACHE_PREFIX = 'compression'
+
+PROFILING_MODES = ('save', 'summary')
+
+logger = logging.getLogger(__name__)
+
+
+def accepted_encodings(header):
+    """Кодировки из Accept-Encoding с ненулевым весом."""
+    encodings = {}
+    for part in header.split(','):
+        match = ACCEPT_ENCODING_RE.fullmatch(part)
+        if match is None:
+            continue
+        try:
+            weight = float(match[2]) if match[2] else 1.0
+        except ValueError:
+            continue
+        encodings[match[1].lower()] = weight
+    return {encoding for encoding, weight in encodings.items() if weight > 0}
+
+
+def choose_encoding(header):
+    accepted = accepted_encodings(header)
+    if brotli is not None and 'br' in accepted:
+        return 'br'
+    if 'gzip' in accepted:
+        return 'gzip'
+    return None
+
+
+def compress(content, encoding):
+    if encoding == 'br':
+        return brotli.compress(
+            content, quality=settings.COMPRESSION_BROTLI_QUALITY
+        )
+    compressor = zlib.compressobj(
+        settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED, zlib.MAX_WBITS | 16
+    )
+    return compressor.compress(content) + compressor.flush()
+
+
+def compress_sequence(sequence, encoding):
+    """Сжимает поток по частям, не собирая его целиком в памяти."""
+    if encoding == 'br':
+        compressor = brotli.Compressor(
+            quality=settings.COMPRESSION_BROTLI_QUALITY
+        )
+        process, finish = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(
+            settings.COMPRESSION_GZIP_LEVEL, zlib.DEFLATED,
+            zlib.MAX_WBITS | 16
+        )
+        process, finish = compressor.compress, compressor.flush
+    for chunk in sequence:
+        data = process(chunk)
+        if data:
+            yield data
+    yield finish()
+
+
+class CompressionMiddleware:
+    """
+    Сжимает ответы gzip или brotli по заголовку Accept-Encoding,
+    в том числе потоковые (FileResponse выгрузки списка покупок).
+    Не трогает ответы меньше COMPRESSION_MIN_SIZE, уже сжатые
+    форматы и ответы с X-Accel-Redirect, которые отдает nginx.
+    Для COMPRESSION_CACHED_PATHS сжатое тело кэшируется по хэшу
+    исходного, чтобы одинаковые справочники не сжимались повторно.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        response = self.get_response(request)
+        patch_vary_headers(response, ('Accept-Encoding',))
+        encoding = choose_encoding(
+            request.META.get('HTTP_ACCEPT_ENCODING', '')
+        )
+        if encoding is None or not self.is_compressible(response):
+            return response
+        if response.streaming:
+            response.streaming_content = compress_sequence(
+                response.streaming_content, encoding
+            )
+            del response['Content-Length']
+        else:
+            response.content = self.compressed_content(
+                request, response.content, encoding
+            )
+            # CommonMiddleware внутри цепочки уже выставил длину
+            # несжатого тела.
+            response['Content-Length'] = str(len(response.content))
+        etag = response.get('ETag')
+        if etag and etag.startswith('"'):
+            response['ETag'] = 'W/' + etag
+        response['Content-Encoding'] = encoding
+        return response
+
+    def is_compressible(self, response):
+        if (response.has_header('Content-Encoding')
+                or response.has_header('X-Accel-Redirect')
+                or response.status_code in (204, 304)):
+            return False
+        content_type = response.get('Content-Type', '').split(';')[0]
+        if not content_type.strip().lower().startswith(
+            settings.COMPRESSION_CONTENT_TYPES
+        ):
+            return False
+        if response.streaming:
+            length = response.get('Content-Length')
+            return length is None or int(length) >= (
+                settings.COMPRESSION_MIN_SIZE
+            )
+        return len(response.content) >= settings.COMPRESSION_MIN_SIZE
+
+    def compressed_content(self, request, content, encoding):
+        if not request.path.startswith(settings.COMPRESSION_CACHED_PATHS):
+            return compress(content, encoding)
+        key = (f'{PRECOMPRESSED_CACHE_PREFIX}:{encoding}:'
+               f'{hashlib.sha1(content).hexdigest()}')
+        compressed = cache.get(key)
+        record_cache('compression', compressed is not None)
+        if compressed is None:
+            compressed = compress(content, encoding)
+            cache.set(key, compressed, settings.COMPRESSION_CACHE_TTL)
+        return compressed
+
+
+class ProfilingMiddleware:
+    """
+    Профилирует представление под cProfile и собирает его SQL-запросы.
+    Включается подписанным заголовком X-Profile (команда
+    profiling_token), параметром ?profile=save|summary для staff или
+    случайно для доли PROFILING_SAMPLE_RATE запросов к вьюсетам
+    с profiling_sample. Профиль сохраняется в PROFILING_DIR, а при
+    режиме summary вместо ответа возвращается дерево вызовов.
+    При PROFILING_ENABLED=False middleware исключается из цепочки.
+    """
+
+    def __init__(self, get_response):
+        if not settings.PROFILING_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        mode = self.requested_mode(request, view_func)
+        if mode is None:
+            return None
+
+        def view():
+            response = view_func(request, *view_args, **view_kwargs)
+            if callable(getattr(response, 'render', None)):
+                response = response.render()
+            return response
+
+        profile = RequestProfile(request)
+        response = profile.run(view)
+        if mode == 'summary':
+            return JsonResponse(
+                profile.summary(response.status_code),
+                json_dumps_params={'ensure_ascii': False},
+            )
+        try:
+            profile.save(response.status_code)
+        except OSError:
+            logger.exception('Не удалось сохранить профиль %s', request.path)
+        return response
+
+    def requested_mode(self, request, view_func):
+        token = request.META.get('HTTP_X_PROFILE')
+        if token and check_token(token):
+            mode = request.META.get('HTTP_X_PROFILE_MODE', 'save')
+            return mode if mode in PROFILING_MODES else 'save'
+        mode = request.GET.get('profile')
+        if mode in PROFILING_MODES and self.is_staff(request):
+            return mode
+        view_class = getattr(view_func, 'cls', None)
+        if (getattr(view_class, 'profiling_sample', False)
+                and random.random() < settings.PROFILING_SAMPLE_RATE):
+            return 'save'
+        return None
+
+    def is_staff(self, request):
+        """
+        Пользователь из сессии или токена: аутентификация DRF еще
+        не выполнена, поэтому токен проверяется здесь.
+        """
+        if request.user.is_staff:
+            return True
+        try:
+            credentials = TokenAuthentication().authenticate(request)
+        except AuthenticationFailed:
+            return False
+        return credentials is not None and credentials[0].is_staff
+
+
+class QueryLogMiddleware:
+    """
+    Подключает QueryLog ко всем соединениям на время запроса и
+    копит найденные медленные и повторяющиеся запросы для QueryStat.
+    При SLOW_QUERY_LOG_ENABLED=False (по умолчанию) исключается
+    из цепочки.
+    """
+
+    def __init__(self, get_response):
+        if not settings.SLOW_QUERY_LOG_ENABLED:
+            raise MiddlewareNotUsed
+        self.get_response = get_response
+
+    def __call__(self, request):
+        query_log = QueryLog()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(query_log))
+            response = self.get_response(request)
+        query_log.save()
+        return response
@@ -0,0 +1,33 @@
+# Generated by Django 3.2.3 on 2026-10-19 10:36
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    initial = True
+
+    dependencies = [
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='QueryStat',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=40, unique=True, verbose_name='Ключ')),
+                ('kind', models.CharField(choices=[('slow', 'Медленный'), ('repeated', 'Повторяющийся')], max_length=8, verbose_name='Тип')),
+                ('location', models.CharField(max_length=255, verbose_name='Место в коде')),
+                ('sql', models.TextField(verbose_name='SQL')),
+                ('calls', models.PositiveBigIntegerField(default=0, verbose_name='Запросов')),
+                ('total_time', models.FloatField(default=0, verbose_name='Суммарное время, мс')),
+                ('max_time', models.FloatField(default=0, verbose_name='Максимальное время, мс')),
+                ('last_seen', models.DateTimeField(auto_now=True, verbose_name='Последний раз')),
+            ],
+            options={
+                'verbose_name': 'Статистика SQL-запроса',
+                'verbose_name_plural': 'Статистика SQL-запросов',
+                'ordering': ('-total_time',),
+            },
+        ),
+    ]
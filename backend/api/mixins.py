@@ -1,9 +1,16 @@
+from operator import attrgetter
+
 from django.contrib.auth import get_user_model
-from rest_framework import generics, status
-from rest_framework.permissions import IsAuthenticated
+from django.db import connections, router
+from django.utils.functional import cached_property
+from rest_framework import generics, serializers, status
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS, IsAuthenticated
+from rest_framework.relations import PKOnlyObject
 from rest_framework.response import Response
 
 from recipes.models import Recipe
+from recipes.user_ids import invalidate
 
 User = get_user_model()
 
@@ -11,42 +18,289 @@ User = get_user_model()
 class CustomCreateDestroyMixin(generics.CreateAPIView,
                                generics.DestroyAPIView):
     """
-    Миксин для создания и удаления объектов избранного и корзины.
+    Миксин для создания и удаления объектов избранного, корзины и
+    подписок. Добавление и удаление выполняются одним запросом:
+    INSERT ... SELECT ... ON CONFLICT DO NOTHING RETURNING и
+    DELETE ... RETURNING. В PostgreSQL INSERT выполняется в CTE,
+    а запрос сразу возвращает колонки target_fields объекта для ответа;
+    в остальных базах объект читается вторым запросом. Существование
+    объекта проверяется отдельным запросом только тогда, когда строка
+    не добавилась. После записи сбрасывается набор id пользователя
+    (recipes.user_ids).
     """
 
     permission_classes = (IsAuthenticated,)
-    lookup_field = 'recipe__id'
     lookup_url_kwarg = 'id'
+    target_model = Recipe
+    target_field = 'recipe'
+    # Колонки объекта, которые нужны сериализатору ответа.
+    target_fields = ('id', 'name', 'image', 'cooking_time')
+    already_exists_message = 'Рецепт уже добавлен!'
+    does_not_exist_message = 'Такого объекта не существует!'
 
-    def check(self):
-        if not Recipe.objects.filter(
-            id=self.kwargs['id']
-        ).exists():
-            return Response(
-                'Такого объекта не существует!',
-                status=status.HTTP_400_BAD_REQUEST
-            )
+    def get_model(self):
+        return self.get_serializer_class().Meta.model
+
+    def validate_target(self, target_id):
+        """Сообщение об ошибке для недопустимого объекта или None."""
+        return None
+
+    def get_connection(self):
+        return connections[router.db_for_write(self.get_model())]
+
+    def execute(self, sql, params):
+        with self.get_connection().cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchone()
+
+    def insert(self, user_id, target_id):
+        """
+        Добавляет строку и возвращает объект с колонками target_fields
+        или None, если строка уже была или объекта не существует.
+        """
+        model = self.get_model()
+        connection = self.get_connection()
+        quote = connection.ops.quote_name
+        target_table = quote(self.target_model._meta.db_table)
+        target_pk = quote(self.target_model._meta.pk.column)
+        target_column = quote(
+            model._meta.get_field(self.target_field).column
+        )
+        insert = (
+            f'INSERT INTO {quote(model._meta.db_table)} '
+            f'({quote(model._meta.get_field("user").column)}, '
+            f'{target_column}) '
+            f'SELECT %s, {target_pk} FROM {target_table} '
+            f'WHERE {target_pk} = %s '
+            f'ON CONFLICT DO NOTHING '
+            f'RETURNING {target_column}'
+        )
+        params = [user_id, target_id]
+        if connection.vendor != 'postgresql':
+            if self.execute(insert, params) is None:
+                return None
+            return self.target_model.objects.using(connection.alias).only(
+                *self.target_fields
+            ).get(pk=target_id)
+        # from_db ожидает значения в порядке полей модели.
+        fields = [
+            field for field in self.target_model._meta.concrete_fields
+            if field.name in self.target_fields
+        ]
+        columns = ', '.join(
+            f'target.{quote(field.column)}' for field in fields
+        )
+        row = self.execute(
+            f'WITH inserted AS ({insert}) '
+            f'SELECT {columns} FROM {target_table} AS target '
+            f'JOIN inserted ON target.{target_pk} = inserted.{target_column}',
+            params
+        )
+        if row is None:
+            return None
+        return self.target_model.from_db(
+            connection.alias, [field.attname for field in fields], row
+        )
+
+    def delete_row(self, user_id, target_id):
+        model = self.get_model()
+        quote = self.get_connection().ops.quote_name
+        return self.execute(
+            f'DELETE FROM {quote(model._meta.db_table)} '
+            f'WHERE {quote(model._meta.get_field("user").column)} = %s '
+            f'AND {quote(model._meta.get_field(self.target_field).column)}'
+            f' = %s RETURNING {quote(model._meta.pk.column)}',
+            [user_id, target_id]
+        ) is not None
+
+    def target_exists(self, target_id):
+        return self.target_model.objects.using(
+            router.db_for_write(self.target_model)
+        ).filter(pk=target_id).exists()
 
     def create(self, request, *args, **kwargs):
-        self.check()
-        request.data['author'] = self.kwargs['id']
-        request.data['recipe'] = self.kwargs['id']
-        serializer = self.get_serializer(data=request.data)
-        serializer.is_valid(raise_exception=True)
-        self.perform_create(serializer)
-        headers = self.get_success_headers(serializer.data)
+        target_id = self.kwargs[self.lookup_url_kwarg]
+        target = None
+        error = self.validate_target(target_id)
+        if error is None:
+            target = self.insert(request.user.pk, target_id)
+            if target is None:
+                error = (
+                    self.already_exists_message
+                    if self.target_exists(target_id)
+                    else self.does_not_exist_message
+                )
+        if error is not None:
+            return Response(error, status=status.HTTP_400_BAD_REQUEST)
+        invalidate(self.get_model(), request.user.pk)
+        instance = self.get_model()(**{
+            'user': request.user, self.target_field: target,
+        })
         return Response(
-            serializer.data, status=status.HTTP_201_CREATED, headers=headers)
-
-    def perform_create(self, serializer):
-        serializer.save(user=self.request.user)
+            self.get_serializer(instance).data,
+            status=status.HTTP_201_CREATED
+        )
 
     def destroy(self, request, *args, **kwargs):
-        if not self.get_queryset().exists():
+        if not self.delete_row(
+            request.user.pk, self.kwargs[self.lookup_url_kwarg]
+        ):
             return Response(
-                'Такого объекта не существует!',
+                self.does_not_exist_message,
                 status=status.HTTP_400_BAD_REQUEST
             )
-        instance = self.get_object()
-        self.perform_destroy(instance)
+        invalidate(self.get_model(), request.user.pk)
         return Response(status=status.HTTP_204_NO_CONTENT)
+
+
+class CompiledRepresentationMixin:
+    """
+    Миксин для сериализаторов на горячем пути чтения.
+
+    Представление собирается словарем напрямую, без обхода полей DRF
+    на каждом объекте: для каждого поля один раз выбирается функция —
+    метод represent_<поле>, метод SerializerMethodField, представление
+    вложенного сериализатора, атрибут объекта для простых полей или,
+    в остальных случаях, обычный путь поля DRF. Порядок ключей
+    совпадает с порядком полей. Контекст
+    {'compiled_representation': False} включает обычный путь DRF.
+    """
+
+    plain_fields = (
+        serializers.BooleanField,
+        serializers.CharField,
+        serializers.IntegerField,
+        serializers.StringRelatedField,
+    )
+
+    def compile_field(self, name, field):
+        method = getattr(self, f'represent_{name}', None)
+        if method is not None:
+            return method
+        if isinstance(field, serializers.SerializerMethodField):
+            return getattr(self, field.method_name)
+        if field.source != '*' and isinstance(
+            field, self.plain_fields + (serializers.BaseSerializer,)
+        ):
+            get_attribute = attrgetter(field.source)
+            if isinstance(field, self.plain_fields):
+                return get_attribute
+
+            def get_nested(instance):
+                value = get_attribute(instance)
+                if value is None:
+                    return None
+                return field.to_representation(value)
+            return get_nested
+
+        def get_value(instance):
+            attribute = field.get_attribute(instance)
+            check_for_none = (
+                attribute.pk if isinstance(attribute, PKOnlyObject)
+                else attribute
+            )
+            if check_for_none is None:
+                return None
+            return field.to_representation(attribute)
+        return get_value
+
+    @cached_property
+    def compiled_getters(self):
+        return [
+            (name, self.compile_field(name, field))
+            for name, field in self.fields.items()
+            if not field.write_only
+        ]
+
+    def to_representation(self, instance):
+        if not self.context.get('compiled_representation', True):
+            return super().to_representation(instance)
+        return {
+            name: getter(instance) for name, getter in self.compiled_getters
+        }
+
+
+def parse_fieldset(values):
+    """
+    Дерево полей из значений ?fields= или ?omit=: 'id,author.username'
+    -> {'id': {}, 'author': {'username': {}}}. Пустой словарь — поле
+    целиком.
+    """
+    tree = {}
+    for value in values:
+        for path in value.split(','):
+            node = tree
+            for part in filter(None, path.strip().split('.')):
+                node = node.setdefault(part, {})
+    return tree
+
+
+def is_requested(path, include, omit):
+    """Нужно ли поле path ('author.is_subscribed') в ответе."""
+    for part in path.split('.'):
+        if include is not None:
+            if part not in include:
+                return False
+            include = include[part] or None
+        if omit is not None:
+            if part not in omit:
+                omit = None
+            elif not omit[part]:
+                return False
+            else:
+                omit = omit[part]
+    return True
+
+
+def trim_serializer(serializer, include, omit, prefix=''):
+    """Удаляет из сериализатора (и вложенных) поля вне fields и из omit."""
+    fields = getattr(serializer, 'child', serializer).fields
+    unknown = (set(include or ()) | set(omit or ())) - set(fields)
+    if unknown:
+        raise ValidationError({'fields': 'Неизвестные поля: {}.'.format(
+            ', '.join(sorted(prefix + name for name in unknown))
+        )})
+    for name in list(fields):
+        if not is_requested(name, include, omit):
+            del fields[name]
+            continue
+        nested_include = (include or {}).get(name) or None
+        nested_omit = (omit or {}).get(name) or None
+        if nested_include is None and nested_omit is None:
+            continue
+        if not isinstance(
+            getattr(fields[name], 'child', fields[name]),
+            serializers.BaseSerializer
+        ):
+            raise ValidationError({
+                'fields': f'Поле {prefix}{name} не содержит вложенных полей.'
+            })
+        trim_serializer(fields[name], nested_include, nested_omit,
+                        f'{prefix}{name}.')
+
+
+class SparseFieldsetMixin:
+    """
+    Миксин для вьюсетов: ?fields= и ?omit= (через запятую, вложенные
+    поля через точку) сокращают поля ответа на GET-запросы.
+    Вьюсет проверяет is_field_requested, чтобы не подгружать связи
+    и не вычислять аннотации для полей, которых нет в ответе.
+    """
+
+    @cached_property
+    def fieldset(self):
+        if self.request.method not in SAFE_METHODS:
+            return None, None
+        params = self.request.query_params
+        include = parse_fieldset(params.getlist('fields')) or None
+        omit = parse_fieldset(params.getlist('omit')) or None
+        return include, omit
+
+    def is_field_requested(self, path):
+        return is_requested(path, *self.fieldset)
+
+    def get_serializer(self, *args, **kwargs):
+        serializer = super().get_serializer(*args, **kwargs)
+        if self.fieldset != (None, None):
+            trim_serializer(serializer, *self.fieldset)
+        return serializer
@@ -0,0 +1,151 @@
+from django.conf import settings
+from django.db import models
+from django.utils import timezone
+
+
+class QueryStat(models.Model):
+    """
+    Сводка по медленным и повторяющимся (N+1) SQL-запросам
+    для одного места в коде приложения.
+    """
+
+    SLOW = 'slow'
+    REPEATED = 'repeated'
+    KINDS = (
+        (SLOW, 'Медленный'),
+        (REPEATED, 'Повторяющийся'),
+    )
+
+    key = models.CharField(
+        max_length=40,
+        unique=True,
+        verbose_name='Ключ',
+    )
+    kind = models.CharField(
+        max_length=8,
+        choices=KINDS,
+        verbose_name='Тип',
+    )
+    location = models.CharField(
+        max_length=settings.MAX_LEN_QUERY_LOCATION,
+        verbose_name='Место в коде',
+    )
+    sql = models.TextField(
+        verbose_name='SQL',
+    )
+    calls = models.PositiveBigIntegerField(
+        default=0,
+        verbose_name='Запросов',
+    )
+    total_time = models.FloatField(
+        default=0,
+        verbose_name='Суммарное время, мс',
+    )
+    max_time = models.FloatField(
+        default=0,
+        verbose_name='Максимальное время, мс',
+    )
+    last_seen = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Последний раз',
+    )
+
+    class Meta:
+        verbose_name = 'Статистика SQL-запроса'
+        verbose_name_plural = 'Статистика SQL-запросов'
+        ordering = ('-total_time',)
+
+    def __str__(self):
+        return f'{self.get_kind_display()}: {self.location}'
+
+
+class Job(models.Model):
+    """
+    Фоновая задача: путь к функции и ее аргументы. Задачи забирают
+    воркеры команды run_workers через SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+
+    QUEUED = 'queued'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUSES = (
+        (QUEUED, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    )
+
+    name = models.CharField(
+        max_length=settings.MAX_LEN_JOB_NAME,
+        verbose_name='Функция',
+    )
+    key = models.CharField(
+        max_length=settings.MAX_LEN_JOB_NAME,
+        unique=True,
+        null=True,
+        blank=True,
+        verbose_name='Ключ для исключения дублей',
+    )
+    payload = models.JSONField(
+        default=dict,
+        verbose_name='Аргументы',
+    )
+    user = models.ForeignKey(
+        settings.AUTH_USER_MODEL,
+        null=True,
+        blank=True,
+        related_name='jobs',
+        verbose_name='Пользователь',
+        on_delete=models.CASCADE
+    )
+    status = models.CharField(
+        max_length=7,
+        choices=STATUSES,
+        default=QUEUED,
+        verbose_name='Статус',
+    )
+    attempts = models.PositiveSmallIntegerField(
+        default=0,
+        verbose_name='Попыток',
+    )
+    run_at = models.DateTimeField(
+        default=timezone.now,
+        verbose_name='Запустить не раньше',
+    )
+    locked_at = models.DateTimeField(
+        null=True,
+        blank=True,
+        verbose_name='Взята в работу',
+    )
+    result = models.JSONField(
+        null=True,
+        blank=True,
+        verbose_name='Результат',
+    )
+    error = models.TextField(
+        blank=True,
+        verbose_name='Ошибка',
+    )
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        verbose_name='Создана',
+    )
+    updated_at = models.DateTimeField(
+        auto_now=True,
+        verbose_name='Изменена',
+    )
+
+    class Meta:
+        verbose_name = 'Фоновая задача'
+        verbose_name_plural = 'Фоновые задачи'
+        ordering = ('-created_at',)
+        indexes = [
+            models.Index(
+                fields=['status', 'run_at'],
+                name='job_status_run_at_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.name} ({self.get_status_display()})'
@@ -1,14 +1,107 @@
+import hashlib
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import Paginator
+from django.db import connections
+from django.db.models import QuerySet
+from django.utils.functional import cached_property
 from rest_framework.pagination import PageNumberPagination
 from rest_framework.utils.urls import remove_query_param, replace_query_param
 
+from backend.metrics import record_cache
+
+COUNT_CACHE_PREFIX = 'pagination:count'
+
+
+def count_queryset(queryset):
+    """
+    Запрос для подсчета: без сортировки, select_related и аннотаций,
+    чтобы COUNT не оборачивался в подзапрос. Фильтры по аннотациям
+    не теряются: в WHERE хранятся сами выражения.
+    """
+    queryset = queryset.order_by()
+    query = queryset.query
+    query.select_related = False
+    if query.group_by is None and not query.distinct and not any(
+        annotation.contains_aggregate
+        for annotation in query.annotations.values()
+    ):
+        query.annotations = {}
+        query.set_annotation_mask(None)
+    return queryset
+
+
+def estimated_count(queryset):
+    """
+    Оценка планировщика PostgreSQL (pg_class.reltuples) для запроса
+    без фильтров по таблице больше PAGINATION_ESTIMATE_THRESHOLD строк.
+    """
+    query = queryset.query
+    connection = connections[queryset.db]
+    if (connection.vendor != 'postgresql' or query.where
+            or query.distinct or query.group_by is not None):
+        return None
+    with connection.cursor() as cursor:
+        cursor.execute(
+            'SELECT reltuples FROM pg_class WHERE oid = %s::regclass',
+            [connection.ops.quote_name(queryset.model._meta.db_table)]
+        )
+        row = cursor.fetchone()
+    if row is None or row[0] < settings.PAGINATION_ESTIMATE_THRESHOLD:
+        return None
+    return int(row[0])
+
+
+class CountingPaginator(Paginator):
+    """
+    Пагинатор с дешевым подсчетом: точный COUNT по упрощенному
+    запросу кэшируется по хэшу его SQL на PAGINATION_COUNT_CACHE_TTL,
+    для больших таблиц без фильтров берется оценка планировщика.
+    """
+
+    count_is_approximate = False
+
+    @cached_property
+    def count(self):
+        if not isinstance(self.object_list, QuerySet):
+            return len(self.object_list)
+        queryset = count_queryset(self.object_list)
+        estimate = estimated_count(queryset)
+        if estimate is not None:
+            self.count_is_approximate = True
+            return estimate
+        try:
+            sql, params = queryset.query.sql_with_params()
+        except EmptyResultSet:
+            return 0
+        key = '{}:{}'.format(COUNT_CACHE_PREFIX, hashlib.sha1(
+            f'{queryset.db}:{sql}:{params!r}'.encode('utf8')
+        ).hexdigest())
+        count = cache.get(key)
+        record_cache('pagination_count', count is not None)
+        if count is None:
+            count = queryset.count()
+            cache.set(key, count, settings.PAGINATION_COUNT_CACHE_TTL)
+        return count
+
 
 class CustomPagination(PageNumberPagination):
     '''Кастомный пагинатор'''
 
+    django_paginator_class = CountingPaginator
+
     page_size_query_param = 'limit'
 
     page_size = 6
 
+    def get_paginated_response(self, data):
+        response = super().get_paginated_response(data)
+        if getattr(self.page.paginator, 'count_is_approximate', False):
+            response['X-Count-Approximate'] = 'true'
+        return response
+
     def get_link(self, url, page_number):
         url = remove_query_param(url, self.page_size_query_param)
         return replace_query_param(url, self.page_query_param, page_number)
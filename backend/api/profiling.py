@@ -0,0 +1,138 @@
+import cProfile
+import json
+import os
+import pstats
+import re
+import time
+from contextlib import ExitStack
+from datetime import datetime
+
+from django.conf import settings
+from django.core import signing
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+PROFILING_SALT = 'api.profiling'
+PROFILING_TOKEN_VALUE = 'profile'
+
+
+def make_token():
+    """Значение заголовка X-Profile, подписанное SECRET_KEY."""
+    return signing.TimestampSigner(salt=PROFILING_SALT).sign(
+        PROFILING_TOKEN_VALUE
+    )
+
+
+def check_token(token):
+    try:
+        return signing.TimestampSigner(salt=PROFILING_SALT).unsign(
+            token, max_age=settings.PROFILING_TOKEN_MAX_AGE
+        ) == PROFILING_TOKEN_VALUE
+    except signing.BadSignature:
+        return False
+
+
+def function_name(function):
+    filename, line, name = function
+    return f'{name} ({os.path.basename(filename)}:{line})'
+
+
+def call_tree(stats, root, total, depth, threshold, seen=()):
+    """Дерево вызовов по pstats: только узлы дольше threshold от total."""
+    calls, _, own_time, cumulative_time, _ = stats.stats[root]
+    node = {
+        'function': function_name(root),
+        'calls': calls,
+        'own_ms': round(own_time * 1000, 2),
+        'cumulative_ms': round(cumulative_time * 1000, 2),
+    }
+    if depth > 0:
+        children = [
+            function for function, (*_, callers) in stats.stats.items()
+            if root in callers and function not in seen
+            and callers[root][3] >= total * threshold
+        ]
+        children.sort(key=lambda function: -stats.stats[function][3])
+        node['children'] = [
+            call_tree(stats, child, total, depth - 1, threshold,
+                      seen + (root,))
+            for child in children
+        ]
+    return node
+
+
+class RequestProfile:
+    """cProfile и SQL-запросы одного запроса."""
+
+    def __init__(self, request):
+        self.request = request
+        self.profiler = cProfile.Profile()
+        self.queries = []
+        self.duration = 0
+
+    def run(self, func):
+        with ExitStack() as stack:
+            captured = [
+                stack.enter_context(CaptureQueriesContext(connection))
+                for connection in connections.all()
+            ]
+            started = time.perf_counter()
+            try:
+                return self.profiler.runcall(func)
+            finally:
+                self.duration = time.perf_counter() - started
+                self.queries = [
+                    dict(query, alias=context.connection.alias)
+                    for context in captured
+                    for query in context.captured_queries
+                ]
+
+    def summary(self, status_code):
+        stats = pstats.Stats(self.profiler)
+        root = max(stats.stats, key=lambda function: stats.stats[function][3])
+        return {
+            'path': self.request.get_full_path(),
+            'status': status_code,
+            'duration_ms': round(self.duration * 1000, 2),
+            'queries': len(self.queries),
+            'sql_ms': round(sum(
+                float(query['time']) for query in self.queries
+            ) * 1000, 2),
+            'call_tree': call_tree(
+                stats, root, stats.total_tt,
+                settings.PROFILING_TREE_DEPTH,
+                settings.PROFILING_TREE_THRESHOLD,
+            ),
+        }
+
+    def save(self, status_code):
+        """Профиль и запросы в PROFILING_DIR; старые файлы удаляются."""
+        os.makedirs(settings.PROFILING_DIR, exist_ok=True)
+        slug = re.sub(r'[^\w]+', '_', self.request.path).strip('_')
+        base = os.path.join(
+            settings.PROFILING_DIR,
+            f'{datetime.now():%Y%m%d-%H%M%S-%f}-{os.getpid()}-'
+            f'{self.request.method}-{slug}'[:200]
+        )
+        self.profiler.dump_stats(f'{base}.prof')
+        with open(f'{base}.json', 'w', encoding='utf8') as file:
+            json.dump(
+                dict(self.summary(status_code), sql=self.queries),
+                file, ensure_ascii=False, indent=2,
+            )
+        rotate(settings.PROFILING_DIR, settings.PROFILING_KEEP)
+        return base
+
+
+def rotate(directory, keep):
+    paths = sorted(
+        (entry.path for entry in os.scandir(directory)
+         if entry.name.endswith('.prof')),
+        key=os.path.getmtime,
+    )
+    for path in paths[:max(len(paths) - keep, 0)]:
+        for extension in ('.prof', '.json'):
+            try:
+                os.remove(path[:-len('.prof')] + extension)
+            except FileNotFoundError:
+                pass
@@ -0,0 +1,174 @@
+import hashlib
+import logging
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter, defaultdict
+
+from django.conf import settings
+from django.db import DatabaseError, IntegrityError, transaction
+from django.db.models import F
+from django.db.models.functions import Greatest
+from django.utils import timezone
+
+from api.jobs import enqueue
+from api.models import QueryStat
+
+logger = logging.getLogger('api.queries')
+
+PLACEHOLDERS_RE = re.compile(r'%s(?:\s*,\s*%s)+')
+
+THIS_FILE = os.path.abspath(__file__)
+
+
+def normalize_sql(sql):
+    """SQL без длины списков IN, чтобы запросы группировались."""
+    return PLACEHOLDERS_RE.sub('%s, ...', sql)
+
+
+def app_roots():
+    return tuple(
+        os.path.join(str(settings.BASE_DIR), app) + os.sep
+        for app in settings.SLOW_QUERY_APPS
+    )
+
+
+def code_location(roots):
+    """Первый кадр стека из кода приложений, кроме этого модуля."""
+    frame = sys._getframe(1)
+    while frame is not None:
+        filename = frame.f_code.co_filename
+        if filename.startswith(roots) and filename != THIS_FILE:
+            return '{}:{} {}'.format(
+                os.path.relpath(filename, str(settings.BASE_DIR)),
+                frame.f_lineno, frame.f_code.co_name,
+            )
+        frame = frame.f_back
+    return 'unknown'
+
+
+class QueryLog:
+    """
+    execute_wrapper, который замеряет каждый запрос. Запросы дольше
+    SLOW_QUERY_THRESHOLD_MS и запросы, повторенные в одном запросе
+    к API SLOW_QUERY_REPEAT_THRESHOLD раз (N+1), пишутся в лог
+    с местом в коде и копятся для QueryStat.
+    """
+
+    def __init__(self):
+        self.roots = app_roots()
+        self.threshold = settings.SLOW_QUERY_THRESHOLD_MS / 1000
+        self.repeat_threshold = settings.SLOW_QUERY_REPEAT_THRESHOLD
+        self.counts = Counter()
+        self.durations = defaultdict(list)
+        self.repeated = {}
+        self.slow = {}
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.observe(sql, time.perf_counter() - started)
+
+    def observe(self, sql, duration):
+        self.counts[sql] += 1
+        self.durations[sql].append(duration)
+        if duration >= self.threshold:
+            location = code_location(self.roots)
+            logger.warning('Медленный запрос %.1f мс в %s: %s',
+                           duration * 1000, location, sql)
+            self.slow.setdefault((sql, location), []).append(duration)
+        if self.counts[sql] == self.repeat_threshold:
+            self.repeated[sql] = code_location(self.roots)
+            logger.warning('Запрос повторен %d раз в %s: %s',
+                           self.repeat_threshold, self.repeated[sql], sql)
+
+    def findings(self):
+        """(тип, место, SQL, длительности) для сохранения в QueryStat."""
+        for (sql, location), durations in self.slow.items():
+            yield QueryStat.SLOW, location, sql, durations
+        for sql, location in self.repeated.items():
+            yield QueryStat.REPEATED, location, sql, self.durations[sql]
+
+    def save(self):
+        """Добавляет находки в буфер процесса, см. StatsBuffer."""
+        for kind, location, sql, durations in self.findings():
+            stats_buffer.add(
+                kind, location[:settings.MAX_LEN_QUERY_LOCATION],
+                normalize_sql(sql), durations,
+            )
+        stats_buffer.flush_if_due()
+
+
+class StatsBuffer:
+    """
+    Статистика находок, накопленная в памяти процесса. Раз
+    в SLOW_QUERY_FLUSH_INTERVAL секунд она одной фоновой задачей
+    уходит в QueryStat: запросы к API не пишут в общие строки таблицы
+    и не ждут блокировок. Статистика за последний интервал теряется,
+    если процесс завершится до сброса.
+    """
+
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.stats = {}
+        self.flushed_at = time.monotonic()
+
+    def add(self, kind, location, sql, durations):
+        with self.lock:
+            stat = self.stats.setdefault(
+                (kind, location, sql), [0, 0.0, 0.0]
+            )
+            stat[0] += len(durations)
+            stat[1] += sum(durations) * 1000
+            stat[2] = max(stat[2], max(durations) * 1000)
+
+    def take(self):
+        with self.lock:
+            stats, self.stats = self.stats, {}
+            self.flushed_at = time.monotonic()
+        return [[*key, *values] for key, values in stats.items()]
+
+    def flush_if_due(self):
+        if (time.monotonic() - self.flushed_at
+                < settings.SLOW_QUERY_FLUSH_INTERVAL):
+            return
+        stats = self.take()
+        if not stats:
+            return
+        try:
+            enqueue(record_stats, stats=stats)
+        except DatabaseError:
+            logger.exception('Не удалось сохранить статистику запросов')
+
+
+stats_buffer = StatsBuffer()
+
+
+def record_stats(stats):
+    """Фоновая задача: записывает накопленную статистику в QueryStat."""
+    for kind, location, sql, calls, total, longest in stats:
+        record(kind, location, sql, calls, total, longest)
+
+
+def record(kind, location, sql, calls, total, longest):
+    key = hashlib.sha1(f'{kind}:{location}:{sql}'.encode('utf8')).hexdigest()
+    changes = {
+        'calls': F('calls') + calls,
+        'total_time': F('total_time') + total,
+        'max_time': Greatest('max_time', longest),
+        'last_seen': timezone.now(),
+    }
+    if QueryStat.objects.filter(key=key).update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            QueryStat.objects.create(
+                key=key, kind=kind, location=location, sql=sql,
+                calls=calls, total_time=total, max_time=longest,
+            )
+    except IntegrityError:
+        QueryStat.objects.filter(key=key).update(**changes)
@@ -0,0 +1,36 @@
+import orjson
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+
+class FastJSONRenderer(JSONRenderer):
+    """
+    JSON-рендерер на orjson. Типы, которые orjson не сериализует сам
+    (Decimal, ленивые строки, QuerySet), передаются в JSONEncoder DRF,
+    поэтому ответ совпадает с JSONRenderer байт в байт. Для отступов
+    (браузерный API, ?indent) используется обычный рендерер.
+    """
+
+    options = (orjson.OPT_PASSTHROUGH_DATETIME
+               | orjson.OPT_PASSTHROUGH_DATACLASS)
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        renderer_context = renderer_context or {}
+        if self.get_indent(accepted_media_type, renderer_context):
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        try:
+            content = orjson.dumps(
+                data, default=JSONEncoder().default, option=self.options
+            )
+        except TypeError:
+            return super().render(
+                data, accepted_media_type, renderer_context
+            )
+        # Как и JSONRenderer, экранируем разделители строк для JavaScript.
+        return content.replace(
+            '\u2028'.encode('utf8'), b'\\u2028'
+        ).replace('\u2029'.encode('utf8'), b'\\u2029')
@@ -2,17 +2,59 @@ from django.conf import settings
 from django.contrib.auth import get_user_model
 from django.contrib.auth.validators import UnicodeUsernameValidator
 from django.core.validators import MaxLengthValidator, RegexValidator
+from django.db import transaction
+from django.urls import reverse
+from django.utils.functional import cached_property
 from djoser.serializers import UserCreateSerializer
 from rest_framework import serializers
 
+from api.batch import BATCH_METHODS
+from api.exports import ShoppingCartExport
 from api.fields import Base64ImageField
+from api.mixins import CompiledRepresentationMixin
+from api.models import Job
+from recipes.ingredient_index import ingredient_index
+from recipes.minhash import update_signatures
 from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
                             RecipeTag, ShoppingCart, Tag)
+from recipes.signals import schedule_image_release
+from recipes.storage import name_digest
+from recipes.user_ids import UserIdSets
 from users.models import Subscription
 
 User = get_user_model()
 
 
+def set_prefetched(instance, name, objects):
+    """
+    Кладет уже известные связанные объекты в кэш prefetch_related
+    экземпляра так же, как это делает сам Django.
+    """
+    if not hasattr(instance, '_prefetched_objects_cache'):
+        instance._prefetched_objects_cache = {}
+    instance._prefetched_objects_cache.pop(name, None)
+    queryset = getattr(instance, name).get_queryset()
+    queryset._result_cache = list(objects)
+    queryset._prefetch_done = True
+    instance._prefetched_objects_cache[name] = queryset
+
+
+def user_flag(context, obj, name, kind, object_id):
+    """
+    Признак объекта для текущего пользователя: аннотация запроса, если
+    она есть, иначе проверка по набору id пользователя. Наборы
+    создаются при первом обращении и общие для всех вложенных
+    сериализаторов запроса.
+    """
+    if hasattr(obj, name):
+        return getattr(obj, name)
+    if 'request' not in context:
+        return False
+    if 'user_id_sets' not in context:
+        context['user_id_sets'] = UserIdSets(context['request'].user)
+    return context['user_id_sets'].has(kind, object_id)
+
+
 class CustomUserCreateSerializer(UserCreateSerializer):
     """
     Сериализатор для создания пользователя.
@@ -68,7 +110,8 @@ class CustomUserCreateSerializer(UserCreateSerializer):
         )
 
 
-class CustomUserSerializer(serializers.ModelSerializer):
+class CustomUserSerializer(CompiledRepresentationMixin,
+                           serializers.ModelSerializer):
     """
     Сериализатор для модели User (пользователь).
     """
@@ -88,17 +131,13 @@ class CustomUserSerializer(serializers.ModelSerializer):
         )
 
     def get_is_subscribed(self, obj):
-        if 'request' in self.context:
-            return (
-                self.context['request'].user.is_authenticated
-                and Subscription.objects.filter(
-                    user=self.context['request'].user,
-                    author=obj
-                ).exists())
-        return False
+        return user_flag(
+            self.context, obj, 'is_subscribed', 'subscriptions', obj.pk
+        )
 
 
-class TagSerializer(serializers.ModelSerializer):
+class TagSerializer(CompiledRepresentationMixin,
+                    serializers.ModelSerializer):
     """
     Сериализатор для модели Tag (тэг).
     """
@@ -113,7 +152,8 @@ class TagSerializer(serializers.ModelSerializer):
         )
 
 
-class IngredientSerializer(serializers.ModelSerializer):
+class IngredientSerializer(CompiledRepresentationMixin,
+                           serializers.ModelSerializer):
     """
     Сериализатор для модели Ingredient (ингредиент).
     """
@@ -127,7 +167,8 @@ class IngredientSerializer(serializers.ModelSerializer):
         )
 
 
-class RecipeIngredientSerializer(serializers.ModelSerializer):
+class RecipeIngredientSerializer(CompiledRepresentationMixin,
+                                 serializers.ModelSerializer):
     id = serializers.PrimaryKeyRelatedField(
         source='ingredient',
         queryset=Ingredient.objects.all()
@@ -143,6 +184,9 @@ class RecipeIngredientSerializer(serializers.ModelSerializer):
         model = RecipeIngredient
         fields = ('id', 'name', 'measurement_unit', 'amount')
 
+    def represent_id(self, obj):
+        return obj.ingredient_id
+
 
 class RecipeTagSerializer(serializers.ModelSerializer):
     id = serializers.PrimaryKeyRelatedField(
@@ -164,7 +208,8 @@ class RecipeTagSerializer(serializers.ModelSerializer):
         fields = ('id', 'name', 'color', 'slug')
 
 
-class RecipeSerializer(serializers.ModelSerializer):
+class RecipeSerializer(CompiledRepresentationMixin,
+                       serializers.ModelSerializer):
     """
     Получение списка рецептов и рецепта по id.
     """
@@ -176,14 +221,24 @@ class RecipeSerializer(serializers.ModelSerializer):
     ingredients = RecipeIngredientSerializer(
         source='recipe_ingredient', read_only=True, many=True
     )
-    is_favorited = serializers.BooleanField()
-    is_in_shopping_cart = serializers.BooleanField()
+    is_favorited = serializers.SerializerMethodField()
+    is_in_shopping_cart = serializers.SerializerMethodField()
 
     def get_image(self, obj):
         if obj.image:
             return obj.image.url
         return None
 
+    def get_is_favorited(self, obj):
+        return user_flag(
+            self.context, obj, 'is_favorited', 'favorites', obj.pk
+        )
+
+    def get_is_in_shopping_cart(self, obj):
+        return user_flag(
+            self.context, obj, 'is_in_shopping_cart', 'shopping_cart', obj.pk
+        )
+
     class Meta:
         model = Recipe
         fields = ('id', 'tags', 'author', 'ingredients', 'is_favorited',
@@ -295,6 +350,14 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         RecipeIngredient.objects.bulk_create(
             create_ingredients
         )
+        self.saved_relations['recipe_ingredient'] = create_ingredients
+        ingredient_ids = [
+            ingredient['ingredient'].id for ingredient in ingredients
+        ]
+        transaction.on_commit(
+            lambda: ingredient_index.update_recipe(recipe.id, ingredient_ids)
+        )
+        update_signatures([recipe.id])
 
     def get_create_tags(self, recipe, tags):
         create_tags = [
@@ -307,24 +370,43 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         RecipeTag.objects.bulk_create(
             create_tags
         )
+        self.saved_relations['tags'] = [tag['tag'] for tag in tags]
         return recipe
 
+    @cached_property
+    def saved_relations(self):
+        """Только что записанные тэги и ингредиенты рецепта."""
+        return {}
+
+    @transaction.atomic
     def create(self, validated_data):
         ingredients = validated_data.pop('ingredients')
         tags = validated_data.pop('tags')
         recipe = Recipe.objects.create(**validated_data)
+        recipe.is_favorited = recipe.is_in_shopping_cart = False
         self.get_create_ingredients(recipe, ingredients)
         self.get_create_tags(recipe, tags)
         return recipe
 
+    @transaction.atomic
     def update(self, instance, validated_data):
+        image = validated_data.get('image')
+        if image is not None and instance.image and (
+            name_digest(instance.image.name) == getattr(image, 'digest', None)
+        ):
+            # Та же картинка: не перезаписываем ни файл, ни поле.
+            validated_data.pop('image')
+        old_image = instance.image.name
         ingredients = validated_data.pop('ingredients', None)
         instance.ingredients.clear()
         self.get_create_ingredients(instance, ingredients)
         tags = validated_data.pop('tags', None)
         instance.tags.clear()
         self.get_create_tags(instance, tags)
-        return super().update(instance, validated_data)
+        recipe = super().update(instance, validated_data)
+        if old_image != recipe.image.name:
+            schedule_image_release(old_image)
+        return recipe
 
     def to_internal_value(self, data):
         if 'tags' in data:
@@ -332,12 +414,20 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
         return super().to_internal_value(data)
 
     def to_representation(self, obj):
-        """Возвращаем представление в таком же виде, как и GET-запрос."""
-
-        queryset = Recipe.objects.add_user_annotations(
-            self.context['request'].user.pk)
-        obj = queryset.get(id=obj.id)
-        return RecipeSerializer(obj).data
+        """
+        Возвращаем представление в таком же виде, как и GET-запрос.
+        Тэги и ингредиенты берутся из только что сохраненных объектов,
+        без повторного чтения рецепта.
+        """
+        for name, objects in self.saved_relations.items():
+            set_prefetched(obj, name, objects)
+        user = self.context['request'].user
+        if obj.author_id == user.pk and not hasattr(
+            obj.author, 'is_subscribed'
+        ):
+            # На самого себя подписаться нельзя.
+            obj.author.is_subscribed = False
+        return RecipeSerializer(obj, context=self.context).data
 
     class Meta:
         model = Recipe
@@ -345,7 +435,8 @@ class RecipeCreateUpdateSerializer(serializers.ModelSerializer):
                   'text', 'cooking_time')
 
 
-class RecipeMinifieldSerializer(serializers.ModelSerializer):
+class RecipeMinifieldSerializer(CompiledRepresentationMixin,
+                                serializers.ModelSerializer):
     """Получение мини списка рецептов."""
 
     class Meta:
@@ -365,21 +456,9 @@ class FavoriteSerializer(serializers.ModelSerializer):
         model = Favorite
         fields = ('user', 'recipe')
 
-    def get_queryset(self):
-        return self.context['request'].user.favorite.all()
-
     def to_representation(self, instance):
         return RecipeMinifieldSerializer(instance.recipe).data
 
-    def validate_recipe(self, value):
-        if self.context['request'].method == 'POST':
-            if self.get_queryset().filter(user=self.context['request'].user,
-                                          recipe=value).exists():
-                raise serializers.ValidationError(
-                    'Рецерт уже добавлен!'
-                )
-        return value
-
 
 class SubscriptionToRepresentationSerializer(CustomUserSerializer):
     """Сериализатор для отображения списка подписок и отдельной подписки."""
@@ -393,9 +472,12 @@ class SubscriptionToRepresentationSerializer(CustomUserSerializer):
                                                      'recipes_count',)
         read_only_fields = ('__all__',)
 
+    def get_recipes_queryset(self, obj):
+        return Recipe.objects.filter(author=obj)
+
     def get_recipes(self, obj):
         recipes = RecipeMinifieldSerializer(
-            Recipe.objects.filter(author=obj),
+            self.get_recipes_queryset(obj),
             many=True
         ).data
         if self.context:
@@ -418,9 +500,6 @@ class SubscriptionSerializer(serializers.ModelSerializer):
         fields = ('user', 'author')
         read_only_fields = ('user',)
 
-    def get_queryset(self):
-        return self.context['request'].user.subscription_user.all()
-
     def to_representation(self, instance):
         representation = SubscriptionToRepresentationSerializer(
             instance.author
@@ -434,19 +513,6 @@ class SubscriptionSerializer(serializers.ModelSerializer):
             ][0:recipes_limit]
         return representation
 
-    def validate_author(self, value):
-        if self.context['request'].method == 'POST':
-            if value == self.context['request'].user:
-                raise serializers.ValidationError(
-                    'Подписываться на самого себя нельзя!'
-                )
-            if self.get_queryset().filter(user=self.context['request'].user,
-                                          author=value).exists():
-                raise serializers.ValidationError(
-                    'Уже подписан(а) на этого автора!',
-                )
-        return value
-
 
 class ShoppingCartSerializer(serializers.ModelSerializer):
     """Сериализатор для работы с моделью ShoppingCart."""
@@ -460,17 +526,55 @@ class ShoppingCartSerializer(serializers.ModelSerializer):
         model = ShoppingCart
         fields = ('user', 'recipe')
 
-    def get_queryset(self):
-        return self.context['request'].user.shopping_cart.all()
-
     def to_representation(self, instance):
         return RecipeMinifieldSerializer(instance.recipe).data
 
-    def validate_recipe(self, value):
-        if self.context['request'].method == 'POST':
-            if self.get_queryset().filter(user=self.context['request'].user,
-                                          recipe=value).exists():
-                raise serializers.ValidationError(
-                    'Рецерт уже добавлен!'
-                )
+
+class JobSerializer(serializers.ModelSerializer):
+    """
+    Сериализатор статуса фоновой задачи. У выполненной выгрузки
+    списка покупок result_url — ссылка на скачивание файла.
+    """
+
+    result_url = serializers.SerializerMethodField()
+
+    class Meta:
+        model = Job
+        fields = ('id', 'status', 'attempts', 'result', 'result_url',
+                  'created_at', 'updated_at')
+
+    def get_result_url(self, obj):
+        if (obj.status != Job.DONE
+                or ShoppingCartExport.from_result(obj.result) is None):
+            return None
+        url = reverse('api:jobs-download', args=(obj.pk,))
+        request = self.context.get('request')
+        return request.build_absolute_uri(url) if request else url
+
+
+class BatchItemSerializer(serializers.Serializer):
+    """Подзапрос пакета: метод, путь внутри /api/ и тело."""
+
+    method = serializers.ChoiceField(choices=BATCH_METHODS, default='GET')
+    path = serializers.CharField()
+    body = serializers.JSONField(required=False)
+
+    def validate_path(self, value):
+        if not value.startswith('/api/'):
+            raise serializers.ValidationError(
+                'Путь подзапроса должен начинаться с /api/.'
+            )
+        return value
+
+
+class BatchSerializer(serializers.Serializer):
+    """Пакет подзапросов к API."""
+
+    requests = BatchItemSerializer(many=True, allow_empty=False)
+
+    def validate_requests(self, value):
+        if len(value) > settings.BATCH_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'Не больше {settings.BATCH_MAX_SIZE} подзапросов в пакете.'
+            )
         return value
@@ -0,0 +1,35 @@
+import io
+import os
+from unittest import skipUnless
+
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase
+
+from api.benchmark import create_fixtures
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Планы запросов проверяются только в PostgreSQL.')
+class AuditIndexesTest(TestCase):
+    """
+    Планы основных запросов API не хуже эталонных
+    (settings.EXPLAIN_BASELINE_PATH). Обновить эталон после
+    намеренного изменения запросов или индексов:
+    SAVE_EXPLAIN_BASELINE=1 python manage.py test api.tests.test_audit_indexes
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.data = create_fixtures(300)
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE')
+
+    def test_no_plan_regressions(self):
+        save = bool(os.getenv('SAVE_EXPLAIN_BASELINE'))
+        stdout = io.StringIO()
+        call_command(
+            'audit_indexes', user=self.data.viewer.pk,
+            save_baseline=save, check=not save, stdout=stdout,
+        )
+        self.assertNotIn('Регрессия плана', stdout.getvalue())
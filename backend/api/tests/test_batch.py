@@ -0,0 +1,99 @@
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.test import APITestCase, APITransactionTestCase
+
+from api.tests.utils import create_recipe, create_tag, create_user
+from recipes.models import Favorite
+
+URL = '/api/batch/'
+
+
+@override_settings(BATCH_WORKERS=1)
+class BatchTest(APITestCase):
+    """Пакет подзапросов /api/batch/."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.author = create_user('author')
+        cls.recipe = create_recipe(cls.author)
+
+    def setUp(self):
+        cache.clear()
+
+    def batch(self, *requests):
+        return self.client.post(URL, {'requests': list(requests)},
+                                format='json')
+
+    def test_requests_run_in_order_as_user(self):
+        self.client.force_authenticate(self.author)
+        recipe_url = f'/api/recipes/{self.recipe.pk}/'
+        response = self.batch(
+            {'path': recipe_url},
+            {'method': 'POST', 'path': f'{recipe_url}favorite/'},
+            {'path': recipe_url},
+            {'path': '/api/users/me/'},
+        )
+        self.assertEqual(response.status_code, 200)
+        statuses = [item['status'] for item in response.json()]
+        self.assertEqual(statuses, [200, 201, 200, 200])
+        before, added, after, me = (item['body'] for item in response.json())
+        self.assertFalse(before['is_favorited'])
+        self.assertEqual(added['id'], self.recipe.pk)
+        self.assertTrue(after['is_favorited'])
+        self.assertEqual(me['username'], 'author')
+        self.assertTrue(Favorite.objects.filter(user=self.author).exists())
+
+    def test_body_and_query_string(self):
+        self.client.force_authenticate(self.author)
+        response = self.batch(
+            {'method': 'PATCH', 'path': f'/api/recipes/{self.recipe.pk}/',
+             'body': {'cooking_time': 0}},
+            {'path': f'/api/recipes/?author={self.author.pk}&limit=1'},
+        )
+        patched, listed = response.json()
+        self.assertEqual(patched['status'], 400)
+        self.assertIn('cooking_time', patched['body'])
+        self.assertEqual(listed['body']['count'], 1)
+
+    def test_anonymous_sub_request(self):
+        response = self.batch(
+            {'method': 'POST',
+             'path': f'/api/recipes/{self.recipe.pk}/favorite/'},
+        )
+        self.assertEqual(response.json()[0]['status'], 401)
+
+    def test_unknown_and_nested(self):
+        response = self.batch(
+            {'path': '/api/unknown/'},
+            {'method': 'POST', 'path': URL, 'body': {'requests': []}},
+        )
+        self.assertEqual(
+            [item['status'] for item in response.json()], [404, 400]
+        )
+
+    def test_invalid_batch(self):
+        for requests in ([], [{'path': '/admin/'}],
+                         [{'method': 'PUT', 'path': '/api/tags/'}]):
+            self.assertEqual(self.batch(*requests).status_code, 400)
+        with self.settings(BATCH_MAX_SIZE=1):
+            response = self.batch({'path': '/api/tags/'},
+                                  {'path': '/api/tags/'})
+            self.assertEqual(response.status_code, 400)
+
+
+@override_settings(BATCH_WORKERS=2)
+class ParallelBatchTest(APITransactionTestCase):
+    """Пакет из GET выполняется в пуле потоков со своими соединениями."""
+
+    def test_responses_keep_order(self):
+        recipe = create_recipe(create_user('author'))
+        create_tag()
+        response = self.client.post(URL, {'requests': [
+            {'path': f'/api/recipes/{recipe.pk}/'},
+            {'path': '/api/tags/'},
+            {'path': '/api/recipes/0/'},
+        ]}, format='json')
+        first, second, third = response.json()
+        self.assertEqual(first['body']['name'], 'Суп')
+        self.assertEqual(second['body'][0]['slug'], 'lunch')
+        self.assertEqual(third['status'], 404)
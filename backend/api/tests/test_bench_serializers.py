@@ -0,0 +1,96 @@
+import io
+import json
+import os
+import tempfile
+from unittest import skipUnless
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import connection
+from django.test import SimpleTestCase, TestCase
+
+from api.benchmark import BenchmarkResult, regressions
+
+with open(settings.SERIALIZER_BENCH_BASELINE_PATH, encoding='utf8') as file:
+    BASELINE = json.load(file)
+
+
+def bench(**options):
+    stdout = io.StringIO()
+    call_command('bench_serializers', repeat=1, json=True, stdout=stdout,
+                 stderr=io.StringIO(), **options)
+    return {result['name']: result for result in json.loads(stdout.getvalue())}
+
+
+class RegressionsTest(SimpleTestCase):
+
+    def test_over_tolerance(self):
+        result = BenchmarkResult(name='bench', objects=10, seconds=0.001,
+                                 peak_bytes=1000, queries=3)
+        baseline = {'per_object_us': 50, 'peak_bytes': 1000, 'queries': 2}
+        tolerances = {'per_object_us': 2.0, 'peak_bytes': 1.25,
+                      'queries': 1.0}
+        found = list(regressions(result, baseline, tolerances))
+        self.assertEqual(len(found), 1)
+        self.assertTrue(found[0].startswith('bench: queries 3'))
+        baseline['queries'] = 3
+        self.assertEqual(list(regressions(result, baseline, tolerances)), [])
+
+
+class BenchSerializersBaselineTest(TestCase):
+    """Сохранение эталона и проверка результатов по нему."""
+
+    options = {'recipes': 5, 'writes': 2}
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'baseline.json')
+
+    def test_save_and_check(self):
+        bench(baseline=self.path, save_baseline=True, **self.options)
+        with open(self.path, encoding='utf8') as file:
+            baseline = json.load(file)
+        self.assertEqual(baseline['options'],
+                         dict(self.options, vendor=connection.vendor))
+        self.assertEqual(baseline['tolerances'], BASELINE['tolerances'])
+        for result in baseline['results'].values():
+            result['per_object_us'] *= 100
+            result['peak_bytes'] *= 100
+        baseline['results']['RecipeSerializer(many=True)']['queries'] -= 1
+        with open(self.path, 'w', encoding='utf8') as file:
+            json.dump(baseline, file)
+        with self.assertRaisesMessage(CommandError, 'Регрессий: 1.'):
+            bench(baseline=self.path, check=True, **self.options)
+        baseline['results']['RecipeSerializer(many=True)']['queries'] += 1
+        with open(self.path, 'w', encoding='utf8') as file:
+            json.dump(baseline, file)
+        bench(baseline=self.path, check=True, **self.options)
+
+    def test_other_options_or_no_baseline(self):
+        bench(baseline=self.path, save_baseline=True, **self.options)
+        with self.assertRaisesMessage(CommandError, 'другими параметрами'):
+            bench(baseline=self.path, check=True, recipes=6, writes=2)
+        os.remove(self.path)
+        with self.assertRaisesMessage(CommandError, 'Нет эталонных'):
+            bench(baseline=self.path, check=True, **self.options)
+
+
+@skipUnless(connection.vendor == BASELINE['options']['vendor'],
+            'Эталон снят на другой базе данных.')
+class CommittedBaselineTest(TestCase):
+    """
+    Число запросов сериализаторов не выросло против эталона
+    (settings.SERIALIZER_BENCH_BASELINE_PATH). Время и память зависят
+    от машины и проверяются командой bench_serializers --check.
+    """
+
+    def test_queries(self):
+        options = dict(BASELINE['options'])
+        del options['vendor']
+        results = bench(**options)
+        self.assertEqual(
+            {name: result['queries'] for name, result in results.items()},
+            {name: result['queries']
+             for name, result in BASELINE['results'].items()},
+        )
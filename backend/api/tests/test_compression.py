@@ -0,0 +1,109 @@
+import gzip
+from unittest import mock, skipIf
+
+from django.core.cache import cache
+from django.http import HttpResponse, StreamingHttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.test import APITestCase
+
+from api.middleware import CompressionMiddleware, brotli, compress
+from api.tests.utils import create_ingredient, create_tag
+
+
+class CompressionTest(APITestCase):
+    """Сжатие ответов API по Accept-Encoding."""
+
+    @classmethod
+    def setUpTestData(cls):
+        for number in range(100):
+            create_ingredient(f'Ингредиент {number}')
+        for number in range(30):
+            create_tag(f'Тэг {number}', f'tag-{number}')
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, path, encoding):
+        response = self.client.get(path, HTTP_ACCEPT_ENCODING=encoding)
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Length'],
+                         str(len(response.content)))
+        self.assertIn('Accept-Encoding', response['Vary'])
+        return response
+
+    def test_gzip(self):
+        plain = self.get('/api/ingredients/', 'identity').content
+        response = self.get('/api/ingredients/', 'gzip, deflate')
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertLess(len(response.content), len(plain))
+        self.assertEqual(gzip.decompress(response.content), plain)
+
+    @skipIf(brotli is None, 'brotli не установлен.')
+    def test_brotli_preferred(self):
+        plain = self.get('/api/ingredients/', '').content
+        response = self.get('/api/ingredients/', 'gzip, br')
+        self.assertEqual(response['Content-Encoding'], 'br')
+        self.assertEqual(brotli.decompress(response.content), plain)
+
+    def test_refused_encodings(self):
+        for encoding in ('', 'identity', 'gzip;q=0', 'deflate'):
+            response = self.get('/api/ingredients/', encoding)
+            self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_small_response(self):
+        with self.settings(COMPRESSION_MIN_SIZE=10 ** 6):
+            response = self.get('/api/ingredients/', 'gzip')
+        self.assertFalse(response.has_header('Content-Encoding'))
+
+    def test_cached_compressed_body(self):
+        with mock.patch('api.middleware.compress', wraps=compress) as spy:
+            first = self.get('/api/tags/', 'gzip')
+            second = self.get('/api/tags/', 'gzip')
+            self.assertEqual(spy.call_count, 1)
+            self.get('/api/ingredients/', 'gzip')
+            self.assertEqual(spy.call_count, 2)
+            # Ключ — хэш тела: тот же список по другому URL не сжимается.
+            self.get('/api/ingredients/?page=1', 'gzip')
+            self.assertEqual(spy.call_count, 2)
+            self.get('/api/tags/', 'br' if brotli else 'gzip;q=1')
+            self.assertEqual(spy.call_count, 3 if brotli else 2)
+        self.assertEqual(second.content, first.content)
+
+
+@override_settings(COMPRESSION_MIN_SIZE=100)
+class StreamingCompressionTest(SimpleTestCase):
+
+    def call(self, response, encoding='gzip', path='/api/recipes/'):
+        request = RequestFactory().get(path, HTTP_ACCEPT_ENCODING=encoding)
+        return CompressionMiddleware(lambda request: response)(request)
+
+    def test_streaming(self):
+        chunks = [b'{"name": "%d"}\n' % number for number in range(200)]
+        response = StreamingHttpResponse(
+            iter(chunks), content_type='application/json'
+        )
+        response['Content-Length'] = str(sum(map(len, chunks)))
+        response = self.call(response)
+        self.assertEqual(response['Content-Encoding'], 'gzip')
+        self.assertFalse(response.has_header('Content-Length'))
+        self.assertEqual(
+            gzip.decompress(b''.join(response.streaming_content)),
+            b''.join(chunks),
+        )
+
+    def test_not_compressed(self):
+        for response in (
+            HttpResponse(b'x' * 1000, content_type='image/png'),
+            HttpResponse(b'x' * 1000, content_type='text/plain',
+                         headers={'X-Accel-Redirect': '/exports/list.txt'}),
+            HttpResponse(b'x' * 1000, content_type='text/plain',
+                         headers={'Content-Encoding': 'gzip'}),
+        ):
+            encoding = response.get('Content-Encoding')
+            self.assertEqual(self.call(response).get('Content-Encoding'),
+                             encoding)
+
+    def test_weak_etag(self):
+        response = HttpResponse(b'x' * 1000, content_type='text/plain')
+        response['ETag'] = '"abc"'
+        self.assertEqual(self.call(response)['ETag'], 'W/"abc"')
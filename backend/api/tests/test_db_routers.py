@@ -0,0 +1,103 @@
+from django.conf import settings
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, override_settings
+from rest_framework.test import APITestCase
+
+from api.tests.utils import create_recipe, create_user
+from backend.db_routers import ReplicaMiddleware, ReplicaRouter, get_replica
+from recipes.models import Recipe
+
+REPLICAS = ['replica_0', 'replica_1']
+
+
+class ReplicaView:
+    read_from_replica = True
+
+
+class PrimaryView:
+    pass
+
+
+def view_function(view_class):
+    def view(request):
+        pass
+    view.cls = view_class
+    return view
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaRoutingTest(SimpleTestCase):
+    """Выбор реплики для чтения и чтение своих записей."""
+
+    def setUp(self):
+        self.factory = RequestFactory()
+        self.router = ReplicaRouter()
+
+    def call(self, request, view_class=ReplicaView, status=200):
+        """
+        Проводит запрос через ReplicaMiddleware; возвращает ответ и
+        базу, в которую вьюха читала бы модели.
+        """
+        routed = []
+
+        def get_response(request):
+            middleware.process_view(request, view_function(view_class),
+                                    (), {})
+            routed.append(self.router.db_for_read(Recipe))
+            return HttpResponse(status=status)
+
+        middleware = ReplicaMiddleware(get_response)
+        response = middleware(request)
+        return response, routed[0]
+
+    def test_safe_request_reads_replica(self):
+        _, database = self.call(self.factory.get('/api/recipes/'))
+        self.assertIn(database, REPLICAS)
+        self.assertIsNone(get_replica())
+
+    def test_view_without_flag_reads_primary(self):
+        _, database = self.call(self.factory.get('/api/users/me/'),
+                                view_class=PrimaryView)
+        self.assertIsNone(database)
+
+    def test_write_sets_sticky_cookie(self):
+        response, database = self.call(self.factory.post('/api/recipes/'))
+        self.assertIsNone(database)
+        self.assertIn('read_primary', response.cookies)
+        self.assertEqual(response.cookies['read_primary']['max-age'],
+                         settings.REPLICA_STICKY_SECONDS)
+
+    def test_failed_write_is_not_sticky(self):
+        response, _ = self.call(self.factory.post('/api/recipes/'),
+                                status=400)
+        self.assertNotIn('read_primary', response.cookies)
+
+    def test_sticky_client_reads_primary(self):
+        request = self.factory.get('/api/recipes/')
+        request.COOKIES['read_primary'] = '1'
+        _, database = self.call(request)
+        self.assertIsNone(database)
+
+    @override_settings(DATABASE_REPLICAS=[])
+    def test_without_replicas(self):
+        _, database = self.call(self.factory.get('/api/recipes/'))
+        self.assertIsNone(database)
+        response, _ = self.call(self.factory.post('/api/recipes/'))
+        self.assertNotIn('read_primary', response.cookies)
+
+    def test_writes_go_to_primary(self):
+        self.assertEqual(self.router.db_for_write(Recipe), 'default')
+        self.assertFalse(self.router.allow_migrate('replica_0', 'recipes'))
+        self.assertIsNone(self.router.allow_migrate('default', 'recipes'))
+
+
+@override_settings(DATABASE_REPLICAS=REPLICAS)
+class ReplicaStickyCookieTest(APITestCase):
+
+    def test_favorite_sets_sticky_cookie(self):
+        user = create_user('user')
+        recipe = create_recipe(user)
+        self.client.force_authenticate(user)
+        response = self.client.post(f'/api/recipes/{recipe.pk}/favorite/')
+        self.assertEqual(response.status_code, 201)
+        self.assertIn('read_primary', response.cookies)
@@ -0,0 +1,87 @@
+import tempfile
+
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+
+from api.exports import (canonical_amount, canonical_unit, humanize_amount,
+                         shopping_cart_queryset, shopping_cart_rows)
+from api.tests.utils import create_ingredient, create_recipe, create_users
+from recipes.models import RecipeIngredient, ShoppingCart
+
+
+class HumanizeAmountTest(TestCase):
+
+    def test_display_units(self):
+        for canonical, expected in (
+            (('г', 999), ('г', '999')),
+            (('г', 1000), ('кг', '1')),
+            (('г', 1500), ('кг', '1.5')),
+            (('г', 1001), ('кг', '1.001')),
+            (('г', 1234567), ('кг', '1234.567')),
+            (('мл', 1250), ('л', '1.25')),
+            (('мл', 250), ('мл', '250')),
+            (('шт.', 5000), ('шт.', '5000')),
+        ):
+            with self.subTest(canonical=canonical):
+                self.assertEqual(humanize_amount(*canonical), expected)
+
+
+class ShoppingCartRowsTest(APITestCase):
+    """Суммы одного ингредиента в разных единицах объединяются."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other = create_users('user', 'other')
+        milk, milk_glass, milk_liter, flour, flour_kg, eggs, eggs_dot, salt = (
+            create_ingredient(name, unit) for name, unit in (
+                ('Молоко', 'мл'), ('Молоко', 'стакан'), ('Молоко', 'л'),
+                ('Мука', 'г'), ('Мука', 'кг'), ('Яйца', 'шт'),
+                ('Яйца', 'шт.'), ('Соль', 'по вкусу'),
+            )
+        )
+        pancakes = create_recipe(cls.user, 'Блины', ingredients=[
+            (milk, 300), (milk_glass, 2), (flour, 500), (eggs, 2), (salt, 1),
+        ])
+        pie = create_recipe(cls.user, 'Пирог', ingredients=[
+            (milk_liter, 1), (flour_kg, 1), (eggs_dot, 3), (salt, 1),
+        ])
+        for recipe in (pancakes, pie):
+            ShoppingCart.objects.create(user=cls.user, recipe=recipe)
+        ShoppingCart.objects.create(user=cls.other, recipe=pie)
+
+    def test_canonical_expressions(self):
+        rows = RecipeIngredient.objects.annotate(
+            unit=canonical_unit(), canonical=canonical_amount()
+        ).values_list('ingredient__measurement_unit', 'unit', 'canonical')
+        self.assertEqual(set(rows), {
+            ('мл', 'мл', 300), ('стакан', 'мл', 500), ('л', 'мл', 1000),
+            ('г', 'г', 500), ('кг', 'г', 1000), ('шт', 'шт.', 2),
+            ('шт.', 'шт.', 3), ('по вкусу', 'по вкусу', 1),
+        })
+
+    def test_merged_totals(self):
+        self.assertEqual(
+            shopping_cart_rows(shopping_cart_queryset(self.user)),
+            [('Молоко', 'л', '1.8'), ('Мука', 'кг', '1.5'),
+             ('Соль', 'по вкусу', '2'), ('Яйца', 'шт.', '5')],
+        )
+        self.assertEqual(
+            shopping_cart_rows(shopping_cart_queryset(self.other)),
+            [('Молоко', 'л', '1'), ('Мука', 'кг', '1'),
+             ('Соль', 'по вкусу', '1'), ('Яйца', 'шт.', '3')],
+        )
+
+    def test_txt_file(self):
+        self.client.force_authenticate(self.user)
+        with tempfile.TemporaryDirectory() as directory:
+            with override_settings(SHOPPING_CART_EXPORT_ROOT=directory):
+                response = self.client.get(
+                    '/api/recipes/download_shopping_cart/'
+                )
+                content = b''.join(response.streaming_content).decode()
+        self.assertEqual(content, (
+            'Молоко, л, 1.8;\n'
+            'Мука, кг, 1.5;\n'
+            'Соль, по вкусу;\n'
+            'Яйца, шт., 5;\n'
+        ))
@@ -0,0 +1,149 @@
+import os
+import tempfile
+import time
+from unittest import mock
+
+from django.core.files.base import ContentFile
+from django.test import SimpleTestCase, override_settings
+from rest_framework.test import APITestCase
+
+from api.benchmark import make_png
+from api.models import Job
+from api.tests.utils import create_ingredient, create_tag, create_user
+from recipes.models import Recipe
+from recipes.signals import release_image
+from recipes.storage import ContentAddressedStorage
+
+
+class TemporaryMediaMixin:
+
+    def setUp(self):
+        super().setUp()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.storage = ContentAddressedStorage()
+
+    def make_old(self, name):
+        day_ago = time.time() - 24 * 60 * 60
+        os.utime(self.storage.path(name), (day_ago, day_ago))
+
+
+class ContentAddressedStorageTest(TemporaryMediaMixin, SimpleTestCase):
+
+    def save(self, content):
+        return self.storage.save(
+            'recipes/images/image.PNG', ContentFile(content)
+        )
+
+    def test_same_content_stored_once(self):
+        name = self.save(b'first')
+        self.assertRegex(name, r'^recipes/images/[0-9a-f]{2}/[0-9a-f]{64}'
+                               r'\.png$')
+        self.assertEqual(self.save(b'first'), name)
+        self.assertNotEqual(self.save(b'second'), name)
+        self.assertEqual(
+            len(os.listdir(os.path.dirname(self.storage.path(name)))), 1
+        )
+
+    def test_release(self):
+        name = self.save(b'image')
+        self.assertFalse(self.storage.release(name, min_age=60))
+        self.assertTrue(self.storage.exists(name))
+        self.make_old(name)
+        self.assertTrue(self.storage.release(name, min_age=60))
+        self.assertFalse(self.storage.exists(name))
+        self.assertFalse(self.storage.release(name, min_age=60))
+
+    def test_upload_refreshes_old_file(self):
+        name = self.save(b'image')
+        self.make_old(name)
+        self.save(b'image')
+        self.assertFalse(self.storage.release(name, min_age=60))
+        self.assertTrue(self.storage.exists(name))
+
+    def test_upload_during_release(self):
+        """
+        Загрузка, которая пришлась между переименованием файла и его
+        удалением, записывает файл заново и не теряет его.
+        """
+        name = self.save(b'image')
+        self.make_old(name)
+        rename = os.rename
+
+        def rename_then_upload(source, destination):
+            rename(source, destination)
+            self.assertEqual(self.save(b'image'), name)
+
+        with mock.patch('recipes.storage.os.rename', rename_then_upload):
+            self.assertTrue(self.storage.release(name, min_age=60))
+        with self.storage.open(name) as file:
+            self.assertEqual(file.read(), b'image')
+        self.assertEqual(
+            os.listdir(os.path.dirname(self.storage.path(name))),
+            [os.path.basename(name)],
+        )
+
+
+class RecipeImageTest(TemporaryMediaMixin, APITestCase):
+    """Картинки рецептов освобождаются, когда на них не ссылаются."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('author')
+        cls.ingredient = create_ingredient()
+        cls.tag = create_tag()
+
+    def setUp(self):
+        super().setUp()
+        self.client.force_authenticate(self.user)
+        self.recipe_id = self.client.post('/api/recipes/', {
+            'name': 'Суп', 'text': 'Текст', 'cooking_time': 30,
+            'image': make_png(), 'tags': [self.tag.pk],
+            'ingredients': [{'id': self.ingredient.pk, 'amount': 10}],
+        }, format='json').json()['id']
+        self.image = Recipe.objects.get(pk=self.recipe_id).image.name
+
+    def patch(self, image):
+        with self.captureOnCommitCallbacks(execute=True):
+            response = self.client.patch(
+                f'/api/recipes/{self.recipe_id}/', {
+                    'image': image, 'tags': [self.tag.pk],
+                    'ingredients': [{'id': self.ingredient.pk, 'amount': 5}],
+                }, format='json'
+            )
+        self.assertEqual(response.status_code, 200)
+        return Recipe.objects.get(pk=self.recipe_id).image.name
+
+    def test_unchanged_image_not_written(self):
+        with mock.patch.object(ContentAddressedStorage, 'save') as save:
+            self.assertEqual(self.patch(make_png()), self.image)
+        save.assert_not_called()
+        self.assertFalse(Job.objects.exists())
+
+    def test_replaced_image_released_later(self):
+        self.assertNotEqual(self.patch(make_png(size=32)), self.image)
+        job = Job.objects.get()
+        self.assertEqual(job.payload, {'name': self.image})
+        self.assertGreater(job.run_at.timestamp(), time.time())
+        # Файл удаляется отложенной задачей, а не сразу.
+        self.assertTrue(self.storage.exists(self.image))
+        self.make_old(self.image)
+        release_image(self.image)
+        self.assertFalse(self.storage.exists(self.image))
+
+    def test_shared_image_kept(self):
+        other = Recipe.objects.create(
+            author=self.user, name='Копия', text='Текст', cooking_time=10,
+            image=self.image,
+        )
+        self.patch(make_png(size=32))
+        self.make_old(self.image)
+        release_image(self.image)
+        self.assertTrue(self.storage.exists(self.image))
+        with self.captureOnCommitCallbacks(execute=True):
+            other.delete()
+        release_image(self.image)
+        self.assertFalse(self.storage.exists(self.image))
@@ -0,0 +1,110 @@
+import io
+import json
+import tempfile
+import threading
+from unittest import skipUnless
+
+from django.contrib.auth import get_user_model
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, TransactionTestCase
+
+from recipes.management.commands import import_recipes
+from recipes.models import Recipe, RecipeTag, Tag
+
+User = get_user_model()
+
+
+def record(email, username, tags=()):
+    return {
+        'name': 'Суп', 'text': 'Текст', 'cooking_time': 30,
+        'pub_date': '2024-01-01T00:00:00+00:00', 'image': None,
+        'author': {'email': email, 'username': username,
+                   'first_name': 'Имя', 'last_name': 'Фамилия'},
+        'tags': list(tags),
+        'ingredients': [
+            {'name': 'Картофель', 'measurement_unit': 'г', 'amount': 100},
+        ],
+    }
+
+
+BREAKFAST = {'name': 'Breakfast', 'color': '#E26C2D', 'slug': 'breakfast'}
+
+
+class ImportBatchTest(TestCase):
+    """Загрузка пачки рецептов командой import_recipes."""
+
+    @classmethod
+    def setUpTestData(cls):
+        User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass'
+        )
+        cls.tag = Tag.objects.create(
+            name='Завтрак', color='#E26C2D', slug='breakfast'
+        )
+
+    def setUp(self):
+        import_recipes.init_worker(threading.Lock())
+
+    def test_author_with_taken_username(self):
+        imported, skipped = import_recipes.import_batch([
+            record('other@example.com', 'cook'),
+            record('other@example.com', 'cook'),
+            record('new@example.com', 'new'),
+        ])
+        self.assertEqual(imported, 1)
+        self.assertEqual(skipped, {'other@example.com': ('cook', 2)})
+        self.assertFalse(User.objects.filter(
+            email='other@example.com'
+        ).exists())
+
+    def test_same_username_twice_in_batch(self):
+        imported, skipped = import_recipes.import_batch([
+            record('first@example.com', 'twin'),
+            record('second@example.com', 'twin'),
+        ])
+        self.assertEqual(imported, 1)
+        self.assertEqual(len(skipped), 1)
+
+    def test_tag_matched_by_slug(self):
+        import_recipes.import_batch([
+            record('cook@example.com', 'cook', [BREAKFAST]),
+        ])
+        self.assertEqual(Tag.objects.count(), 1)
+        self.assertEqual(
+            RecipeTag.objects.get(recipe__in=Recipe.objects.all()).tag,
+            self.tag,
+        )
+
+    def test_new_tags(self):
+        import_recipes.import_batch([
+            record('cook@example.com', 'cook', [
+                {'name': 'Обед', 'color': '#49B64E', 'slug': 'lunch'},
+                {'name': 'Lunch', 'color': '#49B64E', 'slug': 'lunch'},
+            ]),
+        ])
+        self.assertEqual(Tag.objects.filter(slug='lunch').count(), 1)
+        self.assertEqual(RecipeTag.objects.count(), 1)
+
+
+@skipUnless(connection.vendor == 'postgresql',
+            'Воркеры-процессы открывают свои соединения с PostgreSQL.')
+class ImportRecipesCommandTest(TransactionTestCase):
+
+    def test_skipped_authors_reported(self):
+        User.objects.create_user(
+            username='cook', email='cook@example.com', password='pass'
+        )
+        with tempfile.NamedTemporaryFile('w', suffix='.jsonl') as file:
+            for item in (record('other@example.com', 'cook', [BREAKFAST]),
+                         record('new@example.com', 'new', [BREAKFAST])):
+                file.write(json.dumps(item) + '\n')
+            file.flush()
+            stdout, stderr = io.StringIO(), io.StringIO()
+            call_command('import_recipes', file.name, workers=1,
+                         stdout=stdout, stderr=stderr)
+        self.assertIn('Загружено рецептов: 1.', stdout.getvalue())
+        self.assertIn('Пропущено авторов: 1, рецептов: 1.',
+                      stdout.getvalue())
+        self.assertIn('other@example.com', stderr.getvalue())
+        self.assertEqual(Recipe.objects.count(), 1)
@@ -0,0 +1,171 @@
+import os
+import tempfile
+import time
+from datetime import timedelta
+
+from django.test import TestCase, override_settings
+from django.utils import timezone
+from rest_framework.test import APITestCase
+
+from api.exports import ShoppingCartExport, purge_exports
+from api.jobs import claim, enqueue, requeue_stale, run
+from api.models import Job
+from api.tests.utils import create_ingredient, create_recipe, create_users
+from recipes.models import ShoppingCart
+
+
+def add(a, b):
+    return a + b
+
+
+def fail():
+    raise ValueError('Ошибка задачи')
+
+
+def run_ready():
+    """Выполняет готовые задачи в этом потоке, как один проход воркера."""
+    jobs = claim(count=100)
+    for job in jobs:
+        run(job)
+    return jobs
+
+
+@override_settings(JOB_MAX_ATTEMPTS=2, JOB_RETRY_BACKOFF=0)
+class JobQueueTest(TestCase):
+
+    def test_run(self):
+        job = enqueue(add, a=1, b=2)
+        self.assertEqual(job.status, Job.QUEUED)
+        run_ready()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.result, job.attempts),
+                         (Job.DONE, 3, 1))
+
+    def test_key_deduplicates_until_finished(self):
+        first = enqueue(add, key='sum', a=1, b=2)
+        self.assertEqual(enqueue(add, key='sum', a=1, b=2).pk, first.pk)
+        self.assertEqual(Job.objects.count(), 1)
+        run_ready()
+        again = enqueue(add, key='sum', a=2, b=2)
+        self.assertEqual(again.pk, first.pk)
+        self.assertEqual((again.status, again.payload),
+                         (Job.QUEUED, {'a': 2, 'b': 2}))
+
+    def test_delay(self):
+        enqueue(add, delay=60, a=1, b=2)
+        self.assertEqual(run_ready(), [])
+
+    def test_retry_then_fail(self):
+        job = enqueue(fail)
+        run_ready()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.QUEUED, 1))
+        self.assertIn('Ошибка задачи', job.error)
+        run_ready()
+        job.refresh_from_db()
+        self.assertEqual((job.status, job.attempts), (Job.FAILED, 2))
+
+    def test_requeue_stale(self):
+        locked_at = timezone.now() - timedelta(days=1)
+        retry, exhausted = (
+            enqueue(add, a=1, b=2) for _ in range(2)
+        )
+        Job.objects.filter(pk=retry.pk).update(
+            status=Job.RUNNING, attempts=1, locked_at=locked_at
+        )
+        Job.objects.filter(pk=exhausted.pk).update(
+            status=Job.RUNNING, attempts=2, locked_at=locked_at
+        )
+        self.assertEqual(requeue_stale(), 1)
+        retry.refresh_from_db()
+        exhausted.refresh_from_db()
+        self.assertEqual(retry.status, Job.QUEUED)
+        self.assertEqual(exhausted.status, Job.FAILED)
+
+
+@override_settings(SHOPPING_CART_SYNC_ROWS=0)
+class ShoppingCartExportJobTest(APITestCase):
+    """Большие списки покупок рендерятся фоновой задачей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = create_users('first', 'second')
+        recipe = create_recipe(
+            cls.users[0], ingredients=[(create_ingredient(), 100)]
+        )
+        for user in cls.users:
+            ShoppingCart.objects.create(user=user, recipe=recipe)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(SHOPPING_CART_EXPORT_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def download(self, user):
+        self.client.force_authenticate(user)
+        return self.client.get('/api/recipes/download_shopping_cart/')
+
+    def test_same_cart_of_two_users(self):
+        locations = []
+        for user in self.users:
+            response = self.download(user)
+            self.assertEqual(response.status_code, 202)
+            self.assertEqual(
+                self.client.get(response['Location']).status_code, 200
+            )
+            locations.append(response['Location'])
+        self.assertNotEqual(*locations)
+        run_ready()
+        for user, location in zip(self.users, locations):
+            self.client.force_authenticate(user)
+            self.assertEqual(
+                self.client.get(location).json()['status'], Job.DONE
+            )
+            response = self.download(user)
+            self.assertEqual(response.status_code, 200)
+            self.assertIn('Картофель', b''.join(response.streaming_content)
+                          .decode())
+
+    def test_download_result(self):
+        response = self.download(self.users[0])
+        self.assertIsNone(response.json()['result_url'])
+        location = response['Location']
+        run_ready()
+        job = self.client.get(location).json()
+        self.assertEqual(job['status'], Job.DONE)
+        self.assertTrue(job['result_url'].startswith('http://testserver/'))
+        response = self.client.get(job['result_url'])
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Картофель', b''.join(response.streaming_content)
+                      .decode())
+        self.client.force_authenticate(self.users[1])
+        self.assertEqual(self.client.get(job['result_url']).status_code, 404)
+        self.client.force_authenticate(self.users[0])
+        with self.settings(SHOPPING_CART_EXPORT_RETENTION_HOURS=-1):
+            purge_exports()
+        self.assertEqual(self.client.get(job['result_url']).status_code, 404)
+
+    def test_download_without_file(self):
+        job = enqueue(add, user=self.users[0], a=1, b=2)
+        run_ready()
+        self.client.force_authenticate(self.users[0])
+        response = self.client.get(f'/api/jobs/{job.pk}/')
+        self.assertIsNone(response.json()['result_url'])
+        response = self.client.get(f'/api/jobs/{job.pk}/download/')
+        self.assertEqual(response.status_code, 404)
+
+    def test_purge_exports(self):
+        kept, expired = (
+            ShoppingCartExport([('Картофель', 'г', str(amount))], 'txt')
+            for amount in (100, 200)
+        )
+        for export in (kept, expired):
+            export.render()
+            day_ago = time.time() - 24 * 60 * 60 - 1
+            os.utime(export.path, (day_ago, day_ago))
+        self.assertTrue(kept.is_ready())
+        self.assertEqual(purge_exports(), 1)
+        self.assertTrue(os.path.exists(kept.path))
+        self.assertFalse(expired.is_ready())
@@ -0,0 +1,108 @@
+import os
+import subprocess
+import sys
+import tempfile
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.test import RequestFactory, SimpleTestCase
+from prometheus_client import REGISTRY
+from rest_framework.test import APITestCase
+
+from api.tests.utils import create_recipe, create_user
+from backend.metrics import metrics_view, record_cache, view_name
+
+# Процесс воркера: пишет метрики в файлы PROMETHEUS_MULTIPROC_DIR.
+WORKER_SCRIPT = (
+    'from backend.metrics import record_cache\n'
+    'record_cache("multiprocess_test", True)\n'
+)
+
+
+def sample(name, **labels):
+    return REGISTRY.get_sample_value(name, labels) or 0
+
+
+class MetricsMiddlewareTest(APITestCase):
+    """Метрики запросов по представлениям."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_recipe(create_user('author'))
+
+    def setUp(self):
+        cache.clear()
+
+    def test_request_metrics(self):
+        view = 'RecipeViewSet.list'
+        before = {
+            'requests': sample('foodgram_requests_total', view=view,
+                               method='GET', status='200'),
+            'queries': sample('foodgram_db_queries_count', view=view),
+            'query_total': sample('foodgram_db_queries_sum', view=view),
+            'size': sample('foodgram_response_size_bytes_sum', view=view),
+        }
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(
+            sample('foodgram_requests_total', view=view, method='GET',
+                   status='200'),
+            before['requests'] + 1,
+        )
+        self.assertEqual(sample('foodgram_db_queries_count', view=view),
+                         before['queries'] + 1)
+        self.assertGreater(sample('foodgram_db_queries_sum', view=view),
+                           before['query_total'])
+        self.assertEqual(
+            sample('foodgram_response_size_bytes_sum', view=view),
+            before['size'] + len(response.content),
+        )
+
+    def test_view_names(self):
+        for path, method, view, status in (
+            ('/api/recipes/0/', 'get', 'RecipeViewSet.retrieve', '404'),
+            ('/api/batch/', 'post', 'APIBatch', '400'),
+            ('/metrics', 'get', 'metrics', '200'),
+        ):
+            before = sample('foodgram_requests_total', view=view,
+                            method=method.upper(), status=status)
+            getattr(self.client, method)(path)
+            self.assertEqual(
+                sample('foodgram_requests_total', view=view,
+                       method=method.upper(), status=status),
+                before + 1, path,
+            )
+        self.assertEqual(view_name(RequestFactory().get('/')), 'unresolved')
+
+    def test_cache_metrics_and_endpoint(self):
+        record_cache('test_cache', True)
+        record_cache('test_cache', False)
+        response = self.client.get('/metrics')
+        self.assertEqual(response.status_code, 200)
+        content = response.content.decode()
+        for result in ('hit', 'miss'):
+            self.assertIn(
+                f'foodgram_cache_requests_total{{cache="test_cache",'
+                f'result="{result}"}}', content
+            )
+
+
+class MultiprocessMetricsTest(SimpleTestCase):
+    """Под gunicorn метрики воркеров суммируются через файлы каталога."""
+
+    def test_sum_over_processes(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        environment = dict(os.environ, PROMETHEUS_MULTIPROC_DIR=directory.name)
+        for _ in range(2):
+            subprocess.run(
+                [sys.executable, '-c', WORKER_SCRIPT], check=True,
+                cwd=settings.BASE_DIR, env=environment,
+            )
+        with mock.patch.dict(os.environ,
+                             PROMETHEUS_MULTIPROC_DIR=directory.name):
+            response = metrics_view(RequestFactory().get('/metrics'))
+        self.assertIn(
+            'foodgram_cache_requests_total{cache="multiprocess_test",'
+            'result="hit"} 2.0', response.content.decode()
+        )
@@ -0,0 +1,99 @@
+from unittest import skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from api.pagination import count_queryset
+from api.tests.utils import create_recipe, create_users
+from recipes.models import Favorite, Recipe
+
+
+class CountingPaginatorTest(APITestCase):
+    """Подсчет объектов для пагинации: упрощенный запрос и кэш."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.other, cls.author = create_users(
+            'user', 'other', 'author'
+        )
+        cls.recipes = [
+            create_recipe(cls.author, f'Рецепт {number}')
+            for number in range(5)
+        ]
+        create_recipe(cls.user, 'Рецепт пользователя')
+        for recipe in cls.recipes[:2]:
+            Favorite.objects.create(user=cls.user, recipe=recipe)
+        Favorite.objects.create(user=cls.other, recipe=cls.recipes[4])
+
+    def setUp(self):
+        cache.clear()
+
+    def get(self, user, path):
+        self.client.force_authenticate(user)
+        with CaptureQueriesContext(connection) as queries:
+            response = self.client.get(path)
+        self.assertEqual(response.status_code, 200)
+        counts = [query['sql'] for query in queries
+                  if 'COUNT(' in query['sql'].upper()]
+        return response, counts
+
+    def test_annotations_stripped_filters_kept(self):
+        queryset = Recipe.objects.add_user_annotations(
+            self.user.pk, ['is_favorited']
+        ).filter(is_favorited=True).select_related('author').order_by('name')
+        counted = count_queryset(queryset)
+        self.assertEqual(counted.query.annotations, {})
+        self.assertFalse(counted.query.select_related)
+        self.assertEqual(counted.count(), 2)
+        self.assertEqual(queryset.count(), 2)
+
+    def test_annotation_filter_in_api(self):
+        response, counts = self.get(self.user, '/api/recipes/?is_favorited=1')
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(len(response.json()['results']), 2)
+        self.assertEqual(len(counts), 1)
+        # COUNT не оборачивается в подзапрос с колонками страницы.
+        self.assertNotIn('FROM (SELECT', counts[0].upper())
+
+    def test_cache_key_per_user_and_filter(self):
+        path = '/api/recipes/?is_favorited=1'
+        self.assertEqual(self.get(self.user, path)[0].json()['count'], 2)
+        self.assertEqual(self.get(self.other, path)[0].json()['count'], 1)
+        response, counts = self.get(self.user, path)
+        self.assertEqual((response.json()['count'], counts), (2, []))
+        for author, expected in ((self.author, 5), (self.user, 1)):
+            response, counts = self.get(
+                self.other, f'/api/recipes/?author={author.pk}'
+            )
+            self.assertEqual(response.json()['count'], expected)
+            self.assertEqual(len(counts), 1)
+
+    def test_exact_count_without_header(self):
+        response, _ = self.get(self.user, '/api/recipes/')
+        self.assertEqual(response.json()['count'], 6)
+        self.assertFalse(response.has_header('X-Count-Approximate'))
+
+    @skipUnless(connection.vendor == 'postgresql',
+                'Оценка числа строк есть только в PostgreSQL.')
+    def test_estimated_count(self):
+        with connection.cursor() as cursor:
+            cursor.execute('ANALYZE recipes_recipe')
+            cursor.execute(
+                "SELECT reltuples FROM pg_class "
+                "WHERE oid = 'recipes_recipe'::regclass"
+            )
+            reltuples = int(cursor.fetchone()[0])
+        with self.settings(PAGINATION_ESTIMATE_THRESHOLD=0):
+            response, counts = self.get(None, '/api/recipes/')
+            self.assertEqual(response.json()['count'], reltuples)
+            self.assertEqual(response['X-Count-Approximate'], 'true')
+            self.assertEqual(counts, [])
+            # С фильтром оценка неприменима: считается точно.
+            response, counts = self.get(
+                None, f'/api/recipes/?author={self.user.pk}'
+            )
+            self.assertEqual(response.json()['count'], 1)
+            self.assertFalse(response.has_header('X-Count-Approximate'))
+            self.assertEqual(len(counts), 1)
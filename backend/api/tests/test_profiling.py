@@ -0,0 +1,117 @@
+import json
+import os
+import tempfile
+
+from django.core.cache import cache
+from django.test import override_settings
+from rest_framework.authtoken.models import Token
+from rest_framework.test import APITestCase
+
+from api.profiling import check_token, make_token, rotate
+from api.tests.utils import create_recipe, create_user
+
+
+@override_settings(PROFILING_ENABLED=True, PROFILING_SAMPLE_RATE=0)
+class ProfilingMiddlewareTest(APITestCase):
+    """Профилирование запросов по заголовку, параметру и выборке."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.staff = create_user('staff')
+        cls.staff.is_staff = True
+        cls.staff.save()
+        cls.user = create_user('user')
+        create_recipe(cls.user)
+
+    def setUp(self):
+        cache.clear()
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+        settings = override_settings(PROFILING_DIR=self.directory)
+        settings.enable()
+        self.addCleanup(settings.disable)
+
+    def saved(self, extension='.json'):
+        if not os.path.exists(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory)
+                      if name.endswith(extension))
+
+    def token(self, user):
+        return f'Token {Token.objects.create(user=user).key}'
+
+    def test_signed_header_summary(self):
+        response = self.client.get(
+            '/api/recipes/', HTTP_X_PROFILE=make_token(),
+            HTTP_X_PROFILE_MODE='summary',
+        )
+        self.assertEqual(response.status_code, 200)
+        summary = response.json()
+        self.assertEqual((summary['path'], summary['status']),
+                         ('/api/recipes/', 200))
+        self.assertGreater(summary['queries'], 0)
+        self.assertIn('function', summary['call_tree'])
+        self.assertIn('children', summary['call_tree'])
+        self.assertEqual(self.saved(), [])
+
+    def test_signed_header_save(self):
+        response = self.client.get('/api/recipes/',
+                                   HTTP_X_PROFILE=make_token())
+        self.assertEqual(response.json()['count'], 1)
+        saved = self.saved()
+        self.assertEqual(len(saved), 1)
+        self.assertEqual(len(self.saved('.prof')), 1)
+        with open(os.path.join(self.directory, saved[0]),
+                  encoding='utf8') as file:
+            profile = json.load(file)
+        self.assertEqual(len(profile['sql']), profile['queries'])
+        self.assertTrue(all('sql' in query and 'alias' in query
+                            for query in profile['sql']))
+
+    def test_invalid_or_expired_token(self):
+        self.client.get('/api/recipes/', HTTP_X_PROFILE='profile:подделка')
+        self.assertEqual(self.saved(), [])
+        token = make_token()
+        with self.settings(PROFILING_TOKEN_MAX_AGE=-1):
+            self.assertFalse(check_token(token))
+        self.assertTrue(check_token(token))
+
+    def test_query_param_for_staff_only(self):
+        response = self.client.get(
+            '/api/recipes/?profile=summary',
+            HTTP_AUTHORIZATION=self.token(self.user),
+        )
+        self.assertIn('results', response.json())
+        response = self.client.get(
+            '/api/recipes/?profile=summary',
+            HTTP_AUTHORIZATION=self.token(self.staff),
+        )
+        self.assertIn('call_tree', response.json())
+
+    def test_sampling(self):
+        with self.settings(PROFILING_SAMPLE_RATE=1):
+            self.client.get('/api/tags/')
+            self.assertEqual(self.saved(), [])
+            self.client.get('/api/recipes/')
+            self.assertEqual(len(self.saved()), 1)
+
+    def test_rotate(self):
+        for number in range(5):
+            base = os.path.join(self.directory, f'profile-{number}')
+            for extension in ('.prof', '.json'):
+                with open(base + extension, 'w') as file:
+                    file.write('{}')
+            os.utime(base + '.prof', (number, number))
+        rotate(self.directory, keep=2)
+        self.assertEqual(self.saved('.prof'),
+                         ['profile-3.prof', 'profile-4.prof'])
+        self.assertEqual(self.saved(), ['profile-3.json', 'profile-4.json'])
+
+    def test_disabled(self):
+        with self.settings(PROFILING_ENABLED=False):
+            response = self.client.get(
+                '/api/recipes/', HTTP_X_PROFILE=make_token(),
+                HTTP_X_PROFILE_MODE='summary',
+            )
+        self.assertIn('results', response.json())
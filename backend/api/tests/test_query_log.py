@@ -0,0 +1,113 @@
+import io
+
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from rest_framework.test import APITestCase
+
+from api.models import Job, QueryStat
+from api.query_log import (QueryLog, normalize_sql, record, record_stats,
+                           stats_buffer)
+from api.tests.test_jobs import run_ready
+from api.tests.utils import create_recipe, create_user
+
+
+class QueryLogTest(TestCase):
+    """Поиск медленных и повторяющихся запросов."""
+
+    def setUp(self):
+        stats_buffer.take()
+
+    def test_normalize_sql(self):
+        self.assertEqual(
+            normalize_sql('SELECT 1 WHERE id IN (%s, %s,%s) AND a = %s'),
+            'SELECT 1 WHERE id IN (%s, ...) AND a = %s',
+        )
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=10 ** 6,
+                       SLOW_QUERY_REPEAT_THRESHOLD=3)
+    def test_repeated(self):
+        query_log = QueryLog()
+        with self.assertLogs('api.queries', 'WARNING') as logs:
+            with connection.execute_wrapper(query_log):
+                for _ in range(4):
+                    QueryStat.objects.filter(pk=1).exists()
+                QueryStat.objects.count()
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('повторен 3 раз', logs.output[0])
+        findings = list(query_log.findings())
+        self.assertEqual(len(findings), 1)
+        kind, location, sql, durations = findings[0]
+        self.assertEqual(kind, QueryStat.REPEATED)
+        self.assertTrue(location.startswith('api/tests/test_query_log.py:'))
+        self.assertIn('test_repeated', location)
+        self.assertEqual(len(durations), 4)
+
+    @override_settings(SLOW_QUERY_THRESHOLD_MS=0)
+    def test_slow(self):
+        query_log = QueryLog()
+        with self.assertLogs('api.queries', 'WARNING') as logs:
+            with connection.execute_wrapper(query_log):
+                QueryStat.objects.count()
+        self.assertIn('Медленный запрос', logs.output[0])
+        (kind, location, sql, durations), = query_log.findings()
+        self.assertEqual(kind, QueryStat.SLOW)
+        self.assertIn('test_slow', location)
+        self.assertIn('COUNT', sql.upper())
+
+    def test_record_accumulates(self):
+        record(QueryStat.SLOW, 'api/views.py:1 list', 'SELECT 1', 2, 30, 20)
+        record(QueryStat.SLOW, 'api/views.py:1 list', 'SELECT 1', 1, 50, 50)
+        record(QueryStat.REPEATED, 'api/views.py:1 list', 'SELECT 1', 1, 1,
+               1)
+        stat = QueryStat.objects.get(kind=QueryStat.SLOW)
+        self.assertEqual((stat.calls, stat.total_time, stat.max_time),
+                         (3, 80, 50))
+        self.assertEqual(QueryStat.objects.count(), 2)
+
+    def test_buffer_flushes_in_one_job(self):
+        query_log = QueryLog()
+        query_log.slow[('SELECT 1', 'api/views.py:1 list')] = [0.5, 0.25]
+        with self.settings(SLOW_QUERY_FLUSH_INTERVAL=10 ** 6):
+            query_log.save()
+            query_log.save()
+        self.assertFalse(Job.objects.exists())
+        with self.settings(SLOW_QUERY_FLUSH_INTERVAL=0):
+            query_log.save()
+        job = Job.objects.get()
+        self.assertEqual(job.name, f'{record_stats.__module__}.record_stats')
+        run_ready()
+        stat = QueryStat.objects.get()
+        self.assertEqual((stat.calls, stat.total_time, stat.max_time),
+                         (6, 2250, 500))
+
+
+@override_settings(SLOW_QUERY_LOG_ENABLED=True, SLOW_QUERY_THRESHOLD_MS=0,
+                   SLOW_QUERY_FLUSH_INTERVAL=0)
+class QueryLogMiddlewareTest(APITestCase):
+
+    @classmethod
+    def setUpTestData(cls):
+        create_recipe(create_user('author'))
+
+    def setUp(self):
+        cache.clear()
+        stats_buffer.take()
+
+    def test_findings_saved(self):
+        with self.assertLogs('api.queries', 'WARNING'):
+            response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        run_ready()
+        locations = set(QueryStat.objects.values_list('location', flat=True))
+        self.assertTrue(locations)
+        self.assertTrue(all(location.startswith(('api/', 'recipes/',
+                                                 'users/', 'backend/'))
+                            or location == 'unknown'
+                            for location in locations), locations)
+        output = io.StringIO()
+        call_command('slow_queries', '--kind', 'slow', stdout=output)
+        self.assertIn('Медленный', output.getvalue())
+        call_command('slow_queries', '--reset', stdout=io.StringIO())
+        self.assertFalse(QueryStat.objects.exists())
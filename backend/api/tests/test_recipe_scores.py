@@ -0,0 +1,92 @@
+import io
+from datetime import timedelta
+
+from django.core.management import call_command
+from django.test import TestCase
+from django.utils import timezone
+
+from api.tests.utils import create_recipe, create_users
+from recipes.models import (Favorite, RecipeScore, RecipeScoreCheckpoint,
+                            ShoppingCart)
+
+
+class UpdateRecipeScoresTest(TestCase):
+    """Пересчет оценок popular и trending командой update_recipe_scores."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.users = create_users('first', 'second', 'third')
+        cls.soup, cls.salad = (
+            create_recipe(cls.users[0], name) for name in ('Суп', 'Салат')
+        )
+
+    def update(self, *args):
+        call_command('update_recipe_scores', *args, stdout=io.StringIO())
+        return {
+            score.recipe_id: (score.popularity, score.trending)
+            for score in RecipeScore.objects.all()
+        }
+
+    def popularity(self, *args):
+        scores = self.update(*args)
+        return scores[self.soup.pk][0], scores[self.salad.pk][0]
+
+    def test_incremental(self):
+        Favorite.objects.create(user=self.users[0], recipe=self.soup)
+        ShoppingCart.objects.create(user=self.users[1], recipe=self.soup)
+        ShoppingCart.objects.create(user=self.users[1], recipe=self.salad)
+        scores = self.update()
+        self.assertEqual(scores[self.soup.pk][0], 3)
+        self.assertAlmostEqual(scores[self.soup.pk][1], 3, places=3)
+        # Записи в окне перекрытия повторно не учитываются.
+        self.assertEqual(self.popularity(), (3, 1))
+        Favorite.objects.create(user=self.users[1], recipe=self.salad)
+        self.assertEqual(self.popularity(), (3, 3))
+
+    def test_late_commit(self):
+        """
+        Запись, получившая меньший id и время до запуска, но видимая
+        только после него, учитывается следующим запуском.
+        """
+        late = Favorite.objects.create(user=self.users[0], recipe=self.soup)
+        Favorite.objects.create(user=self.users[1], recipe=self.soup)
+        late.delete()
+        self.assertEqual(self.popularity(), (2, 0))
+        Favorite.objects.create(
+            id=late.id, user=self.users[0], recipe=self.soup
+        )
+        Favorite.objects.filter(id=late.id).update(
+            created_at=RecipeScoreCheckpoint.objects.get().updated_at
+            - timedelta(seconds=1)
+        )
+        self.assertEqual(self.popularity(), (4, 0))
+        self.assertEqual(self.popularity(), (4, 0))
+
+    def test_legacy_checkpoint(self):
+        counted = Favorite.objects.create(user=self.users[0],
+                                          recipe=self.soup)
+        Favorite.objects.filter(id=counted.id).update(created_at=None)
+        RecipeScore.objects.filter(recipe=self.soup).update(popularity=2)
+        RecipeScoreCheckpoint.objects.create(favorite_id=counted.id)
+        Favorite.objects.create(user=self.users[1], recipe=self.soup)
+        self.assertEqual(self.popularity(), (4, 0))
+        self.assertEqual(self.popularity(), (4, 0))
+
+    def test_full(self):
+        favorites = [
+            Favorite.objects.create(user=user, recipe=self.soup)
+            for user in self.users
+        ]
+        self.update()
+        favorites[0].delete()
+        Favorite.objects.filter(id=favorites[1].id).update(
+            created_at=timezone.now() - timedelta(hours=72)
+        )
+        scores = self.update()
+        self.assertEqual(scores[self.soup.pk][0], 6)
+        scores = self.update('--full', '--half-life', '72')
+        popularity, trending = scores[self.soup.pk]
+        self.assertEqual(popularity, 4)
+        # Запись трехдневной давности весит вдвое меньше новой.
+        self.assertAlmostEqual(trending, 2 + 1, places=3)
+        self.assertEqual(scores[self.salad.pk], (0, 0))
@@ -0,0 +1,87 @@
+import tempfile
+
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from api.benchmark import make_png
+from api.tests.utils import create_ingredient, create_tag, create_user
+
+WRITE_STATEMENTS = ('INSERT', 'UPDATE', 'DELETE')
+
+
+class RecipeWriteResponseTest(APITestCase):
+    """Ответ на создание и изменение рецепта строится без перечитывания."""
+
+    # На каждый дополнительный ингредиент и тэг в запросе приходится
+    # один запрос их проверки при валидации; ответ запросов не добавляет.
+    EXTRA_QUERIES = (6 - 2) + (3 - 1)
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = create_user('author')
+        cls.ingredients = [
+            create_ingredient(f'Ингредиент {number}') for number in range(6)
+        ]
+        cls.tags = [
+            create_tag(f'Тэг {number}', f'tag-{number}') for number in range(3)
+        ]
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name)
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_authenticate(self.user)
+
+    def data(self, count):
+        return {
+            'name': 'Суп', 'text': 'Текст', 'cooking_time': 30,
+            'image': make_png(),
+            'tags': [tag.pk for tag in self.tags[:count // 2]],
+            'ingredients': [
+                {'id': ingredient.pk, 'amount': 10}
+                for ingredient in self.ingredients[:count]
+            ],
+        }
+
+    def write(self, method, url, data):
+        with CaptureQueriesContext(connection) as queries:
+            response = getattr(self.client, method)(url, data, format='json')
+        self.assertLess(response.status_code, 300, response.content)
+        statements = [query['sql'].lstrip().split(' ', 1)[0].upper()
+                      for query in queries]
+        last_write = max(index for index, statement in enumerate(statements)
+                         if statement in WRITE_STATEMENTS)
+        self.assertEqual(
+            [statement for statement in statements[last_write + 1:]
+             if statement == 'SELECT'], [],
+            'После записи ответ не должен читать рецепт заново.'
+        )
+        return response, len(queries)
+
+    def test_create(self):
+        response, few = self.write('post', '/api/recipes/', self.data(2))
+        detail = self.client.get(f'/api/recipes/{response.json()["id"]}/')
+        self.assertEqual(response.json(), detail.json())
+        self.assertEqual(len(response.json()['ingredients']), 2)
+        _, many = self.write('post', '/api/recipes/', self.data(6))
+        self.assertEqual(many - few, self.EXTRA_QUERIES)
+
+    def test_update(self):
+        recipe_id = self.write(
+            'post', '/api/recipes/', self.data(2)
+        )[0].json()['id']
+        url = f'/api/recipes/{recipe_id}/'
+        self.client.post(f'{url}favorite/')
+        data = self.data(6)
+        del data['image']
+        response, many = self.write('patch', url, data)
+        self.assertEqual(response.json(), self.client.get(url).json())
+        self.assertTrue(response.json()['is_favorited'])
+        self.assertEqual(len(response.json()['ingredients']), 6)
+        # Та же картинка, что уже у рецепта, запросов не добавляет.
+        _, few = self.write('patch', url, self.data(2))
+        self.assertEqual(many - few, self.EXTRA_QUERIES)
@@ -0,0 +1,75 @@
+from unittest import skipIf, skipUnless
+
+from django.core.cache import cache
+from django.db import connection
+from rest_framework.test import APITestCase
+
+from api.tests.utils import create_ingredient, create_recipe, create_user
+
+IS_POSTGRESQL = connection.vendor == 'postgresql'
+
+
+class RecipeSearchTest(APITestCase):
+    """Поиск рецептов ?search= по названию и тексту."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        cls.in_name, cls.in_text, cls.other = (
+            create_recipe(author, name, text)
+            for name, text in (
+                ('Грибной суп', 'Сварить грибы.'),
+                ('Жаркое', 'Добавить грибной бульон.'),
+                ('Салат', 'Нарезать овощи.'),
+            )
+        )
+
+    def setUp(self):
+        cache.clear()
+
+    def search(self, query):
+        response = self.client.get('/api/recipes/', {'search': query})
+        self.assertEqual(response.status_code, 200)
+        return [recipe['id'] for recipe in response.json()['results']]
+
+    def test_name_ranked_above_text(self):
+        self.assertEqual(
+            self.search('грибной'), [self.in_name.pk, self.in_text.pk]
+        )
+
+    def test_no_match(self):
+        self.assertEqual(self.search('пирог'), [])
+
+    def test_empty_query(self):
+        self.assertEqual(len(self.search('')), 3)
+
+    def test_with_other_filters(self):
+        response = self.client.get('/api/recipes/', {
+            'search': 'грибной', 'author': self.in_name.author_id,
+            'ordering': 'popular',
+        })
+        self.assertEqual(response.status_code, 200)
+
+    @skipUnless(IS_POSTGRESQL, 'Морфология только в PostgreSQL.')
+    def test_word_forms(self):
+        self.assertEqual(self.search('супы'), [self.in_name.pk])
+
+    @skipIf(IS_POSTGRESQL, 'Запасной вариант для других баз.')
+    def test_substring_fallback(self):
+        self.assertEqual(self.search('ГРИБ'),
+                         [self.in_name.pk, self.in_text.pk])
+
+
+class IngredientSearchTest(APITestCase):
+    """Поиск ингредиентов ?name= по началу названия."""
+
+    def test_prefix_in_any_case(self):
+        potato = create_ingredient('Картофель')
+        create_ingredient('Морковь')
+        for query in ('кар', 'КАР', 'Картофель'):
+            response = self.client.get('/api/ingredients/', {'name': query})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(
+                [ingredient['id'] for ingredient in response.json()],
+                [potato.pk],
+            )
@@ -0,0 +1,72 @@
+from rest_framework.test import APITestCase
+
+from api.tests.utils import create_ingredient, create_recipe, create_user
+from recipes.minhash import similar_recipes, update_signatures
+
+
+class SimilarRecipesTest(APITestCase):
+    """Похожие рецепты по MinHash-подписям и корзинам LSH."""
+
+    @classmethod
+    def setUpTestData(cls):
+        ingredients = [
+            create_ingredient(f'Ингредиент {number}') for number in range(30)
+        ]
+        author = create_user('author')
+
+        def recipe(name, numbers):
+            return create_recipe(author, name, ingredients=[
+                (ingredients[number], 1) for number in numbers
+            ])
+
+        cls.base = recipe('Основа', range(10))
+        cls.copy = recipe('Копия', range(10))
+        cls.close = recipe('Близкий', [*range(9), 10])
+        cls.half = recipe('Наполовину', [*range(7), *range(10, 13)])
+        cls.unrelated = recipe('Другой', range(20, 30))
+        cls.second_copy = recipe('Вторая копия', range(10))
+        update_signatures([
+            cls.base.pk, cls.copy.pk, cls.close.pk, cls.half.pk,
+            cls.unrelated.pk, cls.second_copy.pk,
+        ])
+
+    def test_order(self):
+        similar = similar_recipes(self.base.pk, 10)
+        self.assertEqual(
+            [recipe_id for recipe_id, _ in similar],
+            [self.copy.pk, self.second_copy.pk, self.close.pk, self.half.pk],
+        )
+        similarities = [similarity for _, similarity in similar]
+        self.assertEqual(similarities[:2], [1.0, 1.0])
+        self.assertEqual(similarities, sorted(similarities, reverse=True))
+        # Оценка по подписям близка к точному коэффициенту Жаккара.
+        self.assertAlmostEqual(similarities[2], 9 / 11, delta=0.25)
+        self.assertAlmostEqual(similarities[3], 7 / 13, delta=0.25)
+
+    def test_limit(self):
+        self.assertEqual(
+            [recipe_id for recipe_id, _ in similar_recipes(self.base.pk, 2)],
+            [self.copy.pk, self.second_copy.pk],
+        )
+        self.assertEqual(similar_recipes(self.base.pk, 0), [])
+
+    def test_without_signature(self):
+        recipe = create_recipe(self.base.author, 'Без ингредиентов')
+        update_signatures([recipe.pk])
+        self.assertEqual(similar_recipes(recipe.pk, 10), [])
+
+    def test_endpoint(self):
+        response = self.client.get(
+            f'/api/recipes/{self.base.pk}/similar/?limit=3'
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            [(recipe['id'], recipe['similarity'])
+             for recipe in response.json()[:2]],
+            [(self.copy.pk, 1.0), (self.second_copy.pk, 1.0)],
+        )
+        self.assertEqual(response.json()[2]['id'], self.close.pk)
+        self.assertEqual(
+            self.client.get(f'/api/recipes/{self.base.pk}/similar/'
+                            '?limit=много').status_code, 400
+        )
@@ -0,0 +1,125 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from api.tests.utils import (create_ingredient, create_recipe, create_tag,
+                             create_users)
+from recipes.models import Favorite
+from users.models import Subscription
+
+RECIPE_FIELDS = {
+    'id', 'tags', 'author', 'ingredients', 'is_favorited',
+    'is_in_shopping_cart', 'name', 'image', 'text', 'cooking_time',
+}
+
+
+class SparseFieldsetTest(APITestCase):
+    """Поля ответа ?fields= и ?omit= у рецептов и пользователей."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = create_users('user', 'author')
+        cls.favorite = create_recipe(
+            cls.author, tags=[create_tag()],
+            ingredients=[(create_ingredient(), 100)],
+        )
+        cls.other = create_recipe(cls.author, 'Салат')
+        Favorite.objects.create(user=cls.user, recipe=cls.favorite)
+        Subscription.objects.create(user=cls.user, author=cls.author)
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def get(self, url, status=200):
+        response = self.client.get(url)
+        self.assertEqual(response.status_code, status)
+        return response.json()
+
+    def get_recipe(self, query):
+        return self.get(f'/api/recipes/{self.favorite.pk}/?{query}')
+
+    def test_all_fields_by_default(self):
+        self.assertEqual(set(self.get_recipe('')), RECIPE_FIELDS)
+
+    def test_fields(self):
+        self.assertEqual(self.get_recipe('fields=id,name'),
+                         {'id': self.favorite.pk, 'name': 'Суп'})
+        self.assertEqual(
+            self.get_recipe('fields=id&fields=is_favorited'),
+            {'id': self.favorite.pk, 'is_favorited': True},
+        )
+
+    def test_nested_fields(self):
+        self.assertEqual(
+            self.get_recipe(
+                'fields=author.username,author.is_subscribed,tags.slug'
+            ),
+            {'author': {'username': 'author', 'is_subscribed': True},
+             'tags': [{'slug': 'lunch'}]},
+        )
+
+    def test_omit(self):
+        recipe = self.get_recipe('omit=text,ingredients,author.email')
+        self.assertEqual(set(recipe),
+                         RECIPE_FIELDS - {'text', 'ingredients'})
+        self.assertNotIn('email', recipe['author'])
+        self.assertIn('username', recipe['author'])
+
+    def test_fields_and_omit(self):
+        self.assertEqual(
+            self.get_recipe('fields=id,author&omit=author.email,author.id'),
+            {'id': self.favorite.pk, 'author': {
+                'username': 'author', 'first_name': 'Имя',
+                'last_name': 'Фамилия', 'is_subscribed': True,
+            }},
+        )
+
+    def test_unknown_fields(self):
+        for query, error in (
+            ('fields=id,calories', 'Неизвестные поля: calories.'),
+            ('omit=author.phone', 'Неизвестные поля: author.phone.'),
+            ('fields=name.first', 'Поле name не содержит вложенных полей.'),
+        ):
+            self.assertEqual(
+                self.get(f'/api/recipes/?{query}', status=400),
+                {'fields': error},
+            )
+
+    def test_list_with_filter_on_omitted_field(self):
+        data = self.get('/api/recipes/?fields=id&is_favorited=1')
+        self.assertEqual(data['results'], [{'id': self.favorite.pk}])
+
+    def test_only_requested_columns(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.get('/api/recipes/?fields=id,name')
+        select = queries[-1]['sql']
+        self.assertIn('"name"', select)
+        for column in ('"text"', '"image"', '"search_vector"'):
+            self.assertNotIn(column, select)
+        self.assertFalse(any(
+            'recipes_recipeingredient' in query['sql'] for query in queries
+        ))
+
+    def test_users(self):
+        data = self.get('/api/users/?fields=username,is_subscribed')
+        self.assertCountEqual(data['results'], [
+            {'username': 'user', 'is_subscribed': False},
+            {'username': 'author', 'is_subscribed': True},
+        ])
+        self.assertEqual(
+            self.get('/api/users/subscriptions/?omit=recipes,email')
+            ['results'][0]['recipes_count'],
+            2,
+        )
+
+    def test_ignored_on_write(self):
+        self.client.force_authenticate(None)
+        response = self.client.post('/api/users/?fields=id', {
+            'email': 'new@example.com', 'username': 'new',
+            'first_name': 'Имя', 'last_name': 'Фамилия',
+            'password': 'Secret-pass-123',
+        })
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()['username'], 'new')
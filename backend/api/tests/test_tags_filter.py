@@ -0,0 +1,59 @@
+from django.core.cache import cache
+from rest_framework.test import APITestCase
+
+from api.tests.utils import create_recipe, create_tag, create_user
+from recipes.models import TAG_IDS_CACHE_KEY
+
+
+class TagsFilterTest(APITestCase):
+    """Фильтр рецептов по тэгам: ?tags= и ?tags_match=all."""
+
+    @classmethod
+    def setUpTestData(cls):
+        author = create_user('author')
+        cls.breakfast = create_tag('Завтрак', 'breakfast', '#E26C2D')
+        cls.lunch = create_tag()
+        cls.both = create_recipe(
+            author, 'Оба тэга', tags=[cls.breakfast, cls.lunch]
+        )
+        cls.only_breakfast = create_recipe(
+            author, 'Только завтрак', tags=[cls.breakfast]
+        )
+        create_recipe(author, 'Без тэгов')
+
+    def setUp(self):
+        cache.clear()
+
+    def get_ids(self, query):
+        response = self.client.get(f'/api/recipes/?{query}')
+        self.assertEqual(response.status_code, 200)
+        return {recipe['id'] for recipe in response.json()['results']}
+
+    def test_any_tag(self):
+        self.assertEqual(
+            self.get_ids('tags=breakfast&tags=lunch'),
+            {self.both.pk, self.only_breakfast.pk},
+        )
+
+    def test_all_tags(self):
+        self.assertEqual(
+            self.get_ids('tags=breakfast&tags=lunch&tags_match=all'),
+            {self.both.pk},
+        )
+
+    def test_all_tags_with_repeated_slug(self):
+        self.assertEqual(
+            self.get_ids('tags=breakfast&tags=breakfast&tags_match=all'),
+            {self.both.pk, self.only_breakfast.pk},
+        )
+
+    def test_unknown_slug(self):
+        self.assertEqual(self.get_ids('tags=dinner'), set())
+        self.assertEqual(
+            self.get_ids('tags=breakfast&tags=dinner&tags_match=all'), set()
+        )
+
+    def test_tag_missing_from_stale_cache(self):
+        """Кэш другого процесса без нового тэга перечитывается."""
+        cache.set(TAG_IDS_CACHE_KEY, {'breakfast': self.breakfast.pk})
+        self.assertEqual(self.get_ids('tags=lunch'), {self.both.pk})
@@ -0,0 +1,87 @@
+from django.db import connection
+from rest_framework.test import APITestCase
+
+from api.tests.utils import create_recipe, create_users
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+# INSERT в CTE возвращает колонки ответа; в других базах объект
+# читается вторым запросом.
+ADD_QUERIES = 1 if connection.vendor == 'postgresql' else 2
+
+
+class ToggleTest(APITestCase):
+    """Избранное, корзина и подписки: добавление и удаление."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = create_users('user', 'author')
+        cls.recipe = create_recipe(cls.author)
+
+    def setUp(self):
+        self.client.force_authenticate(self.user)
+
+    def test_add_and_remove_favorite(self):
+        url = f'/api/recipes/{self.recipe.pk}/favorite/'
+        with self.assertNumQueries(ADD_QUERIES):
+            response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json(), {
+            'id': self.recipe.pk, 'name': 'Суп', 'image': None,
+            'cooking_time': 30,
+        })
+        self.assertTrue(Favorite.objects.filter(
+            user=self.user, recipe=self.recipe
+        ).exists())
+        with self.assertNumQueries(1):
+            response = self.client.delete(url)
+        self.assertEqual(response.status_code, 204)
+        self.assertFalse(Favorite.objects.exists())
+
+    def test_add_to_shopping_cart_twice(self):
+        url = f'/api/recipes/{self.recipe.pk}/shopping_cart/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), 'Рецепт уже добавлен!')
+        self.assertEqual(ShoppingCart.objects.count(), 1)
+
+    def test_unknown_recipe(self):
+        for url in ('/api/recipes/0/favorite/',
+                    '/api/recipes/0/shopping_cart/'):
+            for method in (self.client.post, self.client.delete):
+                response = method(url)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(
+                    response.json(), 'Такого объекта не существует!'
+                )
+
+    def test_remove_missing_favorite(self):
+        response = self.client.delete(
+            f'/api/recipes/{self.recipe.pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, 400)
+
+    def test_subscribe(self):
+        url = f'/api/users/{self.author.pk}/subscribe/'
+        response = self.client.post(url)
+        self.assertEqual(response.status_code, 201)
+        data = response.json()
+        self.assertEqual(data['username'], 'author')
+        self.assertEqual(data['recipes_count'], 1)
+        self.assertEqual(data['recipes'][0]['id'], self.recipe.pk)
+        self.assertEqual(self.client.post(url).status_code, 400)
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_subscribe_to_self(self):
+        response = self.client.post(f'/api/users/{self.user.pk}/subscribe/')
+        self.assertEqual(response.status_code, 400)
+        self.assertFalse(Subscription.objects.exists())
+
+    def test_anonymous(self):
+        self.client.force_authenticate(None)
+        response = self.client.post(
+            f'/api/recipes/{self.recipe.pk}/favorite/'
+        )
+        self.assertEqual(response.status_code, 401)
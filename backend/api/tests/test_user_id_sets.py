@@ -0,0 +1,107 @@
+from django.core.cache import cache
+from django.db import connection
+from django.test import override_settings
+from django.test.utils import CaptureQueriesContext
+from rest_framework.test import APITestCase
+
+from api.tests.utils import create_recipe, create_users
+from recipes.models import Favorite, ShoppingCart
+from recipes.user_ids import UserIdSets, invalidate
+from users.models import Subscription
+
+
+@override_settings(USER_ID_SETS_ENABLED=True)
+class UserIdSetsTest(APITestCase):
+    """Признаки is_favorited, is_in_shopping_cart и is_subscribed из кэша."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user, cls.author = create_users('user', 'author')
+        cls.soup, cls.salad = (
+            create_recipe(cls.author, name) for name in ('Суп', 'Салат')
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_authenticate(self.user)
+
+    def flags(self, field='is_favorited'):
+        response = self.client.get('/api/recipes/')
+        self.assertEqual(response.status_code, 200)
+        return {recipe['id']: recipe[field]
+                for recipe in response.json()['results']}
+
+    def test_flags_from_cache(self):
+        Favorite.objects.create(user=self.user, recipe=self.soup)
+        self.assertEqual(self.flags(),
+                         {self.soup.pk: True, self.salad.pk: False})
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.flags(),
+                             {self.soup.pk: True, self.salad.pk: False})
+        for query in queries:
+            self.assertNotIn('recipes_favorite', query['sql'])
+            self.assertNotIn('recipes_shoppingcart', query['sql'])
+
+    def test_api_writes_invalidate(self):
+        self.assertEqual(self.flags('is_in_shopping_cart'),
+                         {self.soup.pk: False, self.salad.pk: False})
+        url = f'/api/recipes/{self.salad.pk}/shopping_cart/'
+        self.assertEqual(self.client.post(url).status_code, 201)
+        self.assertEqual(self.flags('is_in_shopping_cart'),
+                         {self.soup.pk: False, self.salad.pk: True})
+        self.assertEqual(self.client.delete(url).status_code, 204)
+        self.assertEqual(self.flags('is_in_shopping_cart'),
+                         {self.soup.pk: False, self.salad.pk: False})
+
+    def test_orm_writes_invalidate_on_commit(self):
+        self.assertFalse(self.flags()[self.soup.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.create(user=self.user, recipe=self.soup)
+        self.assertTrue(self.flags()[self.soup.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            Favorite.objects.filter(user=self.user).delete()
+        self.assertFalse(self.flags()[self.soup.pk])
+
+    def test_cascade_delete_invalidates(self):
+        Favorite.objects.create(user=self.user, recipe=self.salad)
+        self.assertTrue(UserIdSets(self.user).has('favorites', self.salad.pk))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.salad.delete()
+        self.assertFalse(
+            UserIdSets(self.user).has('favorites', self.salad.pk)
+        )
+
+    def test_stale_reader_does_not_overwrite(self):
+        """
+        Набор, загруженный читателем, который узнал версию до записи,
+        сохраняется под старой версией и новым читателям не виден.
+        """
+        stale = UserIdSets(self.user)
+        stale.get_cached()
+        invalidate(Favorite, self.user.pk)
+        self.assertFalse(stale.has('favorites', self.soup.pk))
+        Favorite.objects.create(user=self.user, recipe=self.soup)
+        self.assertTrue(UserIdSets(self.user).has('favorites', self.soup.pk))
+
+    def test_is_subscribed(self):
+        url = '/api/users/?fields=id,is_subscribed'
+
+        def subscribed():
+            return {user['id']: user['is_subscribed']
+                    for user in self.client.get(url).json()['results']}
+
+        self.assertFalse(subscribed()[self.author.pk])
+        self.client.post(f'/api/users/{self.author.pk}/subscribe/')
+        self.assertTrue(subscribed()[self.author.pk])
+        with self.captureOnCommitCallbacks(execute=True):
+            Subscription.objects.all().delete()
+        self.assertFalse(subscribed()[self.author.pk])
+
+    def test_anonymous(self):
+        ShoppingCart.objects.create(user=self.user, recipe=self.soup)
+        self.client.force_authenticate(None)
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.flags('is_in_shopping_cart'),
+                             {self.soup.pk: False, self.salad.pk: False})
+        for query in queries:
+            self.assertNotIn('recipes_shoppingcart', query['sql'])
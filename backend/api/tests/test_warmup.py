@@ -0,0 +1,123 @@
+import importlib.util
+import io
+import os
+from unittest import mock
+
+from django.conf import settings
+from django.core.cache import cache
+from django.core.handlers.wsgi import WSGIHandler
+from django.core.management import call_command
+from django.core.signals import request_finished, request_started
+from django.db import close_old_connections, connection, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+
+from api import warmup as warmup_module
+from api.tests.utils import create_recipe, create_tag, create_user
+from api.warmup import get, warmup
+from backend.wsgi import application
+from recipes.ingredient_index import IngredientIndex
+from recipes.models import Tag
+
+STEPS = ['import_modules', 'build_urls', 'build_serializers']
+
+
+def load_gunicorn_config():
+    """Модуль gunicorn.conf.py; переменные окружения он не меняет."""
+    spec = importlib.util.spec_from_file_location(
+        'gunicorn_conf', os.path.join(settings.BASE_DIR, 'gunicorn.conf.py')
+    )
+    module = importlib.util.module_from_spec(spec)
+    with mock.patch.dict(os.environ):
+        spec.loader.exec_module(module)
+    return module
+
+
+class WarmupTest(TestCase):
+    """Прогрев процесса до первого запроса."""
+
+    @classmethod
+    def setUpTestData(cls):
+        create_tag()
+        create_recipe(create_user('author'))
+
+    def setUp(self):
+        cache.clear()
+        self.index = IngredientIndex()
+        patcher = mock.patch.object(warmup_module, 'ingredient_index',
+                                    self.index)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        # Как и тестовый клиент, не даем запросам закрыть соединение
+        # с базой внутри транзакции теста.
+        request_started.disconnect(close_old_connections)
+        request_finished.disconnect(close_old_connections)
+        self.addCleanup(request_started.connect, close_old_connections)
+        self.addCleanup(request_finished.connect, close_old_connections)
+
+    def test_without_prime_no_queries(self):
+        with CaptureQueriesContext(connection) as queries:
+            timings = warmup(prime=False)
+        self.assertEqual(list(timings), STEPS)
+        self.assertTrue(all(duration >= 0 for duration in timings.values()))
+        self.assertEqual(len(queries), 0)
+        self.assertIsNone(self.index._state)
+
+    def test_prime_caches(self):
+        with mock.patch.object(warmup_module, 'get',
+                               wraps=get) as warmup_get:
+            timings = warmup(WSGIHandler())
+        self.assertEqual(list(timings), STEPS + ['prime_caches'])
+        self.assertEqual(
+            [call.args[1] for call in warmup_get.call_args_list],
+            list(settings.WARMUP_PATHS),
+        )
+        self.assertIsNotNone(self.index._state)
+        with CaptureQueriesContext(connection) as queries:
+            Tag.objects.ids_by_slug()
+        self.assertEqual(len(queries), 0)
+
+    def test_paths_respond(self):
+        handler = WSGIHandler()
+        for path in settings.WARMUP_PATHS:
+            self.assertEqual(get(handler, path), 200, path)
+        self.assertEqual(get(handler, '/api/recipes/0/'), 404)
+
+    def test_command(self):
+        output = io.StringIO()
+        call_command('warmup', stdout=output)
+        self.assertEqual(
+            [line.split(':')[0] for line in output.getvalue().splitlines()],
+            STEPS + ['prime_caches'],
+        )
+
+
+class GunicornHooksTest(SimpleTestCase):
+    """Хуки gunicorn прогревают процессы только с WARMUP_ON_START."""
+
+    def setUp(self):
+        self.config = load_gunicorn_config()
+        self.server = mock.Mock()
+        self.worker = mock.Mock(pid=1)
+        close_all = mock.patch.object(connections, 'close_all')
+        close_all.start()
+        self.addCleanup(close_all.stop)
+        patcher = mock.patch('api.warmup.warmup', return_value={'step': 0.5})
+        self.warmup = patcher.start()
+        self.addCleanup(patcher.stop)
+
+    def test_warmup_on_start(self):
+        self.config.when_ready(self.server)
+        self.warmup.assert_called_once_with(prime=False)
+        self.warmup.reset_mock()
+        self.config.post_fork(self.server, self.worker)
+        self.warmup.assert_called_once_with(application)
+        self.server.log.info.assert_called_once_with(
+            'Worker %s warmed up in %.0f ms', 1, 500
+        )
+
+    @override_settings(WARMUP_ON_START=False)
+    def test_disabled(self):
+        self.config.when_ready(self.server)
+        self.config.post_fork(self.server, self.worker)
+        self.warmup.assert_not_called()
@@ -0,0 +1,176 @@
+from django.test import TestCase, TransactionTestCase
+from rest_framework.test import APITestCase
+
+from api.tests.utils import create_ingredient, create_recipe, create_user
+from recipes.ingredient_index import IngredientIndex, ingredient_index
+
+
+def create_recipes(author, ingredients, compositions):
+    """Рецепты с составами из номеров ингредиентов."""
+    return [
+        create_recipe(author, f'Рецепт {number}', ingredients=[
+            (ingredients[index], 1) for index in composition
+        ])
+        for number, composition in enumerate(compositions)
+    ]
+
+
+class IngredientIndexTest(TestCase):
+    """Поиск рецептов по имеющимся ингредиентам."""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredients = [
+            create_ingredient(f'Ингредиент {number}') for number in range(6)
+        ]
+        (cls.complete, cls.one_missing, cls.three_missing,
+         cls.unrelated) = create_recipes(
+            create_user('author'), cls.ingredients,
+            ((0, 1), (0, 1, 2), (0, 3, 4, 5), (3,)),
+        )
+
+    def setUp(self):
+        self.index = IngredientIndex()
+        self.index.build()
+
+    def search(self, *numbers, max_missing=None):
+        return self.index.search(
+            [self.ingredients[number].pk for number in numbers], max_missing
+        )[:]
+
+    def test_ranked_by_coverage(self):
+        self.assertEqual(self.search(0, 1), [
+            (self.complete.pk, 1.0, 0),
+            (self.one_missing.pk, 2 / 3, 1),
+            (self.three_missing.pk, 0.25, 3),
+        ])
+
+    def test_equal_coverage_ranked_by_missing(self):
+        # При равном покрытии первым идет рецепт, где не хватает
+        # меньше ингредиентов.
+        self.assertEqual(
+            [row[0] for row in self.search(1, 3, 4)],
+            [self.unrelated.pk, self.complete.pk, self.three_missing.pk,
+             self.one_missing.pk],
+        )
+
+    def test_slices(self):
+        ranked = self.index.search(
+            [ingredient.pk for ingredient in self.ingredients]
+        )
+        self.assertEqual(len(ranked), 4)
+        self.assertEqual(ranked[1:3], ranked[:][1:3])
+        self.assertEqual(ranked[3], ranked[:][3])
+
+    def test_max_missing(self):
+        self.assertEqual(
+            [row[0] for row in self.search(0, 1, max_missing=1)],
+            [self.complete.pk, self.one_missing.pk],
+        )
+        self.assertEqual(
+            [row[0] for row in self.search(0, 1, max_missing=0)],
+            [self.complete.pk],
+        )
+
+    def test_unknown_ingredients(self):
+        self.assertEqual(self.index.search([0, 10 ** 6])[:], [])
+
+    def test_incremental_updates(self):
+        ingredient_ids = [ingredient.pk for ingredient in self.ingredients]
+        self.index.update_recipe(10 ** 6, ingredient_ids[:2])
+        self.index.update_recipe(self.complete.pk, ingredient_ids[2:4])
+        self.assertEqual(self.search(0, 1, max_missing=1), [
+            (10 ** 6, 1.0, 0), (self.one_missing.pk, 2 / 3, 1),
+        ])
+        self.assertIn((self.complete.pk, 1.0, 0), self.search(2, 3))
+        # Повторное изменение рецепта из дельты заменяет его состав.
+        self.index.update_recipe(10 ** 6, ingredient_ids[4:])
+        self.assertNotIn(10 ** 6, [row[0] for row in self.search(0, 1)])
+
+    def test_removed_recipes(self):
+        self.index.update_recipe(10 ** 6, [self.ingredients[0].pk])
+        self.index.remove_recipe(10 ** 6)
+        self.index.remove_recipe(self.one_missing.pk)
+        self.assertEqual(
+            [row[0] for row in self.search(0, 1)],
+            [self.complete.pk, self.three_missing.pk],
+        )
+
+
+class BackgroundRebuildTest(TransactionTestCase):
+    """Устаревший индекс перестраивается в фоне, не задерживая запросы."""
+
+    def test_stale_state_served_until_rebuilt(self):
+        author = create_user('author')
+        ingredient = create_ingredient()
+        first = create_recipe(author, ingredients=[(ingredient, 1)])
+        index = IngredientIndex()
+        index.build()
+        # Рецепт добавлен в обход индекса, как в другом процессе.
+        second = create_recipe(author, 'Салат', ingredients=[(ingredient, 1)])
+        with index._build_lock:
+            with self.settings(INGREDIENT_INDEX_TTL=-1):
+                stale = index.search([ingredient.pk])[:]
+            thread = index._rebuild_thread
+            self.assertTrue(thread.is_alive())
+            self.assertEqual([row[0] for row in stale], [first.pk])
+        thread.join()
+        self.assertIsNone(index._rebuild_thread)
+        self.assertEqual(
+            [row[0] for row in index.search([ingredient.pk])[:]],
+            [second.pk, first.pk],
+        )
+
+
+class WhatToCookTest(APITestCase):
+    """Эндпоинт /api/recipes/what_to_cook/."""
+
+    URL = '/api/recipes/what_to_cook/'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.ingredients = [
+            create_ingredient(f'Ингредиент {number}') for number in range(3)
+        ]
+        cls.complete, cls.partial = create_recipes(
+            create_user('author'), cls.ingredients, ((0,), (0, 1, 2))
+        )
+
+    def setUp(self):
+        ingredient_index.build()
+
+    def test_results(self):
+        response = self.client.get(self.URL, {
+            'ingredients': [self.ingredients[0].pk, self.ingredients[1].pk],
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json()['count'], 2)
+        self.assertEqual(
+            [(recipe['id'], recipe['coverage'], recipe['missing'])
+             for recipe in response.json()['results']],
+            [(self.complete.pk, 1.0, 0), (self.partial.pk, 0.6667, 1)],
+        )
+        response = self.client.get(self.URL, {
+            'ingredients': self.ingredients[0].pk, 'max_missing': 0,
+        })
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [self.complete.pk],
+        )
+
+    def test_deleted_recipe(self):
+        with self.captureOnCommitCallbacks(execute=True):
+            self.complete.delete()
+        response = self.client.get(self.URL, {
+            'ingredients': self.ingredients[0].pk,
+        })
+        self.assertEqual(
+            [recipe['id'] for recipe in response.json()['results']],
+            [self.partial.pk],
+        )
+
+    def test_invalid_params(self):
+        for params in ({}, {'ingredients': 'соль'},
+                       {'ingredients': 1, 'max_missing': 'все'}):
+            self.assertEqual(self.client.get(self.URL, params).status_code,
+                             400)
@@ -0,0 +1,42 @@
+"""Общие данные для тестов API."""
+from django.contrib.auth import get_user_model
+
+from recipes.models import Ingredient, Recipe, RecipeIngredient, RecipeTag, Tag
+
+User = get_user_model()
+
+
+def create_user(username):
+    return User.objects.create_user(
+        username=username, email=f'{username}@example.com', password='pass',
+        first_name='Имя', last_name='Фамилия',
+    )
+
+
+def create_users(*usernames):
+    return [create_user(username) for username in usernames]
+
+
+def create_tag(name='Обед', slug='lunch', color='#49B64E'):
+    return Tag.objects.create(name=name, slug=slug, color=color)
+
+
+def create_ingredient(name='Картофель', measurement_unit='г'):
+    return Ingredient.objects.create(
+        name=name, measurement_unit=measurement_unit
+    )
+
+
+def create_recipe(author, name='Суп', text='Текст', cooking_time=30,
+                  ingredients=(), tags=()):
+    """Рецепт; ingredients — пары (ингредиент, количество)."""
+    recipe = Recipe.objects.create(
+        author=author, name=name, text=text, cooking_time=cooking_time
+    )
+    for ingredient, amount in ingredients:
+        RecipeIngredient.objects.create(
+            recipe=recipe, ingredient=ingredient, amount=amount
+        )
+    for tag in tags:
+        RecipeTag.objects.create(recipe=recipe, tag=tag)
+    return recipe
@@ -1,9 +1,11 @@
 from django.urls import include, path
 from rest_framework.routers import DefaultRouter
 
-from api.views import (APIFavoriteCreateDestroy, APIShoppingCartCreateDestroy,
+from api.views import (APIBatch, APIFavoriteCreateDestroy,
+                       APIShoppingCartCreateDestroy,
                        APISubscriptionCreateDestroy, CustomUserViewSet,
-                       IngredientViewSet, RecipeViewSet, TagViewSet)
+                       IngredientViewSet, JobViewSet, RecipeViewSet,
+                       TagViewSet)
 
 app_name = 'api'
 
@@ -14,6 +16,7 @@ router_api_01.register('tags', TagViewSet, basename='tag')
 router_api_01.register('ingredients', IngredientViewSet,
                        basename='ingredients')
 router_api_01.register('recipes', RecipeViewSet, basename='recipes')
+router_api_01.register('jobs', JobViewSet, basename='jobs')
 
 recipe_favorite_subscribe_urlpatterns = [
     path('recipes/<int:id>/favorite/', APIFavoriteCreateDestroy.as_view(),
@@ -28,5 +31,6 @@ recipe_favorite_subscribe_urlpatterns = [
 urlpatterns = [
     path('', include(router_api_01.urls)),
     path('', include(recipe_favorite_subscribe_urlpatterns)),
+    path('batch/', APIBatch.as_view(), name='batch'),
     path('auth/', include('djoser.urls.authtoken')),
 ]
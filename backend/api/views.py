@@ -1,48 +1,97 @@
+from django.conf import settings
 from django.contrib.auth import get_user_model
-from django.db.models import Sum
+from django.db.models import Exists, OuterRef
 from django.db.models.functions import Lower
-from django.http import FileResponse
 from django.shortcuts import get_object_or_404, render
+from django.urls import reverse
 from djoser.serializers import SetPasswordSerializer
 from rest_framework import status, viewsets
 from rest_framework.decorators import action
 from rest_framework.permissions import (AllowAny, IsAuthenticated,
                                         IsAuthenticatedOrReadOnly)
 from rest_framework.response import Response
+from rest_framework.views import APIView
 
-from api.mixins import CustomCreateDestroyMixin
+from api.batch import run_batch
+from api.exports import (EXPORT_FORMATS, ShoppingCartExport,
+                         shopping_cart_queryset, shopping_cart_rows)
+from api.mixins import CustomCreateDestroyMixin, SparseFieldsetMixin
+from api.models import Job
 from api.pagination import CustomPagination
 from api.permissions import IsAuthorOrReadOnly
-from api.serializers import (CustomUserCreateSerializer, CustomUserSerializer,
-                             FavoriteSerializer, IngredientSerializer,
+from api.serializers import (BatchSerializer, CustomUserCreateSerializer,
+                             CustomUserSerializer, FavoriteSerializer,
+                             IngredientSerializer, JobSerializer,
                              RecipeCreateUpdateSerializer, RecipeSerializer,
                              ShoppingCartSerializer, SubscriptionSerializer,
                              SubscriptionToRepresentationSerializer,
                              TagSerializer)
-from recipes.models import (Favorite, Ingredient, Recipe, RecipeIngredient,
-                            ShoppingCart, Tag)
+from recipes.ingredient_index import ingredient_index
+from recipes.minhash import similar_recipes
+from recipes.models import (RECIPE_RELATIONS, RECIPE_SCORE_ORDERINGS,
+                            USER_ANNOTATIONS, Ingredient, Recipe, Tag)
 from users.models import Subscription
 
 User = get_user_model()
 
+# Колонки пользователя, которые читаются только при наличии в ответе.
+USER_COLUMNS = ('email', 'username', 'first_name', 'last_name')
+
+# Колонки рецепта, которые не читаются, если их нет в ответе.
+RECIPE_DEFERRABLE_COLUMNS = ('name', 'text', 'image', 'cooking_time')
+
 
 def page_not_found(request, exception):
     """Страница не найдена."""
     return render(request, 'static/404.html', status=status.HTTP_404_NOT_FOUND)
 
 
-class CustomUserViewSet(viewsets.ModelViewSet):
+class CustomUserViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     Cоздаем нового пользователя, получаем список всех пользователей,
     получаем страницу пользователя по id,
     получаем страницу текущего пользователя.
     """
 
+    read_from_replica = True
+    profiling_sample = True
     http_method_names = ('get', 'post')
     queryset = User.objects.all()
     permission_classes = [AllowAny]
     pagination_class = CustomPagination
 
+    def get_queryset(self):
+        return self.with_requested_fields(User.objects.all())
+
+    def with_requested_fields(self, queryset):
+        """
+        Только колонки, которые попадут в ответ. Признак подписки
+        вычисляется в запросе, только если наборы id пользователя
+        в кэше выключены.
+        """
+        if (self.is_field_requested('is_subscribed')
+                and self.request.user.is_authenticated
+                and not settings.USER_ID_SETS_ENABLED):
+            queryset = queryset.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user_id=self.request.user.pk, author=OuterRef('pk')
+                )
+            ))
+        if self.fieldset != (None, None):
+            queryset = queryset.only(*(
+                name for name in USER_COLUMNS
+                if self.is_field_requested(name)
+            ))
+        return queryset
+
+    def get_subscriptions_queryset(self):
+        """Авторы, на которых подписан пользователь."""
+        return self.with_requested_fields(User.objects.filter(
+            id__in=Subscription.objects.filter(
+                user=self.request.user
+            ).values('author_id')
+        ))
+
     def get_serializer_class(self):
         if 'me' in self.request.path:
             return CustomUserSerializer
@@ -94,9 +143,7 @@ class CustomUserViewSet(viewsets.ModelViewSet):
         url_path='subscriptions',
     )
     def subscriptions_list(self, request):
-        subscriptions = Subscription.objects.filter(user=self.request.user)
-        author_list = list(subscriptions.values_list('author__id', flat=True))
-        queryset = User.objects.filter(id__in=author_list)
+        queryset = self.get_subscriptions_queryset()
         page = self.paginate_queryset(queryset)
         if page is not None:
             serializer = self.get_serializer(page, many=True)
@@ -110,17 +157,25 @@ class TagViewSet(viewsets.ModelViewSet):
     Получаем список всех тэгов, получаем тэг по id.
     """
 
+    read_from_replica = True
     http_method_names = ('get')
     queryset = Tag.objects.all()
     serializer_class = TagSerializer
     permission_classes = [AllowAny]
 
+    def list(self, request, *args, **kwargs):
+        # Плоские строки без обхода сериализатора на каждом тэге.
+        return Response(list(self.filter_queryset(
+            self.get_queryset()
+        ).values(*TagSerializer.Meta.fields)))
+
 
 class IngredientViewSet(viewsets.ModelViewSet):
     """
     Получаем список всех ингредиентов, получаем ингредиент по id.
     """
 
+    read_from_replica = True
     http_method_names = ('get',)
     queryset = Ingredient.objects.all()
     serializer_class = IngredientSerializer
@@ -136,13 +191,21 @@ class IngredientViewSet(viewsets.ModelViewSet):
             return queryset
         return Ingredient.objects.all()
 
+    def list(self, request, *args, **kwargs):
+        # Плоские строки без обхода сериализатора на каждом ингредиенте.
+        return Response(list(self.filter_queryset(
+            self.get_queryset()
+        ).values(*IngredientSerializer.Meta.fields)))
 
-class RecipeViewSet(viewsets.ModelViewSet):
+
+class RecipeViewSet(SparseFieldsetMixin, viewsets.ModelViewSet):
     """
     Получаем список всех рецептов, создаем рецепт,
     получаем рецепт, изменяем рецепт, удаляем рецепт.
     """
 
+    read_from_replica = True
+    profiling_sample = True
     http_method_names = ('get', 'post', 'patch', 'delete')
     queryset = Recipe.objects.all()
     permission_classes = (IsAuthenticatedOrReadOnly, IsAuthorOrReadOnly)
@@ -156,25 +219,106 @@ class RecipeViewSet(viewsets.ModelViewSet):
         url_path='download_shopping_cart',
     )
     def download_shopping_cart(self, request):
-        recipes = ShoppingCart.objects.all()
-        recipes_list = recipes.values('recipe')
-        queryset = RecipeIngredient.objects.filter(recipe__in=recipes_list)
-        ingredient_amount = list(queryset.values(
-            'ingredient__name',
-            'ingredient__measurement_unit'
-        ).annotate(sum_amount=Sum('amount')))
-        file_name = 'shopping_cart.txt'
-        row = ''
-        for obj in ingredient_amount:
-            for value in obj.values():
-                row += str(value) + ', '
-            row = row[:-2]
-            row += ';\n'
-        response = FileResponse(row, content_type="text/plain,charset=utf8")
-        response['Content-Disposition'] = 'attachment; filename={0}'.format(
-            file_name
+        file_type = request.query_params.get('type', 'txt')
+        if file_type not in EXPORT_FORMATS:
+            return Response(
+                'Неизвестный формат файла!',
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        export = ShoppingCartExport(
+            shopping_cart_rows(self.get_shopping_cart_queryset()), file_type
         )
-        return response
+        if not export.prepare(request.user):
+            return Response(
+                JobSerializer(
+                    export.job, context=self.get_serializer_context()
+                ).data,
+                status=status.HTTP_202_ACCEPTED,
+                headers={
+                    'Retry-After': '1',
+                    'Location': reverse(
+                        'api:jobs-detail', args=(export.job.pk,)
+                    ),
+                }
+            )
+        return export.response()
+
+    @action(
+        methods=['get'],
+        detail=False,
+        url_path='what_to_cook',
+    )
+    def what_to_cook(self, request):
+        """
+        Рецепты, которые можно приготовить из имеющихся ингредиентов,
+        по убыванию доли имеющихся ингредиентов.
+        """
+        try:
+            ingredient_ids = [
+                int(value)
+                for value in request.query_params.getlist('ingredients')
+            ]
+            max_missing = request.query_params.get('max_missing', None)
+            if max_missing is not None:
+                max_missing = int(max_missing)
+        except ValueError:
+            return Response(
+                'Параметры ingredients и max_missing должны быть числами.',
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        if not ingredient_ids:
+            return Response(
+                'Укажите хотя бы один ингредиент.',
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        ranked = ingredient_index.search(ingredient_ids, max_missing)
+        page = self.paginate_queryset(ranked)
+        paginated = page is not None
+        if not paginated:
+            page = ranked[:]
+        recipes = self.get_recipe_queryset().in_bulk(
+            [recipe_id for recipe_id, _, _ in page]
+        )
+        page = [row for row in page if row[0] in recipes]
+        serializer = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _, _ in page], many=True
+        )
+        data = serializer.data
+        for representation, (_, coverage, missing) in zip(data, page):
+            representation['coverage'] = round(coverage, 4)
+            representation['missing'] = missing
+        if paginated:
+            return self.get_paginated_response(data)
+        return Response(data, status=status.HTTP_200_OK)
+
+    @action(
+        methods=['get'],
+        detail=True,
+        url_path='similar',
+    )
+    def similar(self, request, pk=None):
+        """Рецепты с похожим набором ингредиентов."""
+        recipe = get_object_or_404(Recipe, pk=pk)
+        try:
+            limit = int(request.query_params.get(
+                'limit', settings.SIMILAR_RECIPES_LIMIT
+            ))
+        except ValueError:
+            return Response(
+                'Параметр limit должен быть числом.',
+                status=status.HTTP_400_BAD_REQUEST
+            )
+        similar = similar_recipes(recipe.id, max(limit, 0))
+        recipes = self.get_recipe_queryset().in_bulk(
+            [recipe_id for recipe_id, _ in similar]
+        )
+        similar = [row for row in similar if row[0] in recipes]
+        data = self.get_serializer(
+            [recipes[recipe_id] for recipe_id, _ in similar], many=True
+        ).data
+        for representation, (_, similarity) in zip(data, similar):
+            representation['similarity'] = round(similarity, 4)
+        return Response(data, status=status.HTTP_200_OK)
 
     def perform_create(self, serializer):
         serializer.save(author=self.request.user)
@@ -184,14 +328,61 @@ class RecipeViewSet(viewsets.ModelViewSet):
             return RecipeCreateUpdateSerializer
         return RecipeSerializer
 
+    def get_shopping_cart_queryset(self):
+        """Суммы ингредиентов из корзины для списка покупок."""
+        return shopping_cart_queryset(self.request.user)
+
+    def get_recipe_queryset(self):
+        """
+        Рецепты с признаками пользователя и связями, которые попадут
+        в ответ: для полей вне ?fields= или из ?omit= связи не
+        подгружаются, а признаки не вычисляются (для фильтров по ним
+        используется alias). С наборами id пользователя в кэше признаки
+        проверяются сериализатором в памяти, а анонимному пользователю
+        не нужны вовсе.
+        """
+        user_id = self.request.user.pk
+        in_query = (
+            self.request.user.is_authenticated
+            and not settings.USER_ID_SETS_ENABLED
+        )
+        annotations = [
+            name for name in USER_ANNOTATIONS
+            if in_query and self.is_field_requested(name)
+        ]
+        aliases = [
+            name for name in USER_ANNOTATIONS
+            if name not in annotations and name in self.request.query_params
+        ]
+        queryset = Recipe.objects.add_user_annotations(
+            user_id, annotations
+        ).alias_user_annotations(user_id, aliases).with_related(
+            user_id,
+            [relation for relation in RECIPE_RELATIONS
+             if self.is_field_requested(relation)],
+            is_subscribed=(
+                in_query and self.is_field_requested('author.is_subscribed')
+            ),
+            author_columns=None if self.fieldset == (None, None) else [
+                name for name in USER_COLUMNS
+                if self.is_field_requested(f'author.{name}')
+            ],
+        )
+        # search_vector нужен только фильтру ?search= и в ответ не идет.
+        return queryset.defer('search_vector', *(
+            name for name in RECIPE_DEFERRABLE_COLUMNS
+            if not self.is_field_requested(name)
+        ))
+
     def get_queryset(self):
-        queryset = Recipe.objects.add_user_annotations(self.request.user.pk)
+        queryset = self.get_recipe_queryset()
         author = self.request.query_params.get('author', None)
         is_favorited = self.request.query_params.get('is_favorited', None)
         is_in_shopping_cart = self.request.query_params.get(
             'is_in_shopping_cart', None
         )
         tags = self.request.query_params.get('tags', None)
+        search = self.request.query_params.get('search', None)
         if author is not None:
             queryset = queryset.filter(author=author)
         if is_favorited is not None:
@@ -199,23 +390,71 @@ class RecipeViewSet(viewsets.ModelViewSet):
         if is_in_shopping_cart is not None:
             queryset = queryset.filter(is_in_shopping_cart=is_in_shopping_cart)
         if tags is not None:
-            tags_slug = dict(self.request.query_params)['tags']
-            queryset = queryset.filter(tags__slug__in=tags_slug).distinct()
+            queryset = queryset.with_tags(
+                self.request.query_params.getlist('tags'),
+                match_all=self.request.query_params.get('tags_match') == 'all'
+            )
+        if search:
+            queryset = queryset.search(search)
+        ordering = self.request.query_params.get('ordering', None)
+        if ordering in RECIPE_SCORE_ORDERINGS:
+            queryset = queryset.order_by_score(ordering)
         return queryset
 
 
-class APIFavoriteCreateDestroy(CustomCreateDestroyMixin):
+class JobViewSet(viewsets.ReadOnlyModelViewSet):
+    """Статус фоновых задач текущего пользователя."""
+
+    serializer_class = JobSerializer
+    permission_classes = (IsAuthenticated,)
+    pagination_class = CustomPagination
+
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+
+    @action(
+        methods=['get'],
+        detail=True,
+        url_path='download',
+    )
+    def download(self, request, pk=None):
+        """Файл, подготовленный задачей выгрузки списка покупок."""
+        job = self.get_object()
+        export = ShoppingCartExport.from_result(job.result)
+        if job.status != Job.DONE or export is None:
+            return Response(
+                'У задачи нет готового файла.',
+                status=status.HTTP_404_NOT_FOUND
+            )
+        if not export.is_ready():
+            return Response(
+                'Файл уже удален, запросите список покупок заново.',
+                status=status.HTTP_404_NOT_FOUND
+            )
+        return export.response()
+
+
+class APIBatch(APIView):
     """
-    Добавляем рецепт в избранное и удаляем рецепт из избранного.
+    Несколько запросов к API за один: подзапросы выполняются через
+    маршруты api.urls с пользователем исходного запроса.
     """
 
-    def get_queryset(self):
-        get_object_or_404(Recipe, id=self.kwargs['id'])
-        return Favorite.objects.filter(
-            user=self.request.user,
-            recipe=self.kwargs['id']
+    permission_classes = (AllowAny,)
+
+    def post(self, request):
+        serializer = BatchSerializer(data=request.data)
+        serializer.is_valid(raise_exception=True)
+        return Response(
+            run_batch(request, serializer.validated_data['requests'])
         )
 
+
+class APIFavoriteCreateDestroy(CustomCreateDestroyMixin):
+    """
+    Добавляем рецепт в избранное и удаляем рецепт из избранного.
+    """
+
     serializer_class = FavoriteSerializer
 
 
@@ -224,18 +463,16 @@ class APISubscriptionCreateDestroy(CustomCreateDestroyMixin):
     Добавляем автора в подписки и удаляем автора из подписок.
     """
 
-    def get_queryset(self):
-        get_object_or_404(User, id=self.kwargs['id'])
-        return Subscription.objects.filter(
-            user=self.request.user,
-            author__id=self.kwargs['id']
-        )
-
-    def check(self):
-        return get_object_or_404(User, id=self.kwargs['id'])
-
     serializer_class = SubscriptionSerializer
-    lookup_field = 'author__id'
+    target_model = User
+    target_field = 'author'
+    target_fields = ('id', 'email', 'username', 'first_name', 'last_name')
+    already_exists_message = 'Уже подписан(а) на этого автора!'
+
+    def validate_target(self, target_id):
+        if target_id == self.request.user.pk:
+            return 'Подписываться на самого себя нельзя!'
+        return None
 
 
 class APIShoppingCartCreateDestroy(CustomCreateDestroyMixin):
@@ -243,10 +480,4 @@ class APIShoppingCartCreateDestroy(CustomCreateDestroyMixin):
     Добавляем рецепт в список покупок и удаляем рецепт из списка покупок.
     """
 
-    def get_queryset(self):
-        get_object_or_404(Recipe, id=self.kwargs['id'])
-        return ShoppingCart.objects.filter(
-            user=self.request.user,
-            recipe__id=self.kwargs['id']
-        )
     serializer_class = ShoppingCartSerializer
@@ -0,0 +1,120 @@
+import importlib
+import inspect
+import io
+import pkgutil
+import time
+from urllib.parse import urlsplit
+from wsgiref.util import setup_testing_defaults
+
+from django.apps import apps
+from django.conf import settings
+from django.urls import get_resolver, resolve
+from rest_framework.serializers import BaseSerializer
+
+from recipes.ingredient_index import ingredient_index
+from recipes.models import Tag
+
+PROJECT_APPS = ('api', 'recipes', 'users')
+
+# Модули, нужные только командам и бенчмаркам.
+SKIP_MODULES = ('benchmark',)
+
+
+def import_modules():
+    """Импортирует все модули приложений, кроме пакетов (миграций и т.п.)."""
+    for app in PROJECT_APPS:
+        app_config = apps.get_app_config(app)
+        for module in pkgutil.iter_modules([app_config.path]):
+            if not module.ispkg and module.name not in SKIP_MODULES:
+                importlib.import_module(f'{app_config.name}.{module.name}')
+
+
+def build_urls():
+    """Заполняет кэши резолвера и разрешает пути прогрева."""
+    resolver = get_resolver()
+    resolver.reverse_dict
+    for path in settings.WARMUP_PATHS:
+        resolve(urlsplit(path).path)
+
+
+def build_serializers():
+    """
+    Строит поля всех сериализаторов api.serializers: при этом
+    заполняются кэши _meta моделей и импортируются модули DRF, которые
+    иначе загружаются на первом запросе.
+    """
+    module = importlib.import_module('api.serializers')
+    for _, serializer_class in inspect.getmembers(module, inspect.isclass):
+        if (not issubclass(serializer_class, BaseSerializer)
+                or serializer_class.__module__ != module.__name__):
+            continue
+        serializer = serializer_class(context={})
+        serializer.fields
+        if hasattr(serializer, 'compiled_getters'):
+            serializer.compiled_getters
+
+
+def warmup_host():
+    for host in settings.ALLOWED_HOSTS:
+        if host != '*':
+            return host.lstrip('.')
+    return 'localhost'
+
+
+def get(application, path):
+    """GET-запрос к WSGI-приложению в этом процессе; возвращает статус."""
+    parts = urlsplit(path)
+    environ = {
+        'REQUEST_METHOD': 'GET',
+        'PATH_INFO': parts.path,
+        'QUERY_STRING': parts.query,
+        'HTTP_HOST': warmup_host(),
+        'HTTP_ACCEPT_ENCODING': 'br, gzip',
+        'wsgi.input': io.BytesIO(),
+    }
+    setup_testing_defaults(environ)
+    status = []
+    response = application(
+        environ, lambda code, headers, exc_info=None: status.append(code)
+    )
+    try:
+        for _ in response:
+            pass
+    finally:
+        if hasattr(response, 'close'):
+            response.close()
+    return int(status[0].split()[0])
+
+
+def prime_caches(application=None):
+    """
+    Заполняет кэш id тэгов и индекс ингредиентов, а через запросы
+    к WARMUP_PATHS — сжатые справочники, счетчики страниц и первые
+    страницы ленты.
+    """
+    Tag.objects.ids_by_slug()
+    ingredient_index.get_state()
+    if application is not None:
+        for path in settings.WARMUP_PATHS:
+            get(application, path)
+
+
+def warmup(application=None, prime=True):
+    """
+    Прогревает процесс и возвращает длительность шагов в секундах.
+    Без prime выполняются только шаги без обращений к базе: их можно
+    делать в мастере gunicorn до fork.
+    """
+    steps = [
+        ('import_modules', import_modules),
+        ('build_urls', build_urls),
+        ('build_serializers', build_serializers),
+    ]
+    if prime:
+        steps.append(('prime_caches', lambda: prime_caches(application)))
+    timings = {}
+    for name, step in steps:
+        started = time.perf_counter()
+        step()
+        timings[name] = time.perf_counter() - started
+    return timings
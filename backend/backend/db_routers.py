@@ -0,0 +1,72 @@
+import random
+
+from asgiref.local import Local
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+from rest_framework.permissions import SAFE_METHODS
+
+_state = Local()
+
+
+def get_replica():
+    """Реплика, выбранная для текущего запроса, или None."""
+    return getattr(_state, 'replica', None)
+
+
+class ReplicaRouter:
+    """
+    Направляет чтение на реплику, если ее выбрал ReplicaMiddleware.
+    Запись и чтение внутри transaction.atomic идут в основную базу.
+    """
+
+    def db_for_read(self, model, **hints):
+        replica = get_replica()
+        if replica is None or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return None
+        return replica
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        return True
+
+    def allow_migrate(self, db, app_label, **hints):
+        if db in settings.DATABASE_REPLICAS:
+            return False
+        return None
+
+
+class ReplicaMiddleware:
+    """
+    Отправляет безопасные запросы к вьюсетам с read_from_replica на
+    реплики. После успешной записи клиент на REPLICA_STICKY_SECONDS
+    получает cookie, и его чтения идут в основную базу, чтобы он видел
+    свои изменения несмотря на отставание реплик.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        try:
+            response = self.get_response(request)
+        finally:
+            _state.replica = None
+        if (request.method not in SAFE_METHODS
+                and response.status_code < 400
+                and settings.DATABASE_REPLICAS):
+            response.set_cookie(
+                settings.REPLICA_STICKY_COOKIE, '1',
+                max_age=settings.REPLICA_STICKY_SECONDS,
+                httponly=True, samesite='Lax',
+            )
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        view_class = getattr(view_func, 'cls', None)
+        if (settings.DATABASE_REPLICAS
+                and request.method in SAFE_METHODS
+                and getattr(view_class, 'read_from_replica', False)
+                and settings.REPLICA_STICKY_COOKIE not in request.COOKIES):
+            _state.replica = random.choice(settings.DATABASE_REPLICAS)
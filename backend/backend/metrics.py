@@ -0,0 +1,140 @@
+import os
+import time
+from contextlib import ExitStack
+
+from django.db import connections
+from django.http import HttpResponse
+from prometheus_client import (CONTENT_TYPE_LATEST, REGISTRY,
+                               CollectorRegistry, Counter, Histogram,
+                               generate_latest, multiprocess)
+
+LATENCY_BUCKETS = (
+    0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10,
+)
+
+SIZE_BUCKETS = (
+    256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304,
+)
+
+QUERY_COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 89, 144)
+
+# В многопроцессном режиме значения пишутся в файлы каталога; если
+# процесс запущен не через gunicorn.conf.py, каталога может не быть.
+if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+    os.makedirs(os.environ['PROMETHEUS_MULTIPROC_DIR'], exist_ok=True)
+
+REQUESTS = Counter(
+    'foodgram_requests_total', 'Запросы по представлениям.',
+    ('view', 'method', 'status'),
+)
+
+REQUEST_LATENCY = Histogram(
+    'foodgram_request_duration_seconds', 'Время ответа представления.',
+    ('view',), buckets=LATENCY_BUCKETS,
+)
+
+RESPONSE_SIZE = Histogram(
+    'foodgram_response_size_bytes', 'Размер тела ответа.',
+    ('view',), buckets=SIZE_BUCKETS,
+)
+
+DB_QUERIES = Histogram(
+    'foodgram_db_queries', 'Количество SQL-запросов на запрос к API.',
+    ('view',), buckets=QUERY_COUNT_BUCKETS,
+)
+
+DB_QUERY_TIME = Histogram(
+    'foodgram_db_query_duration_seconds',
+    'Суммарное время SQL-запросов на запрос к API.',
+    ('view',), buckets=LATENCY_BUCKETS,
+)
+
+CACHE_REQUESTS = Counter(
+    'foodgram_cache_requests_total', 'Обращения к кэшам приложения.',
+    ('cache', 'result'),
+)
+
+
+def record_cache(name, hit):
+    """Учитывает попадание или промах кэша name."""
+    CACHE_REQUESTS.labels(name, 'hit' if hit else 'miss').inc()
+
+
+def view_name(request):
+    """
+    Метка представления: вьюсет и действие DRF (RecipeViewSet.list),
+    класс APIView или имя URL для остальных представлений.
+    """
+    match = request.resolver_match
+    if match is None:
+        return 'unresolved'
+    view_class = getattr(match.func, 'cls', None)
+    if view_class is None:
+        return match.view_name or 'unknown'
+    actions = getattr(match.func, 'actions', None)
+    if actions:
+        action = actions.get(request.method.lower(), request.method.lower())
+        return f'{view_class.__name__}.{action}'
+    return view_class.__name__
+
+
+class QueryCounter:
+    """execute_wrapper, считающий SQL-запросы и их время."""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.count += 1
+            self.duration += time.perf_counter() - started
+
+
+class MetricsMiddleware:
+    """
+    Счетчики запросов, время ответа, размер ответа и SQL-запросы
+    по представлениям. Стоит первым, чтобы учитывать сжатое тело.
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        queries = QueryCounter()
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                stack.enter_context(connection.execute_wrapper(queries))
+            response = self.get_response(request)
+        duration = time.perf_counter() - started
+        view = view_name(request)
+        REQUESTS.labels(view, request.method, response.status_code).inc()
+        REQUEST_LATENCY.labels(view).observe(duration)
+        DB_QUERIES.labels(view).observe(queries.count)
+        DB_QUERY_TIME.labels(view).observe(queries.duration)
+        if not response.streaming:
+            RESPONSE_SIZE.labels(view).observe(len(response.content))
+        elif response.has_header('Content-Length'):
+            RESPONSE_SIZE.labels(view).observe(
+                int(response['Content-Length'])
+            )
+        return response
+
+
+def metrics_view(request):
+    """
+    Метрики в формате Prometheus. Под gunicorn воркеры пишут значения
+    в PROMETHEUS_MULTIPROC_DIR, и здесь они суммируются по всем
+    процессам.
+    """
+    registry = REGISTRY
+    if os.getenv('PROMETHEUS_MULTIPROC_DIR'):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+    return HttpResponse(
+        generate_latest(registry), content_type=CONTENT_TYPE_LATEST
+    )
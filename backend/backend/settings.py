@@ -29,11 +29,16 @@ INSTALLED_APPS = [
 ]
 
 MIDDLEWARE = [
+    'backend.metrics.MetricsMiddleware',
+    'api.middleware.QueryLogMiddleware',
     'django.middleware.security.SecurityMiddleware',
+    'api.middleware.CompressionMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'backend.db_routers.ReplicaMiddleware',
+    'api.middleware.ProfilingMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -72,6 +77,173 @@ DATABASES = {
     }
 }
 
+# Реплики только для чтения: DB_REPLICA_HOSTS="replica1 replica2".
+# В тестах реплики зеркалят основную базу.
+
+DATABASE_REPLICAS = []
+
+for number, host in enumerate(os.getenv('DB_REPLICA_HOSTS', '').split()):
+    DATABASES[f'replica_{number}'] = {
+        **DATABASES['default'],
+        'HOST': host,
+        'TEST': {'MIRROR': 'default'},
+    }
+    DATABASE_REPLICAS.append(f'replica_{number}')
+
+DATABASE_ROUTERS = ['backend.db_routers.ReplicaRouter']
+
+REPLICA_STICKY_COOKIE = 'read_primary'
+
+REPLICA_STICKY_SECONDS = int(os.getenv('REPLICA_STICKY_SECONDS', 5))
+
+
+# Cache
+# По умолчанию кэш в памяти процесса. В docker-compose кэш общий для
+# всех процессов: memcached (CACHE_BACKEND=django.core.cache.backends.
+# memcached.PyMemcacheCache, CACHE_LOCATION=cache:11211).
+
+CACHES = {
+    'default': {
+        'BACKEND': os.getenv(
+            'CACHE_BACKEND', 'django.core.cache.backends.locmem.LocMemCache'
+        ),
+        'LOCATION': os.getenv('CACHE_LOCATION', ''),
+    }
+}
+
+# Переименованный или удаленный тэг другие процессы с кэшем в памяти
+# увидят не позже, чем через это время.
+TAG_IDS_CACHE_TTL = 60
+
+# Наборы id избранного, корзины и подписок пользователя в кэше
+# (recipes.user_ids). Запись сбрасывает набор только в кэше своего
+# процесса, поэтому с кэшем в памяти процесса наборы по умолчанию
+# выключены: другие процессы видели бы устаревшие признаки.
+USER_ID_SETS_ENABLED = 'true' == os.getenv(
+    'USER_ID_SETS_ENABLED',
+    'false' if CACHES['default']['BACKEND'].endswith('LocMemCache')
+    else 'true'
+).lower()
+
+USER_ID_SETS_TTL = int(os.getenv('USER_ID_SETS_TTL', 600))
+
+
+# Сжатие ответов
+
+COMPRESSION_MIN_SIZE = int(os.getenv('COMPRESSION_MIN_SIZE', 1024))
+
+COMPRESSION_GZIP_LEVEL = int(os.getenv('COMPRESSION_GZIP_LEVEL', 6))
+
+COMPRESSION_BROTLI_QUALITY = int(os.getenv('COMPRESSION_BROTLI_QUALITY', 5))
+
+COMPRESSION_CONTENT_TYPES = (
+    'text/',
+    'application/json',
+    'application/javascript',
+    'application/xml',
+)
+
+# Справочники, сжатое тело которых кэшируется по хэшу содержимого.
+COMPRESSION_CACHED_PATHS = ('/api/tags/', '/api/ingredients/')
+
+COMPRESSION_CACHE_TTL = 60 * 60
+
+
+# Подсчет страниц: кэш точных COUNT и оценка для больших таблиц
+
+PAGINATION_COUNT_CACHE_TTL = 30
+
+PAGINATION_ESTIMATE_THRESHOLD = 100_000
+
+
+# Профилирование запросов по подписанному заголовку X-Profile,
+# параметру ?profile= для staff или выборке трафика
+
+PROFILING_ENABLED = 'true' == os.getenv('PROFILING_ENABLED', 'False').lower()
+
+PROFILING_DIR = os.getenv('PROFILING_DIR', str(BASE_DIR / 'profiles'))
+
+PROFILING_KEEP = int(os.getenv('PROFILING_KEEP', 200))
+
+PROFILING_TOKEN_MAX_AGE = 60 * 60
+
+# Доля запросов к вьюсетам с profiling_sample, которая профилируется.
+PROFILING_SAMPLE_RATE = float(os.getenv('PROFILING_SAMPLE_RATE', 0))
+
+PROFILING_TREE_DEPTH = 6
+
+PROFILING_TREE_THRESHOLD = 0.02
+
+
+# Журнал медленных и повторяющихся (N+1) SQL-запросов
+
+SLOW_QUERY_LOG_ENABLED = 'true' == os.getenv(
+    'SLOW_QUERY_LOG_ENABLED', 'False'
+).lower()
+
+SLOW_QUERY_THRESHOLD_MS = float(os.getenv('SLOW_QUERY_THRESHOLD_MS', 100))
+
+SLOW_QUERY_REPEAT_THRESHOLD = int(os.getenv('SLOW_QUERY_REPEAT_THRESHOLD', 10))
+
+# Приложения, в коде которых ищется место выполнения запроса.
+SLOW_QUERY_APPS = ('api', 'recipes', 'users')
+
+# Как часто процесс отправляет накопленную статистику в QueryStat.
+SLOW_QUERY_FLUSH_INTERVAL = int(os.getenv('SLOW_QUERY_FLUSH_INTERVAL', 60))
+
+
+# Прогрев воркеров gunicorn после запуска (команда warmup)
+
+WARMUP_ON_START = 'true' == os.getenv('WARMUP_ON_START', 'True').lower()
+
+WARMUP_PATHS = (
+    '/api/tags/',
+    '/api/ingredients/',
+    '/api/recipes/',
+    '/api/recipes/?ordering=popular',
+    '/api/users/',
+)
+
+
+# Очередь фоновых задач (команда run_workers)
+
+JOB_WORKERS = int(os.getenv('JOB_WORKERS', 2))
+
+JOB_POLL_INTERVAL = 1
+
+JOB_MAX_ATTEMPTS = 5
+
+# Задержка перед повтором: JOB_RETRY_BACKOFF * 2 ** (попытка - 1) секунд.
+JOB_RETRY_BACKOFF = 10
+
+JOB_RETRY_BACKOFF_MAX = 60 * 60
+
+# Задача, которая выполняется дольше, считается брошенной воркером.
+JOB_TIMEOUT = 15 * 60
+
+JOB_RETENTION_HOURS = 24
+
+JOB_MAINTENANCE_INTERVAL = 60
+
+
+# Пакетные запросы /api/batch/
+
+BATCH_MAX_SIZE = 20
+
+# Потоки для параллельного выполнения пакетов из одних GET-запросов.
+BATCH_WORKERS = int(os.getenv('BATCH_WORKERS', 4))
+
+
+# Эталонные планы запросов для команды audit_indexes
+
+EXPLAIN_BASELINE_PATH = BASE_DIR / 'data' / 'explain_baseline.json'
+
+# Эталонные результаты и допуски для команды bench_serializers
+
+SERIALIZER_BENCH_BASELINE_PATH = (
+    BASE_DIR / 'data' / 'serializer_bench_baseline.json'
+)
+
 
 # Password validation
 
@@ -108,6 +280,32 @@ STATIC_ROOT = BASE_DIR / 'collected_static'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = '/media/recipes/images/'
 
+# Картинки хранятся по sha256 содержимого, одинаковые — один раз.
+DEFAULT_FILE_STORAGE = 'recipes.storage.ContentAddressedStorage'
+
+# Картинка без ссылок удаляется не раньше, чем через столько секунд
+# после освобождения и после последней повторной загрузки.
+IMAGE_RELEASE_DELAY = 60 * 60
+
+
+# Выгрузка списка покупок
+
+SHOPPING_CART_EXPORT_ROOT = os.getenv(
+    'SHOPPING_CART_EXPORT_ROOT', str(BASE_DIR / 'exports')
+)
+
+SHOPPING_CART_X_ACCEL_PREFIX = os.getenv('SHOPPING_CART_X_ACCEL_PREFIX', '')
+
+SHOPPING_CART_SYNC_ROWS = 200
+
+# Файлы, которые не запрашивали дольше, удаляет команда run_workers.
+SHOPPING_CART_EXPORT_RETENTION_HOURS = 24
+
+SHOPPING_CART_PDF_FONT = os.getenv(
+    'SHOPPING_CART_PDF_FONT',
+    '/usr/share/fonts/truetype/dejavu/DejaVuSans.ttf'
+)
+
 
 # User model
 
@@ -122,7 +320,12 @@ REST_FRAMEWORK = {
 
     'DEFAULT_AUTHENTICATION_CLASSES': [
         'rest_framework.authentication.TokenAuthentication',
-    ]
+    ],
+
+    'DEFAULT_RENDERER_CLASSES': [
+        'api.renderers.FastJSONRenderer',
+        'rest_framework.renderers.BrowsableAPIRenderer',
+    ],
 }
 
 # Настройки Djoser
@@ -156,3 +359,33 @@ MAX_LEN_NAME = 200
 MAX_LEN_COLOR = 7
 
 MAX_LEN_SLUG = 200
+
+MAX_LEN_QUERY_LOCATION = 255
+
+MAX_LEN_JOB_NAME = 255
+
+# Инвертированный индекс ингредиентов для поиска «что приготовить»
+
+INGREDIENT_INDEX_TTL = int(os.getenv('INGREDIENT_INDEX_TTL', 300))
+
+INGREDIENT_INDEX_MAX_DELTA = 10000
+
+INGREDIENT_INDEX_CHUNK = 20000
+
+# Оценки рецептов для сортировок popular и trending
+
+FAVORITE_SCORE_WEIGHT = 2
+
+SHOPPING_CART_SCORE_WEIGHT = 1
+
+TRENDING_HALF_LIFE_HOURS = int(os.getenv('TRENDING_HALF_LIFE_HOURS', 72))
+
+# Насколько раньше прошлого запуска update_recipe_scores искать новые
+# записи: транзакции, начатые до запуска, могут зафиксироваться после.
+RECIPE_SCORE_OVERLAP_SECONDS = 10 * 60
+
+# Похожие рецепты (MinHash + LSH по наборам ингредиентов)
+
+SIMILAR_RECIPES_LIMIT = 6
+
+SIMILAR_RECIPES_MAX_CANDIDATES = 200
@@ -0,0 +1,53 @@
+import os
+import shutil
+
+# Метрики процессов gunicorn собираются через файлы в этом каталоге.
+# Переменная задается только для gunicorn: воркерам очереди и командам
+# manage.py многопроцессный режим не нужен. Задается до импорта
+# prometheus_client, который читает ее при импорте.
+os.environ.setdefault('PROMETHEUS_MULTIPROC_DIR', '/tmp/prometheus')
+
+from prometheus_client import multiprocess  # noqa: E402
+
+bind = '0.0.0.0:7000'
+
+# Приложение загружается в мастере до fork: воркеры получают
+# импортированные модули, резолвер и поля сериализаторов готовыми.
+preload_app = True
+
+
+def on_starting(server):
+    """Очищает метрики прошлого запуска до старта воркеров."""
+    directory = os.environ.get('PROMETHEUS_MULTIPROC_DIR')
+    if directory:
+        shutil.rmtree(directory, ignore_errors=True)
+        os.makedirs(directory)
+
+
+def when_ready(server):
+    """Прогрев без обращений к базе в мастере, до запуска воркеров."""
+    from django.conf import settings
+    from django.db import connections
+
+    if settings.WARMUP_ON_START:
+        from api.warmup import warmup
+        warmup(prime=False)
+    connections.close_all()
+
+
+def post_fork(server, worker):
+    """Каждый воркер заполняет свои кэши до первого запроса."""
+    from django.conf import settings
+
+    if settings.WARMUP_ON_START:
+        from api.warmup import warmup
+        from backend.wsgi import application
+        timings = warmup(application)
+        server.log.info('Worker %s warmed up in %.0f ms', worker.pid,
+                        sum(timings.values()) * 1000)
+
+
+def child_exit(server, worker):
+    """Убирает значения gauge завершившегося воркера."""
+    if os.environ.get('PROMETHEUS_MULTIPROC_DIR'):
+        multiprocess.mark_process_dead(worker.pid)
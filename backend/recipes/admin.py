@@ -1,6 +1,7 @@
 from django.contrib import admin
 
 from recipes.models import Favorite, Ingredient, Recipe, ShoppingCart, Tag
+from recipes.signals import schedule_image_release
 
 
 @admin.register(Recipe)
@@ -18,6 +19,12 @@ class RecipeAdmin(admin.ModelAdmin):
     def quantity_in_favorites(self, obj):
         return Favorite.objects.filter(recipe=obj).count()
 
+    def save_model(self, request, obj, form, change):
+        super().save_model(request, obj, form, change)
+        old_image = form.initial.get('image')
+        if change and 'image' in form.changed_data and old_image:
+            schedule_image_release(old_image.name)
+
 
 @admin.register(Tag)
 class TagAdmin(admin.ModelAdmin):
@@ -0,0 +1,248 @@
+import itertools
+import logging
+import threading
+import time
+
+import numpy as np
+from django.conf import settings
+from django.db import connections
+
+from backend.metrics import record_cache
+from recipes.models import RecipeIngredient
+
+# Раскладка ключа сортировки: покрытие (20 бит), число недостающих
+# ингредиентов (10 бит), id рецепта (31 бит).
+COVERAGE_SCALE = 1_000_000
+MISSING_BITS = 10
+ID_BITS = 31
+MAX_MISSING = (1 << MISSING_BITS) - 1
+MAX_ID = (1 << ID_BITS) - 1
+
+logger = logging.getLogger(__name__)
+
+
+class RankedRecipes:
+    """
+    Результат поиска по ингредиентам, упорядоченный по покрытию.
+
+    Поддерживает len() и срезы, поэтому его можно отдавать пагинатору.
+    Полная сортировка не выполняется: для страницы отбираются
+    top-N ключей через argpartition.
+    """
+
+    def __init__(self, recipe_ids, matched, sizes):
+        self.recipe_ids = recipe_ids
+        self.coverage = matched / sizes
+        self.missing = sizes - matched
+        self.keys = (
+            (np.round(self.coverage * COVERAGE_SCALE).astype(np.int64)
+             << (MISSING_BITS + ID_BITS))
+            | ((MAX_MISSING - np.minimum(self.missing, MAX_MISSING))
+               .astype(np.int64) << ID_BITS)
+            | np.minimum(recipe_ids, MAX_ID).astype(np.int64)
+        )
+        self._order = np.empty(0, dtype=np.int64)
+
+    def __len__(self):
+        return len(self.recipe_ids)
+
+    def _top(self, count):
+        if count > len(self._order):
+            count = min(len(self.keys), max(count, 2 * len(self._order)))
+            if count < len(self.keys):
+                top = np.argpartition(-self.keys, count - 1)[:count]
+            else:
+                top = np.arange(len(self.keys))
+            self._order = top[np.argsort(-self.keys[top])]
+        return self._order
+
+    def __getitem__(self, item):
+        if not isinstance(item, slice):
+            return self[item:item + 1][0]
+        start, stop, step = item.indices(len(self))
+        positions = self._top(stop)[start:stop:step]
+        return [
+            (int(self.recipe_ids[position]),
+             float(self.coverage[position]),
+             int(self.missing[position]))
+            for position in positions
+        ]
+
+
+class IngredientIndex:
+    """
+    Инвертированный индекс «ингредиент -> рецепты» в памяти процесса.
+
+    Постинги хранятся в CSR-раскладке: отсортированные id ингредиентов,
+    смещения и общий массив позиций рецептов (int32). Для каждого
+    рецепта хранится число его ингредиентов. Изменения после построения
+    копятся в дельта-слое; индекс перестраивается из базы, когда дельта
+    разрастается или истекает INGREDIENT_INDEX_TTL (так подхватываются
+    изменения, сделанные другими процессами). Перестройка идет
+    в фоновом потоке, запросы тем временем читают прежнее состояние.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._build_lock = threading.Lock()
+        self._state = None
+        self._built_at = None
+        self._log = None
+        self._rebuild_thread = None
+
+    def build(self):
+        """Строит индекс по таблице RecipeIngredient одним проходом."""
+        with self._build_lock:
+            return self._build()
+
+    def _build(self):
+        with self._lock:
+            self._log = []
+        rows = RecipeIngredient.objects.order_by(
+            'ingredient_id', 'recipe_id'
+        ).values_list('ingredient_id', 'recipe_id')
+        pairs = np.fromiter(
+            itertools.chain.from_iterable(
+                rows.iterator(chunk_size=settings.INGREDIENT_INDEX_CHUNK)
+            ),
+            dtype=np.int64,
+        ).reshape(-1, 2)
+        recipe_ids, postings = np.unique(pairs[:, 1], return_inverse=True)
+        ingredient_ids, starts = np.unique(pairs[:, 0], return_index=True)
+        state = {
+            'recipe_ids': recipe_ids,
+            'sizes': np.bincount(
+                postings, minlength=len(recipe_ids)
+            ).astype(np.int32),
+            'alive': np.ones(len(recipe_ids), dtype=bool),
+            'ingredient_ids': ingredient_ids,
+            'offsets': np.append(starts, len(postings)),
+            'postings': postings.astype(np.int32),
+            'delta': {},
+        }
+        with self._lock:
+            for recipe_id, ingredients in self._log:
+                self._apply(state, recipe_id, ingredients)
+            self._log = None
+            self._state = state
+            self._built_at = time.monotonic()
+        return state
+
+    def _apply(self, state, recipe_id, ingredients):
+        position = np.searchsorted(state['recipe_ids'], recipe_id)
+        if (position < len(state['recipe_ids'])
+                and state['recipe_ids'][position] == recipe_id):
+            state['alive'][position] = False
+        if ingredients is None:
+            state['delta'].pop(recipe_id, None)
+        else:
+            state['delta'][recipe_id] = frozenset(ingredients)
+
+    def _change(self, recipe_id, ingredients):
+        with self._lock:
+            if self._log is not None:
+                self._log.append((recipe_id, ingredients))
+            if self._state is None:
+                return
+            self._apply(self._state, recipe_id, ingredients)
+            delta_size = len(self._state['delta'])
+            if delta_size > settings.INGREDIENT_INDEX_MAX_DELTA:
+                self._built_at = None
+
+    def update_recipe(self, recipe_id, ingredient_ids):
+        """Учитывает новый или измененный состав рецепта."""
+        self._change(recipe_id, list(ingredient_ids))
+
+    def remove_recipe(self, recipe_id):
+        """Убирает удаленный рецепт из индекса."""
+        self._change(recipe_id, None)
+
+    def schedule_rebuild(self):
+        """Запускает перестройку в фоне, если она еще не идет."""
+        with self._lock:
+            if self._rebuild_thread is not None:
+                return
+            self._rebuild_thread = threading.Thread(
+                target=self._rebuild, name='ingredient-index', daemon=True
+            )
+        self._rebuild_thread.start()
+
+    def _rebuild(self):
+        try:
+            self.build()
+        except Exception:
+            logger.exception('Не удалось перестроить индекс ингредиентов')
+        finally:
+            connections.close_all()
+            with self._lock:
+                self._rebuild_thread = None
+
+    def get_state(self):
+        """
+        Состояние индекса. Первый раз индекс строится сразу, устаревший
+        отдается как есть до окончания фоновой перестройки.
+        """
+        with self._lock:
+            state, built_at = self._state, self._built_at
+        fresh = built_at is not None and (
+            time.monotonic() - built_at <= settings.INGREDIENT_INDEX_TTL
+        )
+        record_cache('ingredient_index', fresh)
+        if state is None:
+            with self._build_lock:
+                with self._lock:
+                    state = self._state
+                return state or self._build()
+        if not fresh:
+            self.schedule_rebuild()
+        return state
+
+    def search(self, ingredient_ids, max_missing=None):
+        """
+        Рецепты, в которых есть хотя бы один из ингредиентов,
+        с покрытием и числом недостающих ингредиентов.
+        """
+        state = self.get_state()
+        recipe_ids = state['recipe_ids']
+        have = np.unique(np.asarray(list(ingredient_ids), dtype=np.int64))
+        known = state['ingredient_ids']
+        found = np.empty(0, dtype=np.int64)
+        if len(known):
+            found = np.minimum(np.searchsorted(known, have), len(known) - 1)
+            found = found[known[found] == have]
+        offsets, postings = state['offsets'], state['postings']
+        positions = np.concatenate(
+            [postings[offsets[index]:offsets[index + 1]] for index in found]
+            or [np.empty(0, dtype=np.int32)]
+        )
+        matched = np.bincount(positions, minlength=len(recipe_ids))
+        mask = (matched > 0) & state['alive']
+        if max_missing is not None:
+            mask &= state['sizes'] - matched <= max_missing
+        candidates = np.flatnonzero(mask)
+        result_ids = [recipe_ids[candidates]]
+        result_matched = [matched[candidates]]
+        result_sizes = [state['sizes'][candidates]]
+        have_set = set(have.tolist())
+        delta = [
+            (recipe_id, len(ingredients & have_set), len(ingredients))
+            for recipe_id, ingredients in list(state['delta'].items())
+        ]
+        delta = [
+            row for row in delta
+            if row[1] and (max_missing is None
+                           or row[2] - row[1] <= max_missing)
+        ]
+        if delta:
+            delta_ids, delta_matched, delta_sizes = zip(*delta)
+            result_ids.append(np.array(delta_ids, dtype=np.int64))
+            result_matched.append(np.array(delta_matched, dtype=np.int64))
+            result_sizes.append(np.array(delta_sizes, dtype=np.int64))
+        return RankedRecipes(
+            np.concatenate(result_ids),
+            np.concatenate(result_matched).astype(np.int64),
+            np.concatenate(result_sizes).astype(np.int64),
+        )
+
+
+ingredient_index = IngredientIndex()
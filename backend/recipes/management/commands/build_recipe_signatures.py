@@ -0,0 +1,26 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from recipes.minhash import update_signatures
+from recipes.models import Recipe
+
+
+class Command(BaseCommand):
+    help = ('Строит MinHash-подписи и корзины LSH всех рецептов '
+            'для поиска похожих рецептов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--batch-size', type=int, default=2000,
+                            help='Количество рецептов в пачке.')
+
+    def handle(self, *args, **options):
+        recipe_ids = list(
+            Recipe.objects.order_by('id').values_list('id', flat=True)
+        )
+        built = 0
+        for start in range(0, len(recipe_ids), options['batch_size']):
+            with transaction.atomic():
+                built += update_signatures(
+                    recipe_ids[start:start + options['batch_size']]
+                )
+        self.stdout.write(f'Построено подписей: {built}.')
@@ -0,0 +1,101 @@
+import base64
+import itertools
+import json
+import sys
+from collections import defaultdict
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from recipes.models import Recipe, RecipeIngredient, RecipeTag
+
+
+def recipe_chunks(chunk_size):
+    """Рецепты пачками по серверному курсору, без загрузки всей таблицы."""
+    recipes = Recipe.objects.select_related('author').order_by('id').iterator(
+        chunk_size=chunk_size
+    )
+    while True:
+        chunk = list(itertools.islice(recipes, chunk_size))
+        if not chunk:
+            return
+        yield chunk
+
+
+def related_by_recipe(model, relation, recipe_ids):
+    rows = defaultdict(list)
+    for row in model.objects.filter(
+        recipe_id__in=recipe_ids
+    ).select_related(relation).order_by('id'):
+        rows[row.recipe_id].append(row)
+    return rows
+
+
+def read_image(name):
+    if not name or not default_storage.exists(name):
+        return None
+    with default_storage.open(name, 'rb') as file:
+        content = file.read()
+    return {'name': name, 'content': base64.b64encode(content).decode()}
+
+
+def recipe_record(recipe, ingredients, tags):
+    """Самодостаточная запись рецепта для одной строки JSON Lines."""
+    return {
+        'name': recipe.name,
+        'text': recipe.text,
+        'cooking_time': recipe.cooking_time,
+        'pub_date': recipe.pub_date.isoformat(),
+        'author': {
+            'email': recipe.author.email,
+            'username': recipe.author.username,
+            'first_name': recipe.author.first_name,
+            'last_name': recipe.author.last_name,
+        },
+        'tags': [
+            {'name': row.tag.name, 'color': row.tag.color,
+             'slug': row.tag.slug}
+            for row in tags
+        ],
+        'ingredients': [
+            {'name': row.ingredient.name,
+             'measurement_unit': row.ingredient.measurement_unit,
+             'amount': row.amount}
+            for row in ingredients
+        ],
+        'image': read_image(recipe.image.name),
+    }
+
+
+class Command(BaseCommand):
+    help = ('Выгружает рецепты с ингредиентами, тэгами и картинками '
+            'в JSON Lines: один рецепт на строку.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('output', nargs='?', default='-',
+                            help='Файл для выгрузки, по умолчанию stdout.')
+        parser.add_argument('--chunk-size', type=int, default=500,
+                            help='Количество рецептов в пачке.')
+
+    def handle(self, *args, **options):
+        if options['output'] == '-':
+            self.export(sys.stdout, options['chunk_size'])
+            return
+        with open(options['output'], 'w', encoding='utf8') as output:
+            exported = self.export(output, options['chunk_size'])
+        self.stderr.write(f'Выгружено рецептов: {exported}.')
+
+    def export(self, output, chunk_size):
+        exported = 0
+        for chunk in recipe_chunks(chunk_size):
+            recipe_ids = [recipe.id for recipe in chunk]
+            ingredients = related_by_recipe(
+                RecipeIngredient, 'ingredient', recipe_ids
+            )
+            tags = related_by_recipe(RecipeTag, 'tag', recipe_ids)
+            for recipe in chunk:
+                output.write(json.dumps(recipe_record(
+                    recipe, ingredients[recipe.id], tags[recipe.id]
+                ), ensure_ascii=False) + '\n')
+            exported += len(chunk)
+        return exported
@@ -0,0 +1,294 @@
+import base64
+import json
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime
+
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import make_password
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, connections, transaction
+from django.db.models import Q
+
+from recipes.minhash import update_signatures
+from recipes.models import (Ingredient, Recipe, RecipeIngredient, RecipeScore,
+                            RecipeTag, Tag)
+
+User = get_user_model()
+
+# Общая блокировка воркеров на создание справочных строк: у
+# ингредиентов нет уникального ключа, и без нее параллельные воркеры
+# создали бы дубли.
+_reference_lock = None
+
+
+def init_worker(lock):
+    global _reference_lock
+    _reference_lock = lock
+
+
+def shard_ranges(path, shards):
+    """Делит файл на диапазоны байт примерно одинакового размера."""
+    size = os.path.getsize(path)
+    step = max(size // shards, 1)
+    starts = list(range(0, size, step))[:shards] or [0]
+    return [
+        (path, start, starts[number + 1] if number + 1 < len(starts)
+         else size)
+        for number, start in enumerate(starts)
+    ]
+
+
+def read_shard(path, start, end):
+    """
+    Строки, которые начинаются в диапазоне [start, end). Строку,
+    начатую в предыдущем диапазоне, дочитывает его воркер.
+    """
+    with open(path, 'rb') as file:
+        if start:
+            file.seek(start - 1)
+            file.readline()
+        while file.tell() < end:
+            line = file.readline()
+            if not line:
+                return
+            if line.strip():
+                yield json.loads(line)
+
+
+def batches(records, batch_size):
+    batch = []
+    for record in records:
+        batch.append(record)
+        if len(batch) == batch_size:
+            yield batch
+            batch = []
+    if batch:
+        yield batch
+
+
+def tag_key(tag):
+    return tag['slug'], tag['name']
+
+
+def reference_ids(records):
+    """
+    id авторов, тэгов и ингредиентов пачки в этой базе; недостающие
+    строки создаются bulk_create. Тэг ищется по slug, затем по
+    названию. Автор, чей username занят пользователем с другим email,
+    не создается, и его нет в результате.
+    """
+    emails = {record['author']['email']: record['author']
+              for record in records}
+    tags = {tag_key(tag): tag for record in records for tag in record['tags']}
+    ingredients = {
+        (ingredient['name'], ingredient['measurement_unit']): ingredient
+        for record in records for ingredient in record['ingredients']
+    }
+
+    def existing_tags():
+        by_slug, by_name = {}, {}
+        for pk, slug, name in Tag.objects.filter(
+            Q(slug__in={slug for slug, _ in tags if slug})
+            | Q(name__in={name for _, name in tags})
+        ).order_by('id').values_list('id', 'slug', 'name'):
+            if slug:
+                by_slug.setdefault(slug, pk)
+            by_name[name] = pk
+        tag_ids = {}
+        for slug, name in tags:
+            pk = by_slug.get(slug) or by_name.get(name)
+            if pk is not None:
+                tag_ids[slug, name] = pk
+        return tag_ids
+
+    def existing():
+        return (
+            dict(User.objects.filter(
+                email__in=emails
+            ).values_list('email', 'id')),
+            existing_tags(),
+            {(name, unit): pk for name, unit, pk in Ingredient.objects.filter(
+                name__in={name for name, _ in ingredients}
+            ).values_list('name', 'measurement_unit', 'id')},
+        )
+
+    user_ids, tag_ids, ingredient_ids = existing()
+    if (len(user_ids) == len(emails) and len(tag_ids) == len(tags)
+            and len(ingredient_ids) == len(ingredients)):
+        return user_ids, tag_ids, ingredient_ids
+    with _reference_lock, transaction.atomic():
+        user_ids, tag_ids, ingredient_ids = existing()
+        taken = set(User.objects.filter(username__in=[
+            author['username'] for author in emails.values()
+        ]).values_list('username', flat=True))
+        new_users = {}
+        for email, author in emails.items():
+            if email not in user_ids and author['username'] not in taken:
+                taken.add(author['username'])
+                new_users[email] = User(
+                    email=email, username=author['username'],
+                    first_name=author['first_name'],
+                    last_name=author['last_name'],
+                    password=make_password(None),
+                )
+        User.objects.bulk_create(new_users.values())
+        new_tags, new_slugs = {}, set()
+        for key, tag in tags.items():
+            if (key not in tag_ids and tag['name'] not in new_tags
+                    and tag['slug'] not in new_slugs):
+                new_tags[tag['name']] = Tag(**tag)
+                if tag['slug']:
+                    new_slugs.add(tag['slug'])
+        Tag.objects.bulk_create(new_tags.values())
+        Ingredient.objects.bulk_create(
+            Ingredient(name=name, measurement_unit=unit)
+            for (name, unit) in ingredients
+            if (name, unit) not in ingredient_ids
+        )
+        return existing()
+
+
+def save_image(image):
+    if image is None:
+        return None
+    return default_storage.save(
+        image['name'], ContentFile(base64.b64decode(image['content']))
+    )
+
+
+def create_recipes(recipes):
+    if connection.features.can_return_rows_from_bulk_insert:
+        return Recipe.objects.bulk_create(recipes)
+    # bulk_create этой базы не возвращает id новых строк.
+    for recipe in recipes:
+        recipe.save()
+    return recipes
+
+
+def import_batch(records):
+    """
+    Загружает пачку; возвращает число рецептов и пропущенных авторов:
+    email -> (username, число рецептов).
+    """
+    user_ids, tag_ids, ingredient_ids = reference_ids(records)
+    skipped = {}
+    for record in records:
+        author = record['author']
+        if author['email'] not in user_ids:
+            _, count = skipped.get(author['email'], (None, 0))
+            skipped[author['email']] = (author['username'], count + 1)
+    records = [
+        record for record in records
+        if record['author']['email'] in user_ids
+    ]
+    with transaction.atomic():
+        recipes = create_recipes([
+            Recipe(
+                author_id=user_ids[record['author']['email']],
+                name=record['name'],
+                text=record['text'],
+                cooking_time=record['cooking_time'],
+                image=save_image(record['image']),
+            )
+            for record in records
+        ])
+        # auto_now_add перезаписывает дату при вставке.
+        for recipe, record in zip(recipes, records):
+            recipe.pub_date = datetime.fromisoformat(record['pub_date'])
+        Recipe.objects.bulk_update(recipes, ['pub_date'])
+        RecipeIngredient.objects.bulk_create(
+            RecipeIngredient(
+                recipe=recipe,
+                ingredient_id=ingredient_ids[
+                    (ingredient['name'], ingredient['measurement_unit'])
+                ],
+                amount=ingredient['amount'],
+            )
+            for recipe, record in zip(recipes, records)
+            for ingredient in record['ingredients']
+        )
+        # Тэги записи с одним slug сводятся к одной строке Tag.
+        RecipeTag.objects.bulk_create(
+            RecipeTag(recipe=recipe, tag_id=tag_id)
+            for recipe, record in zip(recipes, records)
+            for tag_id in dict.fromkeys(
+                tag_ids[tag_key(tag)] for tag in record['tags']
+            )
+        )
+        RecipeScore.objects.bulk_create(
+            (RecipeScore(recipe=recipe) for recipe in recipes),
+            ignore_conflicts=True,
+        )
+        update_signatures(recipe.id for recipe in recipes)
+    return len(recipes), skipped
+
+
+def merge_skipped(total, skipped):
+    for email, (username, count) in skipped.items():
+        _, total_count = total.get(email, (None, 0))
+        total[email] = (username, total_count + count)
+    return total
+
+
+def import_shard(path, start, end, batch_size):
+    imported, skipped = 0, {}
+    for batch in batches(read_shard(path, start, end), batch_size):
+        batch_imported, batch_skipped = import_batch(batch)
+        imported += batch_imported
+        merge_skipped(skipped, batch_skipped)
+    connections.close_all()
+    return imported, skipped
+
+
+class Command(BaseCommand):
+    help = ('Загружает рецепты из JSON Lines, выгруженных export_recipes, '
+            'параллельно по частям файлов.')
+
+    def add_arguments(self, parser):
+        parser.add_argument('files', nargs='+',
+                            help='Файлы JSON Lines.')
+        parser.add_argument('--workers', type=int,
+                            default=os.cpu_count() or 1,
+                            help='Количество процессов.')
+        parser.add_argument('--batch-size', type=int, default=500,
+                            help='Количество рецептов в пачке.')
+
+    def handle(self, *args, **options):
+        for path in options['files']:
+            if not os.path.exists(path):
+                raise CommandError(f'Нет файла: {path}')
+        shards = [
+            shard
+            for path in options['files']
+            for shard in shard_ranges(path, options['workers'])
+        ]
+        # Дочерние процессы открывают свои соединения с базой.
+        connections.close_all()
+        context = multiprocessing.get_context('fork')
+        with ProcessPoolExecutor(
+            max_workers=options['workers'], mp_context=context,
+            initializer=init_worker, initargs=(context.Lock(),),
+        ) as executor:
+            results = list(executor.map(
+                import_shard, *zip(*shards),
+                [options['batch_size']] * len(shards),
+            ))
+        imported, skipped = 0, {}
+        for shard_imported, shard_skipped in results:
+            imported += shard_imported
+            merge_skipped(skipped, shard_skipped)
+        for email, (username, count) in sorted(skipped.items()):
+            self.stderr.write(
+                f'Пропущен автор {email}: username {username} занят '
+                f'другим пользователем, рецептов: {count}.'
+            )
+        self.stdout.write(f'Загружено рецептов: {imported}.')
+        if skipped:
+            self.stdout.write(
+                f'Пропущено авторов: {len(skipped)}, рецептов: '
+                f'{sum(count for _, count in skipped.values())}.'
+            )
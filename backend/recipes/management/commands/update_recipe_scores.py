@@ -0,0 +1,192 @@
+import math
+from collections import Counter, defaultdict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count, F, IntegerField, OuterRef, Q, Subquery
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from recipes.models import (Favorite, Recipe, RecipeScore,
+                            RecipeScoreCheckpoint, ShoppingCart)
+
+BATCH_SIZE = 1000
+
+# Точка отсчета затухания сдвигается, когда вес новых событий
+# вырастает в 2 ** REBASE_HALF_LIVES раз, чтобы не переполнить float.
+REBASE_HALF_LIVES = 32
+
+
+def activity_weights():
+    """Модели активности, их имена в отметке и веса в оценках."""
+    return (
+        ('favorite', Favorite, settings.FAVORITE_SCORE_WEIGHT),
+        ('shopping_cart', ShoppingCart, settings.SHOPPING_CART_SCORE_WEIGHT),
+    )
+
+
+def new_activity(model, checkpoint, name, window_start):
+    """
+    Записи модели, которых не было при прошлом запуске, по рецептам
+    и id записей, добавленных после window_start, — для следующего.
+    Окно перекрывает прошлый запуск, поэтому учитываются записи,
+    зафиксированные позже времени добавления, а учтенные в прошлый
+    раз (checkpoint.seen) повторно не считаются.
+    """
+    if checkpoint.since is None:
+        last_id = getattr(checkpoint, f'{name}_id')
+        rows = model.objects.filter(
+            Q(id__gt=last_id) | Q(created_at__gt=window_start)
+        )
+
+        def is_new(row_id, created_at):
+            return row_id > last_id
+    else:
+        seen = set(checkpoint.seen.get(name, ()))
+        rows = model.objects.filter(
+            created_at__gt=min(checkpoint.since, window_start)
+        )
+
+        def is_new(row_id, created_at):
+            return created_at > checkpoint.since and row_id not in seen
+    counts = Counter()
+    window = []
+    for row_id, recipe_id, created_at in rows.order_by().values_list(
+        'id', 'recipe_id', 'created_at'
+    ).iterator(chunk_size=BATCH_SIZE):
+        if is_new(row_id, created_at):
+            counts[recipe_id] += 1
+        if created_at is not None and created_at > window_start:
+            window.append(row_id)
+    return counts, window
+
+
+def activity_count(model):
+    return Coalesce(Subquery(
+        model.objects.filter(
+            recipe_id=OuterRef('recipe_id')
+        ).order_by().values('recipe_id').annotate(
+            count=Count('id')
+        ).values('count'),
+        output_field=IntegerField(),
+    ), 0)
+
+
+class Command(BaseCommand):
+    help = ('Инкрементальный пересчет оценок popular и trending по новым '
+            'добавлениям в избранное и корзину с прошлого запуска.')
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--full', action='store_true',
+            help='Пересчитать popularity и trending по всем текущим '
+                 'записям, с учетом удалений из избранного и корзины.'
+        )
+        parser.add_argument(
+            '--half-life', type=float,
+            default=settings.TRENDING_HALF_LIFE_HOURS,
+            help='Период полураспада оценки trending в часах.'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            checkpoint, _ = RecipeScoreCheckpoint.objects.select_for_update(
+            ).get_or_create(pk=1)
+            now = timezone.now()
+            decay = math.log(2) / (options['half_life'] * 60 * 60)
+            if checkpoint.landmark is None:
+                checkpoint.landmark = now
+            age = (now - checkpoint.landmark).total_seconds()
+            if age * decay > REBASE_HALF_LIVES * math.log(2):
+                RecipeScore.objects.update(
+                    trending=F('trending') * math.exp(-age * decay)
+                )
+                checkpoint.landmark = now
+                age = 0
+            created = self.create_missing_scores()
+            window_start = now - timedelta(
+                seconds=settings.RECIPE_SCORE_OVERLAP_SECONDS
+            )
+            activity = defaultdict(float)
+            seen = {}
+            for name, model, weight in activity_weights():
+                counts, seen[name] = new_activity(
+                    model, checkpoint, name, window_start
+                )
+                for recipe_id, count in counts.items():
+                    activity[recipe_id] += count * weight
+            self.add_activity(activity, math.exp(age * decay))
+            if options['full']:
+                self.recompute_popularity()
+                self.recompute_trending(checkpoint.landmark, decay)
+            checkpoint.since = window_start
+            checkpoint.seen = seen
+            checkpoint.updated_at = now
+            checkpoint.save()
+        self.stdout.write(
+            f'Оценки обновлены: новых строк оценок {created}, '
+            f'рецептов с новой активностью {len(activity)}.'
+        )
+
+    def create_missing_scores(self):
+        """Строки оценок для рецептов, созданных в обход сигналов."""
+        scores = [
+            RecipeScore(recipe_id=recipe_id)
+            for recipe_id in Recipe.objects.filter(
+                score__isnull=True
+            ).values_list('id', flat=True)
+        ]
+        RecipeScore.objects.bulk_create(
+            scores, batch_size=BATCH_SIZE, ignore_conflicts=True
+        )
+        return len(scores)
+
+    def add_activity(self, activity, weight):
+        """
+        Forward decay: новые события входят в trending с весом
+        exp(λ·(t − landmark)), поэтому старые оценки не пересчитываются.
+        """
+        recipe_ids = list(activity)
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            scores = RecipeScore.objects.in_bulk(
+                recipe_ids[start:start + BATCH_SIZE]
+            ).values()
+            for score in scores:
+                score.popularity += activity[score.recipe_id]
+                score.trending += activity[score.recipe_id] * weight
+            RecipeScore.objects.bulk_update(
+                scores, ('popularity', 'trending')
+            )
+
+    def recompute_popularity(self):
+        RecipeScore.objects.update(popularity=(
+            activity_count(Favorite) * settings.FAVORITE_SCORE_WEIGHT
+            + activity_count(ShoppingCart)
+            * settings.SHOPPING_CART_SCORE_WEIGHT
+        ))
+
+    def recompute_trending(self, landmark, decay):
+        """
+        Trending заново по всем записям, каждая с весом по времени
+        добавления; записи без даты считаются добавленными в точке
+        отсчета.
+        """
+        trending = defaultdict(float)
+        for _, model, weight in activity_weights():
+            for recipe_id, created_at in model.objects.order_by(
+            ).values_list('recipe_id', 'created_at').iterator(
+                chunk_size=BATCH_SIZE
+            ):
+                age = ((created_at or landmark) - landmark).total_seconds()
+                trending[recipe_id] += weight * math.exp(age * decay)
+        RecipeScore.objects.update(trending=0)
+        recipe_ids = list(trending)
+        for start in range(0, len(recipe_ids), BATCH_SIZE):
+            scores = RecipeScore.objects.in_bulk(
+                recipe_ids[start:start + BATCH_SIZE]
+            ).values()
+            for score in scores:
+                score.trending = trending[score.recipe_id]
+            RecipeScore.objects.bulk_update(scores, ('trending',))
@@ -0,0 +1,58 @@
+# Generated by Django 3.2.3 on 2026-10-19 10:15
+
+import django.contrib.postgres.indexes
+from django.db import migrations, models
+import django.db.models.functions.text
+
+INGREDIENT_LOWER_NAME_INDEX = models.Index(django.contrib.postgres.indexes.OpClass(django.db.models.functions.text.Lower('name'), name='text_pattern_ops'), name='ingredient_lower_name_idx')
+
+
+# Django 3.2.3 оборачивает OpClass в скобки и строит неверный SQL,
+# поэтому индекс создается явным запросом.
+CREATE_INGREDIENT_LOWER_NAME_INDEX = (
+    'CREATE INDEX ingredient_lower_name_idx ON recipes_ingredient '
+    '(LOWER(name) text_pattern_ops)'
+)
+
+DROP_INGREDIENT_LOWER_NAME_INDEX = (
+    'DROP INDEX IF EXISTS ingredient_lower_name_idx'
+)
+
+
+def add_postgres_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(CREATE_INGREDIENT_LOWER_NAME_INDEX)
+
+
+def remove_postgres_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        return
+    schema_editor.execute(DROP_INGREDIENT_LOWER_NAME_INDEX)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0006_recipe_pub_date_index'),
+    ]
+
+    operations = [
+        migrations.SeparateDatabaseAndState(
+            state_operations=[
+                migrations.AddIndex(
+                    model_name='ingredient',
+                    index=INGREDIENT_LOWER_NAME_INDEX,
+                ),
+            ],
+            database_operations=[
+                migrations.RunPython(
+                    add_postgres_index, remove_postgres_index
+                ),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='recipe',
+            index=models.Index(fields=['author', '-pub_date'], name='recipe_author_pub_date_idx'),
+        ),
+    ]
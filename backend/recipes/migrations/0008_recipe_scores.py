@@ -0,0 +1,61 @@
+# Generated by Django 3.2.3 on 2026-10-19 10:22
+
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+def create_recipe_scores(apps, schema_editor):
+    Recipe = apps.get_model('recipes', 'Recipe')
+    RecipeScore = apps.get_model('recipes', 'RecipeScore')
+    RecipeScore.objects.bulk_create(
+        [RecipeScore(recipe_id=recipe_id)
+         for recipe_id in Recipe.objects.values_list('id', flat=True)],
+        batch_size=1000,
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0007_audit_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RecipeScore',
+            fields=[
+                ('recipe', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score', serialize=False, to='recipes.recipe', verbose_name='Рецепт')),
+                ('popularity', models.FloatField(default=0, verbose_name='Популярность')),
+                ('trending', models.FloatField(default=0, verbose_name='Тренд')),
+            ],
+            options={
+                'verbose_name': 'Оценка рецепта',
+                'verbose_name_plural': 'Оценки рецептов',
+            },
+        ),
+        migrations.CreateModel(
+            name='RecipeScoreCheckpoint',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('favorite_id', models.BigIntegerField(default=0, verbose_name='Последний учтенный id избранного')),
+                ('shopping_cart_id', models.BigIntegerField(default=0, verbose_name='Последний учтенный id корзины')),
+                ('landmark', models.DateTimeField(null=True, verbose_name='Точка отсчета затухания')),
+                ('updated_at', models.DateTimeField(null=True, verbose_name='Время пересчета')),
+            ],
+            options={
+                'verbose_name': 'Состояние пересчета оценок',
+                'verbose_name_plural': 'Состояния пересчета оценок',
+            },
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['-popularity', '-recipe'], name='recipescore_popularity_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='recipescore',
+            index=models.Index(fields=['-trending', '-recipe'], name='recipescore_trending_idx'),
+        ),
+        migrations.RunPython(
+            create_recipe_scores, migrations.RunPython.noop
+        ),
+    ]
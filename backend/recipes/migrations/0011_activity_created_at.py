@@ -0,0 +1,33 @@
+# Generated by Django 3.2.3 on 2026-10-19 11:37
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('recipes', '0010_recipe_image_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='favorite',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, null=True, verbose_name='Дата добавления'),
+        ),
+        migrations.AddField(
+            model_name='recipescorecheckpoint',
+            name='seen',
+            field=models.JSONField(default=dict, verbose_name='Учтенные id в окне'),
+        ),
+        migrations.AddField(
+            model_name='recipescorecheckpoint',
+            name='since',
+            field=models.DateTimeField(null=True, verbose_name='Начало окна новых записей'),
+        ),
+        migrations.AddField(
+            model_name='shoppingcart',
+            name='created_at',
+            field=models.DateTimeField(auto_now_add=True, db_index=True, null=True, verbose_name='Дата добавления'),
+        ),
+    ]
@@ -0,0 +1,118 @@
+import numpy as np
+from django.conf import settings
+from django.db.models import Count, Q
+
+from recipes.models import (RecipeIngredient, RecipeSignature,
+                            RecipeSignatureBucket)
+
+# Параметры задают формат хранимых подписей: после их изменения
+# подписи нужно перестроить командой build_recipe_signatures.
+PERMUTATIONS = 64
+BANDS = 32
+ROWS = PERMUTATIONS // BANDS
+PRIME = (1 << 31) - 1
+SEED = 20240301
+
+_random = np.random.default_rng(SEED)
+HASH_A = _random.integers(1, PRIME, PERMUTATIONS, dtype=np.uint64)
+HASH_B = _random.integers(0, PRIME, PERMUTATIONS, dtype=np.uint64)
+BAND_MULTIPLIERS = _random.integers(
+    1, 1 << 63, ROWS, dtype=np.uint64
+) | np.uint64(1)
+
+
+def compute_signatures(ingredient_ids, offsets):
+    """
+    MinHash-подписи наборов ингредиентов в CSR-раскладке:
+    набор i — ingredient_ids[offsets[i]:offsets[i + 1]], наборы непустые.
+    Хэши (a·x + b) mod p считаются для всех наборов пачкой.
+    """
+    ids = np.asarray(ingredient_ids, dtype=np.uint64) % np.uint64(PRIME)
+    hashes = (ids[:, None] * HASH_A + HASH_B) % np.uint64(PRIME)
+    return np.minimum.reduceat(
+        hashes, np.asarray(offsets[:-1]), axis=0
+    ).astype(np.uint32)
+
+
+def band_buckets(signatures):
+    """Хэш каждой из BANDS полос подписей, форма (наборы, BANDS)."""
+    bands = signatures.astype(np.uint64).reshape(-1, BANDS, ROWS)
+    return (bands * BAND_MULTIPLIERS).sum(axis=2).view(np.int64)
+
+
+def load_signature(value):
+    return np.frombuffer(bytes(value), dtype=np.uint32)
+
+
+def ingredient_sets(recipe_ids):
+    """Наборы ингредиентов рецептов в CSR-раскладке."""
+    rows = np.array(
+        RecipeIngredient.objects.filter(
+            recipe_id__in=recipe_ids
+        ).order_by('recipe_id').values_list('recipe_id', 'ingredient_id'),
+        dtype=np.int64,
+    ).reshape(-1, 2)
+    found, starts = np.unique(rows[:, 0], return_index=True)
+    offsets = np.append(starts, len(rows))
+    return found, rows[:, 1], offsets
+
+
+def update_signatures(recipe_ids):
+    """Пересчитывает подписи и корзины LSH рецептов по их ингредиентам."""
+    recipe_ids = list(recipe_ids)
+    RecipeSignatureBucket.objects.filter(recipe_id__in=recipe_ids).delete()
+    RecipeSignature.objects.filter(recipe_id__in=recipe_ids).delete()
+    found, ingredient_ids, offsets = ingredient_sets(recipe_ids)
+    if not len(found):
+        return 0
+    signatures = compute_signatures(ingredient_ids, offsets)
+    RecipeSignature.objects.bulk_create(
+        RecipeSignature(
+            recipe_id=int(recipe_id), signature=signature.tobytes()
+        )
+        for recipe_id, signature in zip(found, signatures)
+    )
+    RecipeSignatureBucket.objects.bulk_create(
+        (RecipeSignatureBucket(recipe_id=int(recipe_id), band=band,
+                               bucket=int(bucket))
+         for recipe_id, buckets in zip(found, band_buckets(signatures))
+         for band, bucket in enumerate(buckets)),
+        batch_size=5000,
+    )
+    return len(found)
+
+
+def similar_recipes(recipe_id, limit):
+    """
+    Рецепты с наиболее похожим набором ингредиентов: кандидаты из
+    совпавших корзин LSH ранжируются по оценке Жаккара по подписям.
+    Возвращает список пар (id рецепта, оценка сходства).
+    """
+    signature = RecipeSignature.objects.filter(
+        recipe_id=recipe_id
+    ).values_list('signature', flat=True).first()
+    if signature is None:
+        return []
+    signature = load_signature(signature)
+    condition = Q()
+    for band, bucket in enumerate(band_buckets(signature)[0]):
+        condition |= Q(band=band, bucket=int(bucket))
+    candidates = [
+        candidate for candidate, _ in RecipeSignatureBucket.objects.filter(
+            condition
+        ).exclude(recipe_id=recipe_id).values('recipe_id').annotate(
+            matches=Count('id')
+        ).order_by('-matches', 'recipe_id').values_list(
+            'recipe_id', 'matches'
+        )[:settings.SIMILAR_RECIPES_MAX_CANDIDATES]
+    ]
+    if not candidates:
+        return []
+    rows = list(RecipeSignature.objects.filter(
+        recipe_id__in=candidates
+    ).values_list('recipe_id', 'signature'))
+    ids = np.array([candidate for candidate, _ in rows], dtype=np.int64)
+    signatures = np.stack([load_signature(value) for _, value in rows])
+    similarity = (signatures == signature).mean(axis=1)
+    order = np.lexsort((ids, -similarity))[:limit]
+    return [(int(ids[index]), float(similarity[index])) for index in order]
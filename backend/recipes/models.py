@@ -1,13 +1,54 @@
 from django.conf import settings
 from django.contrib.auth import get_user_model
+from django.contrib.postgres.indexes import GinIndex, OpClass
+from django.contrib.postgres.search import (SearchQuery, SearchRank,
+                                            SearchVectorField)
+from django.core.cache import cache
 from django.core.validators import MinValueValidator, RegexValidator
-from django.db import models
-from django.db.models import Exists, OuterRef
+from django.db import connections, models
+from django.db.models import (Case, Exists, F, OuterRef, Prefetch, Q, Value,
+                              When)
+from django.db.models.functions import Lower
 
 from api.constants import SYMBOLS_QUANTITY
+from backend.metrics import record_cache
+from users.models import Subscription
 
 User = get_user_model()
 
+SEARCH_CONFIG = 'russian'
+
+TAG_IDS_CACHE_KEY = 'recipes:tag-ids-by-slug'
+
+# Признаки рецепта для текущего пользователя.
+USER_ANNOTATIONS = ('is_favorited', 'is_in_shopping_cart')
+
+# Связи рецепта, которые подгружает with_related.
+RECIPE_RELATIONS = ('author', 'tags', 'ingredients')
+
+RECIPE_SCORE_ORDERINGS = {
+    'popular': 'popularity',
+    'trending': 'trending',
+}
+
+
+class TagQuerySet(models.QuerySet):
+
+    def ids_by_slug(self, slugs=()):
+        """
+        Словарь slug -> id всех тэгов, кэшируется до изменения тэгов.
+        Сигнал сбрасывает кэш только там, где тэг изменили (кэш в памяти
+        процесса у каждого воркера свой), поэтому slug, которого нет
+        в кэше, перечитывает тэги из базы.
+        """
+        tag_ids = cache.get(TAG_IDS_CACHE_KEY)
+        hit = tag_ids is not None and all(slug in tag_ids for slug in slugs)
+        record_cache('tag_ids', hit)
+        if not hit:
+            tag_ids = dict(Tag.objects.values_list('slug', 'id'))
+            cache.set(TAG_IDS_CACHE_KEY, tag_ids, settings.TAG_IDS_CACHE_TTL)
+        return tag_ids
+
 
 class Tag(models.Model):
     """Модель тегов"""
@@ -31,6 +72,8 @@ class Tag(models.Model):
         )],
     )
 
+    objects = TagQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Тэг'
         verbose_name_plural = 'Тэги'
@@ -54,6 +97,12 @@ class Ingredient(models.Model):
     class Meta:
         verbose_name = 'Ингредиент'
         verbose_name_plural = 'Ингредиенты'
+        indexes = [
+            models.Index(
+                OpClass(Lower('name'), name='text_pattern_ops'),
+                name='ingredient_lower_name_idx',
+            ),
+        ]
 
     def __str__(self):
         return f'{self.name} ({self.measurement_unit})'
@@ -61,20 +110,116 @@ class Ingredient(models.Model):
 
 class RecipeQuerySet(models.QuerySet):
 
-    def add_user_annotations(self, user_id):
-        return self.annotate(
-            is_favorited=Exists(
+    def user_annotations(self, user_id, names=USER_ANNOTATIONS):
+        expressions = {
+            'is_favorited': Exists(
                 Favorite.objects.filter(
                     user_id=user_id, recipe__pk=OuterRef('pk')
                 )
             ),
-            is_in_shopping_cart=Exists(
+            'is_in_shopping_cart': Exists(
                 ShoppingCart.objects.filter(
                     user_id=user_id, recipe__pk=OuterRef('pk')
                 )
             ),
+        }
+        return {name: expressions[name] for name in names}
+
+    def add_user_annotations(self, user_id, names=USER_ANNOTATIONS):
+        return self.annotate(**self.user_annotations(user_id, names))
+
+    def alias_user_annotations(self, user_id, names=USER_ANNOTATIONS):
+        """Признаки для фильтрации без вычисления в SELECT."""
+        return self.alias(**self.user_annotations(user_id, names))
+
+    def with_related(self, user_id, relations=RECIPE_RELATIONS,
+                     is_subscribed=True, author_columns=None):
+        """
+        Автор (с признаком подписки), тэги и ингредиенты рецептов —
+        тремя запросами на страницу вместо запросов на каждый рецепт.
+        relations и author_columns ограничивают связи и колонки автора
+        для неполных ответов.
+        """
+        author = User.objects.all()
+        if author_columns is not None:
+            author = author.only(*author_columns)
+        if is_subscribed:
+            author = author.annotate(is_subscribed=Exists(
+                Subscription.objects.filter(
+                    user_id=user_id, author=OuterRef('pk')
+                )
+            ))
+        lookups = {
+            'author': Prefetch('author', queryset=author),
+            'tags': 'tags',
+            'ingredients': Prefetch(
+                'recipe_ingredient',
+                queryset=RecipeIngredient.objects.select_related('ingredient')
+            ),
+        }
+        return self.prefetch_related(
+            *(lookups[relation] for relation in relations)
+        )
+
+    def with_tags(self, slugs, match_all=False):
+        """
+        Рецепты с любым (или, при match_all, с каждым) из тэгов.
+        Фильтр через EXISTS по RecipeTag, без JOIN и DISTINCT.
+        """
+        tag_ids = Tag.objects.ids_by_slug(slugs)
+        known = {tag_ids[slug] for slug in slugs if slug in tag_ids}
+        if not known or (match_all and len(known) != len(set(slugs))):
+            return self.none()
+        if not match_all:
+            return self.filter(Exists(RecipeTag.objects.filter(
+                recipe_id=OuterRef('pk'), tag_id__in=known
+            )))
+        queryset = self
+        for tag_id in known:
+            queryset = queryset.filter(Exists(RecipeTag.objects.filter(
+                recipe_id=OuterRef('pk'), tag_id=tag_id
+            )))
+        return queryset
+
+    def order_by_score(self, ordering):
+        """
+        Сортировка по предрасчитанной оценке (popular или trending)
+        по индексу таблицы RecipeScore.
+        """
+        field = RECIPE_SCORE_ORDERINGS[ordering]
+        return self.filter(score__isnull=False).order_by(
+            f'-score__{field}', '-score__recipe_id'
         )
 
+    def search(self, query):
+        """
+        Полнотекстовый поиск по названию и тексту рецепта
+        с сортировкой по релевантности.
+        """
+        if connections[self.db].vendor == 'postgresql':
+            search_query = SearchQuery(
+                query, config=SEARCH_CONFIG, search_type='websearch'
+            )
+            return self.filter(search_vector=search_query).annotate(
+                rank=SearchRank(F('search_vector'), search_query)
+            ).order_by('-rank', '-pub_date')
+        # Запасной вариант для SQLite: совпадение в названии выше.
+        # LIKE в SQLite не различает регистр только у латиницы, поэтому
+        # сравниваются строки в нижнем регистре (lower() для кириллицы
+        # регистрирует recipes.signals).
+        query = query.lower()
+        return self.annotate(
+            lower_name=Lower('name'), lower_text=Lower('text')
+        ).filter(
+            Q(lower_name__contains=query) | Q(lower_text__contains=query)
+        ).annotate(
+            rank=Case(
+                When(lower_name__contains=query, then=Value(1.0)),
+                default=Value(0.5),
+                output_field=models.FloatField(),
+            )
+        ).order_by('-rank', '-pub_date')
+
 
 class Recipe(models.Model):
     """Модель рецептов"""
@@ -115,11 +260,25 @@ class Recipe(models.Model):
         verbose_name='Дата публикации',
         auto_now_add=True,
     )
+    search_vector = SearchVectorField(
+        null=True,
+        editable=False,
+        verbose_name='Поисковый вектор',
+    )
 
     objects = RecipeQuerySet.as_manager()
 
     class Meta:
         ordering = ('-pub_date', )
+        indexes = [
+            GinIndex(fields=['search_vector'], name='recipe_search_gin'),
+            models.Index(fields=['-pub_date'], name='recipe_pub_date_idx'),
+            models.Index(fields=['image'], name='recipe_image_idx'),
+            models.Index(
+                fields=['author', '-pub_date'],
+                name='recipe_author_pub_date_idx',
+            ),
+        ]
         verbose_name = 'Рецепт'
         verbose_name_plural = 'Рецепты'
 
@@ -203,6 +362,13 @@ class Favorite(models.Model):
         verbose_name='Рецепт',
         on_delete=models.CASCADE
     )
+    # Пусто у записей, созданных до появления поля.
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        null=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         verbose_name = 'Избранное'
@@ -234,6 +400,13 @@ class ShoppingCart(models.Model):
         verbose_name='Рецепт',
         on_delete=models.CASCADE
     )
+    # Пусто у записей, созданных до появления поля.
+    created_at = models.DateTimeField(
+        auto_now_add=True,
+        null=True,
+        db_index=True,
+        verbose_name='Дата добавления',
+    )
 
     class Meta:
         verbose_name = 'Список покупок'
@@ -248,3 +421,134 @@ class ShoppingCart(models.Model):
     def __str__(self):
         return (f'{self.user.username[:SYMBOLS_QUANTITY]} добавил в'
                 f'корзину {self.recipe.name[:SYMBOLS_QUANTITY]}')
+
+
+class RecipeScore(models.Model):
+    """
+    Предрасчитанные оценки рецепта для сортировки ленты.
+    popularity — взвешенное число добавлений в избранное и корзину,
+    trending — то же с затуханием во времени (forward decay
+    относительно RecipeScoreCheckpoint.landmark).
+    """
+
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        related_name='score',
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE
+    )
+    popularity = models.FloatField(
+        default=0,
+        verbose_name='Популярность',
+    )
+    trending = models.FloatField(
+        default=0,
+        verbose_name='Тренд',
+    )
+
+    class Meta:
+        verbose_name = 'Оценка рецепта'
+        verbose_name_plural = 'Оценки рецептов'
+        indexes = [
+            models.Index(
+                fields=['-popularity', '-recipe'],
+                name='recipescore_popularity_idx',
+            ),
+            models.Index(
+                fields=['-trending', '-recipe'],
+                name='recipescore_trending_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return (f'{self.recipe_id}: {self.popularity:.1f}'
+                f' / {self.trending:.3g}')
+
+
+class RecipeScoreCheckpoint(models.Model):
+    """
+    Состояние задачи пересчета оценок: с какого времени искать новые
+    записи избранного и корзины, id уже учтенных записей после этого
+    времени и точка отсчета затухания. favorite_id и shopping_cart_id —
+    прежняя отметка по id, нужна только первому запуску после
+    перехода на отметку по времени.
+    """
+
+    favorite_id = models.BigIntegerField(
+        default=0,
+        verbose_name='Последний учтенный id избранного',
+    )
+    shopping_cart_id = models.BigIntegerField(
+        default=0,
+        verbose_name='Последний учтенный id корзины',
+    )
+    since = models.DateTimeField(
+        null=True,
+        verbose_name='Начало окна новых записей',
+    )
+    seen = models.JSONField(
+        default=dict,
+        verbose_name='Учтенные id в окне',
+    )
+    landmark = models.DateTimeField(
+        null=True,
+        verbose_name='Точка отсчета затухания',
+    )
+    updated_at = models.DateTimeField(
+        null=True,
+        verbose_name='Время пересчета',
+    )
+
+    class Meta:
+        verbose_name = 'Состояние пересчета оценок'
+        verbose_name_plural = 'Состояния пересчета оценок'
+
+    def __str__(self):
+        return f'{self.updated_at}'
+
+
+class RecipeSignature(models.Model):
+    """MinHash-подпись набора ингредиентов рецепта (recipes.minhash)."""
+
+    recipe = models.OneToOneField(
+        Recipe,
+        primary_key=True,
+        related_name='signature',
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE
+    )
+    signature = models.BinaryField(verbose_name='Подпись')
+
+    class Meta:
+        verbose_name = 'Подпись рецепта'
+        verbose_name_plural = 'Подписи рецептов'
+
+    def __str__(self):
+        return f'{self.recipe_id}'
+
+
+class RecipeSignatureBucket(models.Model):
+    """Корзина LSH: хэш одной полосы MinHash-подписи рецепта."""
+
+    recipe = models.ForeignKey(
+        Recipe,
+        related_name='signature_buckets',
+        verbose_name='Рецепт',
+        on_delete=models.CASCADE
+    )
+    band = models.PositiveSmallIntegerField(verbose_name='Полоса')
+    bucket = models.BigIntegerField(verbose_name='Хэш полосы')
+
+    class Meta:
+        verbose_name = 'Корзина LSH'
+        verbose_name_plural = 'Корзины LSH'
+        indexes = [
+            models.Index(
+                fields=['band', 'bucket'],
+                name='signature_band_bucket_idx',
+            ),
+        ]
+
+    def __str__(self):
+        return f'{self.recipe_id}: {self.band}/{self.bucket}'
@@ -0,0 +1,91 @@
+from django.conf import settings
+from django.core.cache import cache
+from django.core.files.storage import default_storage
+from django.db import transaction
+from django.db.backends.signals import connection_created
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+
+from api.jobs import enqueue_on_commit
+from recipes.ingredient_index import ingredient_index
+from recipes.models import (TAG_IDS_CACHE_KEY, Favorite, Recipe, RecipeScore,
+                            ShoppingCart, Tag)
+from recipes.user_ids import invalidate
+from users.models import Subscription
+
+
+@receiver(connection_created)
+def register_sqlite_lower(sender, connection, **kwargs):
+    """
+    Встроенный lower() SQLite меняет регистр только у латиницы: поиск
+    рецептов и ингредиентов по кириллице без учета регистра работает
+    с lower() из Python.
+    """
+    if connection.vendor == 'sqlite':
+        connection.connection.create_function(
+            'lower', 1, lambda value: value if value is None
+            else value.lower(), deterministic=True,
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def remove_recipe_from_ingredient_index(sender, instance, **kwargs):
+    """Убираем удаленный рецепт из индекса ингредиентов."""
+    recipe_id = instance.id
+    transaction.on_commit(lambda: ingredient_index.remove_recipe(recipe_id))
+
+
+@receiver(post_save, sender=Recipe)
+def create_recipe_score(sender, instance, created, **kwargs):
+    """Новый рецепт сразу попадает в сортировки по оценке."""
+    if created:
+        RecipeScore.objects.get_or_create(recipe=instance)
+
+
+@receiver(post_save, sender=Tag)
+@receiver(post_delete, sender=Tag)
+def reset_tag_ids_cache(sender, **kwargs):
+    """Сбрасываем кэш slug -> id при изменении тэгов."""
+    cache.delete(TAG_IDS_CACHE_KEY)
+
+
+def release_image(name):
+    """
+    Удаляем файл картинки, на который не ссылается ни один рецепт
+    и который не загружали повторно за IMAGE_RELEASE_DELAY.
+    """
+    if name and not Recipe.objects.filter(image=name).exists():
+        default_storage.release(name, settings.IMAGE_RELEASE_DELAY)
+
+
+def schedule_image_release(name):
+    """
+    Освобождаем картинку после фиксации транзакции с задержкой:
+    файл успеет переиспользовать рецепт с такой же картинкой.
+    """
+    if name:
+        enqueue_on_commit(
+            release_image, key=f'release_image:{name}',
+            delay=settings.IMAGE_RELEASE_DELAY, name=name,
+        )
+
+
+@receiver(post_delete, sender=Recipe)
+def release_deleted_recipe_image(sender, instance, **kwargs):
+    """После удаления рецепта освобождаем его картинку."""
+    schedule_image_release(instance.image.name)
+
+
+@receiver(post_save, sender=Favorite)
+@receiver(post_save, sender=ShoppingCart)
+@receiver(post_save, sender=Subscription)
+@receiver(post_delete, sender=Favorite)
+@receiver(post_delete, sender=ShoppingCart)
+@receiver(post_delete, sender=Subscription)
+def reset_user_id_set(sender, instance, **kwargs):
+    """
+    Записи в обход эндпоинтов (админка, скрипты, каскадное удаление
+    рецептов и пользователей) сбрасывают набор id пользователя.
+    """
+    user_id = instance.user_id
+    transaction.on_commit(lambda: invalidate(sender, user_id))
@@ -0,0 +1,106 @@
+import hashlib
+import os
+import posixpath
+import tempfile
+import time
+import uuid
+
+from django.core.files import File
+from django.core.files.storage import FileSystemStorage
+
+DIGEST_CHUNK_SIZE = 64 * 1024
+
+
+def content_digest(content):
+    """sha256 содержимого файла; файл перематывается в начало."""
+    digest = getattr(content, 'digest', None)
+    if digest is not None:
+        return digest
+    hasher = hashlib.sha256()
+    content.seek(0)
+    for chunk in content.chunks(DIGEST_CHUNK_SIZE):
+        hasher.update(chunk)
+    content.seek(0)
+    return hasher.hexdigest()
+
+
+def name_digest(name):
+    """Дайджест из имени файла в хранилище или None для старых имен."""
+    digest = posixpath.splitext(posixpath.basename(name or ''))[0]
+    if len(digest) == 64 and all(char in '0123456789abcdef'
+                                 for char in digest):
+        return digest
+    return None
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    """
+    Хранилище, адресуемое содержимым: файл лежит под sha256 своего
+    содержимого (upload_to/ab/<sha256>.<ext>), поэтому одинаковые
+    картинки хранятся один раз, а повторная загрузка существующей
+    картинки не пишет на диск, а только обновляет время изменения
+    файла. Удалением файлов без ссылок занимаются сигналы рецептов
+    через release.
+    """
+
+    def save(self, name, content, max_length=None):
+        if name is None:
+            name = content.name
+        if not hasattr(content, 'chunks'):
+            content = File(content, name)
+        digest = content_digest(content)
+        directory = posixpath.dirname(name)
+        extension = posixpath.splitext(name)[1].lower()
+        name = posixpath.join(directory, digest[:2], digest + extension)
+        try:
+            # Свежее время изменения защищает файл от release.
+            os.utime(self.path(name))
+        except FileNotFoundError:
+            return super().save(name, content, max_length)
+        return name
+
+    def release(self, name, min_age):
+        """
+        Удаляет файл, если его не загружали повторно последние min_age
+        секунд. Файл сначала атомарно переименовывается: save,
+        начавшийся позже, не найдет его и запишет заново, а save,
+        успевший раньше, обновил время изменения — тогда файл
+        возвращается на место. Возвращает True, если файл удален.
+        """
+        path = self.path(name)
+        released_path = f'{path}.{uuid.uuid4().hex}.released'
+        try:
+            os.rename(path, released_path)
+        except FileNotFoundError:
+            return False
+        if time.time() - os.stat(released_path).st_mtime < min_age:
+            # Параллельный save мог записать файл заново — с тем же
+            # содержимым.
+            os.replace(released_path, path)
+            return False
+        os.remove(released_path)
+        return True
+
+    def get_available_name(self, name, max_length=None):
+        # Одинаковое имя означает одинаковое содержимое.
+        return name
+
+    def _save(self, name, content):
+        full_path = self.path(name)
+        directory = os.path.dirname(full_path)
+        os.makedirs(directory, exist_ok=True)
+        descriptor, temp_path = tempfile.mkstemp(dir=directory,
+                                                 suffix='.tmp')
+        try:
+            with os.fdopen(descriptor, 'wb') as file:
+                for chunk in content.chunks():
+                    file.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(temp_path, self.file_permissions_mode)
+            # Параллельная загрузка того же файла запишет то же самое.
+            os.replace(temp_path, full_path)
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+        return name
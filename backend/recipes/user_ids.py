@@ -0,0 +1,128 @@
+import time
+from array import array
+from bisect import bisect_left
+
+from django.conf import settings
+from django.core.cache import cache
+
+from backend.metrics import record_cache
+from recipes.models import Favorite, ShoppingCart
+from users.models import Subscription
+
+CACHE_PREFIX = 'user-ids'
+
+# Вид набора -> (модель, поле с id объекта).
+KINDS = {
+    'favorites': (Favorite, 'recipe_id'),
+    'shopping_cart': (ShoppingCart, 'recipe_id'),
+    'subscriptions': (Subscription, 'author_id'),
+}
+
+KIND_BY_MODEL = {model: kind for kind, (model, _) in KINDS.items()}
+
+
+def version_key(kind, user_id):
+    return f'{CACHE_PREFIX}:version:{kind}:{user_id}'
+
+
+def cache_key(kind, user_id, version):
+    return f'{CACHE_PREFIX}:{kind}:{user_id}:{version}'
+
+
+def from_bytes(raw):
+    ids = array('q')
+    ids.frombytes(raw)
+    return ids
+
+
+def load_ids(kind, user_id):
+    """Отсортированные id набора пользователя из базы."""
+    model, field = KINDS[kind]
+    return array('q', model.objects.filter(
+        user_id=user_id
+    ).order_by(field).values_list(field, flat=True))
+
+
+def contains(ids, value):
+    position = bisect_left(ids, value)
+    return position < len(ids) and ids[position] == value
+
+
+def invalidate(model, user_id):
+    """
+    Сбрасывает набор после записи в базу: увеличивает его версию.
+    Набор, прочитанный из базы до записи, сохранится под старой
+    версией и больше не будет прочитан. Если версии в кэше нет,
+    следующее чтение начнет новую.
+    """
+    if not settings.USER_ID_SETS_ENABLED:
+        return
+    try:
+        cache.incr(version_key(KIND_BY_MODEL[model], user_id))
+    except ValueError:
+        pass
+
+
+class UserIdSets:
+    """
+    Наборы id избранных рецептов, рецептов в корзине и авторов
+    в подписках пользователя — отсортированные массивы int64 в кэше.
+    По ним признаки is_favorited, is_in_shopping_cart и is_subscribed
+    вычисляются в памяти, без EXISTS в запросах ленты. Наборы
+    неизменяемы: каждая запись увеличивает версию набора (invalidate),
+    а недостающий набор загружается одним запросом под текущей версией.
+    Версии и наборы читаются из кэша двумя get_many на запрос.
+    """
+
+    def __init__(self, user):
+        self.user_id = user.pk if user.is_authenticated else None
+        self.sets = {}
+        self.cached = None
+
+    def get_versions(self):
+        keys = {version_key(kind, self.user_id): kind for kind in KINDS}
+        versions = {
+            keys[key]: version
+            for key, version in cache.get_many(keys).items()
+        }
+        for key, kind in keys.items():
+            if kind not in versions:
+                # Новая версия не совпадает с версиями вытесненного ключа.
+                cache.add(key, time.time_ns(), None)
+                versions[kind] = cache.get(key)
+        return versions
+
+    def get_cached(self):
+        if self.cached is None:
+            self.versions = self.get_versions()
+            keys = {
+                cache_key(kind, self.user_id, version): kind
+                for kind, version in self.versions.items()
+            }
+            self.cached = {
+                keys[key]: from_bytes(raw)
+                for key, raw in cache.get_many(keys).items()
+            }
+        return self.cached
+
+    def get(self, kind):
+        if kind in self.sets:
+            return self.sets[kind]
+        if self.user_id is None:
+            ids = array('q')
+        elif settings.USER_ID_SETS_ENABLED:
+            ids = self.get_cached().get(kind)
+            record_cache('user_id_sets', ids is not None)
+            if ids is None:
+                ids = load_ids(kind, self.user_id)
+                cache.set(
+                    cache_key(kind, self.user_id, self.versions[kind]),
+                    ids.tobytes(), settings.USER_ID_SETS_TTL,
+                )
+        else:
+            ids = load_ids(kind, self.user_id)
+        self.sets[kind] = ids
+        return ids
+
+    def has(self, kind, object_id):
+        return contains(self.get(kind), object_id)
@@ -387,16 +387,48 @@ class Api {
 
   downloadFile () {
     const token = localStorage.getItem('token')
+    const headers = {
+      ...this._headers,
+      'authorization': `Token ${token}`
+    }
     return fetch(
       `/api/recipes/download_shopping_cart/`,
       {
         method: 'GET',
-        headers: {
-          ...this._headers,
-          'authorization': `Token ${token}`
-        }
+        headers
       }
-    ).then(this.checkFileDownloadResponse)
+    ).then(res => res.status === 202 ? this.waitForFile(res, headers) : res)
+      .then(this.checkFileDownloadResponse)
+  }
+
+  waitForFile (res, headers) {
+    // большой список покупок готовит фоновая задача (ответ 202):
+    // опрашиваем ее, пока не появится ссылка на файл
+    const delay = Number(res.headers.get('Retry-After') || 1) * 1000
+    return new Promise(resolve => setTimeout(resolve, delay))
+      .then(_ => fetch(
+        res.headers.get('Location'),
+        {
+          method: 'GET',
+          headers
+        }
+      ))
+      .then(this.checkResponse)
+      .then(job => {
+        if (job.status === 'done') {
+          return fetch(
+            job.result_url,
+            {
+              method: 'GET',
+              headers
+            }
+          )
+        }
+        if (job.status === 'failed') {
+          return Promise.reject(job)
+        }
+        return this.waitForFile(res, headers)
+      })
   }
 }
 